@@ -0,0 +1,142 @@
+"""
+ベンチマーク用のフィクスチャ (Yahoo!ファイナンス /history・/chart ページ相当のHTML) の生成と読み込み。
+
+fixtures/<コード>_history.html / <コード>_chart.html を読む。
+合成フィクスチャは乱数シード固定で生成するので、何度作り直しても同じ内容になる。
+実ページを保存する場合は capture() を使う (ネットワークが必要)。
+
+    python benchmarks/fixtures.py                 # 合成フィクスチャを作り直す
+    python benchmarks/fixtures.py --capture AJ311217
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SYNTHETIC_FUNDS = {
+    # コード: (ファンド名, 初期基準価額, chartLine の点数)
+    "BENCH001": ("ベンチ 全世界株式インデックス", 12000.0, 520),
+    "BENCH002": ("ベンチ 米国株式(S&P500)", 18000.0, 520),
+    "BENCH003": ("ベンチ ゴールドファンド(為替ヘッジあり)", 9500.0, 104),
+}
+HISTORY_ROWS = 20     # /history のテーブル行数 (実ページは約1ヶ月分)
+PAGE_NOISE = 1500     # ページ本体以外の要素数 (実ページのサイズ感に合わせる)
+
+def _business_days(end, n):
+    days = []
+    d = end
+    while len(days) < n:
+        if d.weekday() < 5: days.append(d)
+        d -= timedelta(days=1)
+    return days[::-1]
+
+def _random_walk(rng, start, n):
+    v, out = start, []
+    for _ in range(n):
+        v *= 1 + rng.gauss(0.0003, 0.009)
+        out.append(round(v))
+    return out
+
+def _noise(rng):
+    """ナビゲーション・広告枠などに相当するタグの塊"""
+    parts = []
+    for i in range(PAGE_NOISE):
+        parts.append(
+            f'<div class="_{rng.randrange(16**6):06x}"><a href="/quote/{i}">リンク{i}</a>'
+            f'<span data-id="{i}">{rng.random():.6f}</span></div>'
+        )
+    return "\n".join(parts)
+
+def _state_script(state):
+    return f"<script>window.__PRELOADED_STATE__ = {json.dumps(state, ensure_ascii=False)};</script>"
+
+def _fmt_jp(d):
+    return f"{d.year}年{d.month}月{d.day}日"
+
+def make_history_html(code, name, closes, dates, rng):
+    rows = "\n".join(
+        f"<tr><td>{_fmt_jp(d)}</td><td>{c:,}</td><td>{c - p:+,}</td><td>{rng.randrange(1000, 90000):,}</td></tr>"
+        for d, c, p in zip(dates[::-1], closes[::-1], closes[-2::-1] + [closes[0]])
+    )
+    last = dates[-1]
+    state = {
+        "mainFundPriceBoard": {"fundPrices": {"price": f"{closes[-1]:,}", "updateDate": f"{last.month:02d}/{last.day:02d}"}},
+        "mainFundHistory": {"histories": [{"date": _fmt_jp(d), "price": f"{c:,}"} for d, c in zip(dates, closes)]},
+    }
+    return f"""<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8">
+<title>{name}【{code}】：時系列・基準価額推移 - Yahoo!ファイナンス</title></head><body>
+{_noise(rng)}
+<table class="history"><thead><tr><th>日付</th><th>基準価額</th><th>前日比</th><th>純資産（百万円）</th></tr></thead>
+<tbody>
+{rows}
+</tbody></table>
+{_noise(rng)}
+{_state_script(state)}
+</body></html>"""
+
+def make_chart_html(code, name, closes, dates, rng):
+    state = {
+        "mainFundPriceBoard": {"fundPrices": {"price": f"{closes[-1]:,}", "updateDate": f"{dates[-1].month:02d}/{dates[-1].day:02d}"}},
+        "mainYJChart": {"chart": {"chartLine": [{"data": [
+            {"date": d.isoformat(), "price": float(c)} for d, c in zip(dates, closes)
+        ]}]}},
+    }
+    return f"""<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8">
+<title>{name}【{code}】：チャート - Yahoo!ファイナンス</title></head><body>
+{_noise(rng)}
+{_state_script(state)}
+</body></html>"""
+
+def generate(end=date(2026, 1, 30)):
+    """合成フィクスチャを fixtures/ に書き出す"""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for i, (code, (name, start, n_points)) in enumerate(SYNTHETIC_FUNDS.items()):
+        rng = random.Random(i)
+        # chartLine は週次、/history は直近の日次
+        weekly = _business_days(end, n_points * 5)[::5]
+        daily = _business_days(end, HISTORY_ROWS)
+        pages = {
+            "chart": make_chart_html(code, name, _random_walk(rng, start, len(weekly)), weekly, rng),
+            "history": make_history_html(code, name, _random_walk(rng, start, len(daily)), daily, rng),
+        }
+        for kind, html in pages.items():
+            with open(os.path.join(FIXTURE_DIR, f"{code}_{kind}.html"), "w", encoding="utf-8") as f:
+                f.write(html)
+        print(f"Generated {code} ({n_points} chart points)")
+
+def capture(code):
+    """実ページを取得してフィクスチャとして保存する"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from core.funds import http_get_text
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    for kind in ("history", "chart"):
+        status, text = http_get_text(f"https://finance.yahoo.co.jp/quote/{code}/{kind}")
+        if status != 200:
+            print(f"Failed {code}/{kind}: {status}")
+            continue
+        with open(os.path.join(FIXTURE_DIR, f"{code}_{kind}.html"), "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Saved {code}_{kind}.html ({len(text):,} chars)")
+
+def load_fixtures():
+    """{code: {"history": html, "chart": html}} (どちらか一方だけのコードも含む)"""
+    fixtures = {}
+    if not os.path.isdir(FIXTURE_DIR): return fixtures
+    for fn in sorted(os.listdir(FIXTURE_DIR)):
+        if not fn.endswith(".html") or "_" not in fn: continue
+        code, kind = fn[:-5].rsplit("_", 1)
+        with open(os.path.join(FIXTURE_DIR, fn), encoding="utf-8") as f:
+            fixtures.setdefault(code, {})[kind] = f.read()
+    return fixtures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--capture", metavar="CODE", nargs="+", help="実ページを保存する (要ネットワーク)")
+    args = parser.parse_args()
+    if args.capture:
+        for c in args.capture: capture(c)
+    else:
+        generate()
@@ -0,0 +1,91 @@
+"""
+起動時 (最初の描画まで) の import 時間のプロファイル。
+
+stock_app.py のモジュール直下の import 文だけを取り出し、Streamlit サーバーが読み込み済みの状態から
+別プロセスで実行して、-X importtime の出力をパッケージ別に集計する。
+関数・ブロック内の import (遅延 import) は最初の描画を待たせないので数えない。
+
+    python benchmarks/import_profile.py            # パッケージ別の内訳
+    python benchmarks/import_profile.py --top 30
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+APP_FILE = os.path.join(APP_DIR, "stock_app.py")
+MARKER = "kabu-startup-imports"
+
+# streamlit run がスクリプトを実行する前に読み込み済みのモジュール (この分はスクリプトの起動時間に含めない)
+SERVER_PRELUDE = "import streamlit, streamlit.web.bootstrap, streamlit.web.server.server"
+
+_CHILD = """
+import json, os, sys, time, tracemalloc
+{prelude}
+os.chdir({app_dir!r}); sys.path.insert(0, {app_dir!r})
+code = compile({source!r}, "stock_app.py", "exec")
+sys.stderr.write({marker!r} + "\\n"); sys.stderr.flush()
+if {trace_memory}: tracemalloc.start()
+t0 = time.perf_counter()
+exec(code, {{"__name__": "__kabu_startup__"}})
+ms = (time.perf_counter() - t0) * 1000
+peak = tracemalloc.get_traced_memory()[1] if {trace_memory} else 0
+print(json.dumps({{"ms": ms, "peak": peak}}))
+"""
+
+def app_imports(path=APP_FILE):
+    """stock_app.py のモジュール直下の import 文 (ソース)"""
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source)
+    nodes = [n for n in tree.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.get_source_segment(source, n) for n in nodes)
+
+def run_child(importtime=False, trace_memory=False):
+    """
+    別プロセスで import 文を実行する。
+    戻り値: ({"ms": 実時間, "peak": tracemalloc のピーク (bytes)}, -X importtime の行 [(self µs, 累計 µs, 深さ, モジュール)])
+    """
+    code = _CHILD.format(prelude=SERVER_PRELUDE, app_dir=APP_DIR, source=app_imports(),
+                         marker=MARKER, trace_memory=trace_memory)
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=APP_DIR)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    rows = []
+    if importtime:
+        lines = proc.stderr.splitlines()
+        for line in lines[lines.index(MARKER) + 1:]:
+            m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+            if m: rows.append((int(m[1]), int(m[2]), len(m[3]) // 2, m[4]))
+    return json.loads(proc.stdout.strip().splitlines()[-1]), rows
+
+def by_package(rows):
+    """importtime の self 時間をトップレベルのパッケージごとに合計する {package: ms}"""
+    out = {}
+    for self_us, _, _, name in rows:
+        pkg = name.split(".")[0]
+        out[pkg] = out.get(pkg, 0.0) + self_us / 1000
+    return dict(sorted(out.items(), key=lambda kv: -kv[1]))
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時の import 時間のプロファイル")
+    parser.add_argument("--top", type=int, default=15, help="表示するパッケージ数")
+    args = parser.parse_args()
+
+    result, rows = run_child(importtime=True)
+    packages = by_package(rows)
+    print(app_imports())
+    print(f"\n{'package':<32}{'self ms':>10}")
+    for pkg, ms in list(packages.items())[:args.top]:
+        print(f"{pkg:<32}{ms:>10.1f}")
+    print(f"{'total (importtime)':<32}{sum(packages.values()):>10.1f}")
+    print(f"{'wall':<32}{result['ms']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
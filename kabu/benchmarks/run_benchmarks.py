@@ -0,0 +1,222 @@
+"""
+オフラインのベンチマーク (ネットワーク不要)。
+
+- 投信ページ解析: fixtures/ のHTMLを使い、1銘柄あたりの解析時間を測る
+- 集計: 10〜5,000行の合成ポートフォリオで、再実行1回分の集計時間と評価額推移の計算時間を測る
+- 履歴キャッシュ: 100銘柄の読み込みを、列指向ストア (prices.arrow) と銘柄ごとのCSV (旧形式) で比べる
+- 起動: stock_app.py が最初の描画までに行う import の時間 (別プロセス、内訳は import_profile.py)
+- いずれも tracemalloc でピークメモリを記録する
+
+    python benchmarks/run_benchmarks.py                  # 実行して baseline.json と比較
+    python benchmarks/run_benchmarks.py --save-baseline  # 結果を baseline.json に保存
+    python benchmarks/run_benchmarks.py --fail-over 1.3  # 基準より30%以上遅い項目があれば終了コード1
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from core.aggregate import aggregate_portfolio, build_price_table, normalize_holdings, transactions_by_ticker
+from core.funds import fund_snapshot_steps, parse_fund_history_state, parse_fund_history_table, parse_fund_state, run_steps
+from core.price_store import PriceStore
+from core.timeseries import portfolio_timeseries
+from core.utils import safe_float
+from core.yahoo_parser import extract_preloaded_state, parse_fund_name
+
+import fixtures
+import import_profile
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+PORTFOLIO_SIZES = (10, 100, 1000, 5000)
+HISTORY_DAYS = 500
+REPEAT = 5
+
+def measure(fn, repeat=REPEAT):
+    """fn を repeat 回実行し、実行時間の中央値・最小値 (ms) と1回分のピークメモリ (KiB) を返す"""
+    # 解析関数の進捗 print は計測対象外
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        fn()  # ウォームアップ (遅延 import やキャッシュの影響を除く)
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - t0) * 1000)
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3), "peak_kib": round(peak / 1024, 1)}
+
+# --- 0. 投信ページ解析 ---
+def _fixture_get(pages, missing_history=False):
+    """run_steps 用の get: URL の末尾 (/history, /chart) でフィクスチャを返す"""
+    def get(url):
+        kind = url.rsplit("/", 1)[-1]
+        if kind == "history" and missing_history: return 404, ""
+        return (200, pages[kind]) if kind in pages else (404, "")
+    return get
+
+def parse_benchmarks():
+    results = {}
+    fx = fixtures.load_fixtures()
+    if not fx:
+        fixtures.generate()
+        fx = fixtures.load_fixtures()
+    for code, pages in fx.items():
+        if "history" in pages:
+            html = pages["history"]
+            results[f"parse/{code}/history_table"] = measure(lambda: parse_fund_history_table(html))
+            results[f"parse/{code}/history_state"] = measure(
+                lambda: parse_fund_history_state(extract_preloaded_state(html)))
+            results[f"parse/{code}/fund_name"] = measure(lambda: parse_fund_name(html))
+            results[f"parse/{code}/snapshot_history"] = measure(
+                lambda: run_steps(fund_snapshot_steps(code), _fixture_get(pages)))
+        if "chart" in pages:
+            html = pages["chart"]
+            state = extract_preloaded_state(html)
+            results[f"parse/{code}/preloaded_state"] = measure(lambda: extract_preloaded_state(html))
+            results[f"parse/{code}/fund_state"] = measure(lambda: parse_fund_state(state))
+            # /history が取れなかった場合の /chart フォールバック経路
+            results[f"parse/{code}/snapshot_chart"] = measure(
+                lambda: run_steps(fund_snapshot_steps(code), _fixture_get(pages, missing_history=True)))
+
+    values = [f"{v:,}" for v in np.random.default_rng(0).uniform(0, 100000, 100_000).round(2)]
+    values[::7] = ["---"] * len(values[::7])
+    results["parse/safe_float_100k"] = measure(lambda: [safe_float(v) for v in values])
+    return results
+
+# --- 1. 集計 ---
+def synthetic_portfolio(n_rows, seed=0):
+    """n_rows 行の編集表と、銘柄ごとの日次履歴 (HISTORY_DAYS 日) を作る"""
+    rng = np.random.default_rng(seed)
+    n_tickers = max(3, n_rows // 3)
+    kinds = rng.choice(["JP", "US", "FUND"], n_tickers, p=[0.5, 0.3, 0.2])
+    tickers = [
+        f"{1000 + i}.T" if k == "JP" else ("".join(chr(65 + (i // 26**j) % 26) for j in range(4)) if k == "US" else f"B{i:07d}")
+        for i, k in enumerate(kinds)
+    ]
+    idx = pd.bdate_range(end="2026-01-30", periods=HISTORY_DAYS)
+    histories = {
+        t: pd.DataFrame({"Close": 1000 * np.exp(np.cumsum(rng.normal(0, 0.01, HISTORY_DAYS)))}, index=idx)
+        for t in tickers
+    }
+    picks = rng.integers(0, n_tickers, n_rows)
+    rows = pd.DataFrame({
+        "銘柄コード": [tickers[i] for i in picks],
+        "銘柄名": [f"銘柄{i}" for i in picks],
+        "購入日": rng.choice(idx[:-20], n_rows).astype("datetime64[ns]"),
+        "保有株数": rng.integers(1, 500, n_rows).astype(float),
+        "購入単価": rng.uniform(500, 1500, n_rows).round(1),
+    })
+    rows["購入日"] = pd.to_datetime(rows["購入日"]).dt.date
+    return rows, histories
+
+def aggregate_rerun(rows, histories, usdjpy_rate=150.0):
+    """stock_app の「3. 集計・分析」で再実行ごとに行う処理 (取得済みデータに対して)"""
+    holdings = normalize_holdings(rows)
+    tickers = list(dict.fromkeys(holdings["ticker"]))
+    agg = aggregate_portfolio(holdings, build_price_table({t: histories[t] for t in tickers}), usdjpy_rate)
+    tx_map = transactions_by_ticker(holdings)
+    return agg, tx_map
+
+def aggregate_benchmarks():
+    results = {}
+    for n in PORTFOLIO_SIZES:
+        rows, histories = synthetic_portfolio(n)
+        results[f"aggregate/rerun_{n}"] = measure(lambda: aggregate_rerun(rows, histories))
+        holdings = normalize_holdings(rows)
+        results[f"aggregate/timeseries_{n}"] = measure(lambda: portfolio_timeseries(holdings, histories, 150.0))
+    return results
+
+# --- 2. 履歴キャッシュ ---
+STORE_TICKERS = 100
+
+def store_benchmarks():
+    results = {}
+    _, histories = synthetic_portfolio(STORE_TICKERS * 3)
+    tickers = list(histories)[:STORE_TICKERS]
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_paths = []
+        for t in tickers:
+            csv_paths.append(os.path.join(tmp, f"{t}.csv"))
+            histories[t].to_csv(csv_paths[-1])
+        store_path = os.path.join(tmp, "prices.arrow")
+        results[f"store/write_{STORE_TICKERS}"] = measure(
+            lambda: PriceStore(store_path).put_many((t, histories[t], {"source": "bench"}) for t in tickers))
+        # 毎回新しいインスタンスで開く (プロセス起動直後の読み込みに相当)
+        results[f"store/load_{STORE_TICKERS}"] = measure(lambda: PriceStore(store_path).get_many(tickers))
+        results[f"store/load_{STORE_TICKERS}_csv"] = measure(
+            lambda: [pd.read_csv(p, index_col=0, parse_dates=True) for p in csv_paths])
+    return results
+
+# --- 3. 起動 ---
+def startup_benchmarks(repeat=REPEAT):
+    # 毎回新しいプロセスで測る (import 済みモジュールのキャッシュが効かない状態)
+    times = [import_profile.run_child()[0]["ms"] for _ in range(repeat)]
+    peak = import_profile.run_child(trace_memory=True)[0]["peak"]
+    return {"startup/app_imports": {
+        "median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3), "peak_kib": round(peak / 1024, 1),
+    }}
+
+# --- 4. 比較 ---
+def compare(results, baseline, fail_over=None):
+    """基準との比 (median) を表示し、fail_over を超えた項目名を返す"""
+    regressions = []
+    print(f"{'benchmark':<44}{'median ms':>12}{'peak KiB':>12}{'baseline':>12}{'ratio':>8}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        ratio = r["median_ms"] / base["median_ms"] if base and base["median_ms"] > 0 else None
+        mark = ""
+        if ratio is not None and fail_over and ratio > fail_over:
+            regressions.append(name)
+            mark = "  <-- slower"
+        base_s = f"{base['median_ms']:.3f}" if base else "-"
+        ratio_s = f"{ratio:.2f}" if ratio is not None else "-"
+        print(f"{name:<44}{r['median_ms']:>12.3f}{r['peak_kib']:>12.1f}{base_s:>12}{ratio_s:>8}{mark}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="オフラインベンチマーク")
+    parser.add_argument("--save-baseline", action="store_true", help="結果を baseline.json に保存する")
+    parser.add_argument("--fail-over", type=float, default=None, help="基準比 (median) がこの値を超えたら失敗にする")
+    parser.add_argument("--only", choices=["parse", "aggregate", "store", "startup"], help="一部だけ実行する")
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで書き出す")
+    args = parser.parse_args()
+
+    results = {}
+    if args.only in (None, "parse"): results.update(parse_benchmarks())
+    if args.only in (None, "aggregate"): results.update(aggregate_benchmarks())
+    if args.only in (None, "store"): results.update(store_benchmarks())
+    if args.only in (None, "startup"): results.update(startup_benchmarks())
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.fail_over)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "pandas": pd.__version__, "results": baseline}, f, indent=1, sort_keys=True)
+        print(f"Saved baseline to {BASELINE_PATH}")
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than baseline x{args.fail_over}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+キャッシュウォーマー: 全ポートフォリオの株価・投信 (履歴・名前・基準価額)・為替を
+stock_data_cache に先読みしておき、ダッシュボードはローカルのキャッシュを読むだけにする。
+
+    python cache_warmer.py          # 常駐 (サイドカー): 東証・NYSEの引け後と基準価額公表後に毎回実行
+    python cache_warmer.py --once   # 1回だけ実行 (cron 用)
+
+取得判定はアプリと同じ core.freshness を使うため、新しいデータが無い銘柄は通信しない。
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from core import fetch_all, get_ticker_type, list_portfolios, load_portfolio, next_publication
+
+WARM_DELAY = timedelta(minutes=10)   # 公表時刻からの余裕 (Yahoo側の反映待ち)
+WARM_TIMEOUT = None                  # 一括取得の締め切り。画面を待たせないための WAVE_TIMEOUT (60秒) は使わず、全件終わるまで待つ
+ASSET_TYPES = ("JP_STOCK", "US_STOCK", "JP_FUND")
+
+def collect_tickers():
+    """全ポートフォリオの銘柄コードを資産タイプ別に集める"""
+    tickers = []
+    for pf in list_portfolios():
+        df = load_portfolio(pf)
+        tickers += [str(t).strip() for t in df["銘柄コード"].dropna() if str(t).strip()]
+    tickers = list(dict.fromkeys(tickers))
+    funds = [t for t in tickers if get_ticker_type(t) == "JP_FUND"]
+    stocks = [t for t in tickers if get_ticker_type(t) != "JP_FUND"]
+    return funds, stocks
+
+def warm_once():
+    started = time.perf_counter()
+    funds, stocks = collect_tickers()
+    print(f"[{datetime.now():%Y-%m-%d %H:%M:%S}] Warming {len(funds)} funds, {len(stocks)} stocks + USDJPY")
+    wave = fetch_all(
+        funds, stocks, with_fx=True, timeout=WARM_TIMEOUT,
+        on_progress=lambda c, n, total: print(f"  fund {n}/{total} ({c})"),
+    )
+    _, failures = wave["stocks"]
+    for t, reason in failures.items():
+        print(f"  stock failed: {t} ({reason})")
+    if wave["timed_out"]:
+        print(f"  timed out: {', '.join(wave['timed_out'])}")
+    print(f"  USDJPY = {wave['fx']}  ({time.perf_counter() - started:.1f}s)")
+
+def next_run(now=None):
+    """次に実行すべき時刻 (いずれかの資産の公表時刻 + WARM_DELAY)"""
+    now = now or datetime.now(timezone.utc)
+    # 公表直後〜WARM_DELAY の間に呼ばれた場合はその回を対象にする
+    return min(next_publication(a, now - WARM_DELAY)[1] for a in ASSET_TYPES) + WARM_DELAY
+
+def main():
+    parser = argparse.ArgumentParser(description="stock_data_cache を先読みする")
+    parser.add_argument("--once", action="store_true", help="1回だけ実行して終了する (cron 用)")
+    args = parser.parse_args()
+
+    # cron から起動してもアプリと同じ stock_data_cache / portfolio.db を使う
+    # (core は python がスクリプトのディレクトリを sys.path に入れるので、どこから起動しても import できる)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    warm_once()
+    if args.once: return
+    while True:
+        at = next_run()
+        print(f"Next warm-up at {at.astimezone():%Y-%m-%d %H:%M %Z}")
+        while (wait := (at - datetime.now(timezone.utc)).total_seconds()) > 0:
+            time.sleep(min(wait, 3600))
+        try: warm_once()
+        except Exception as e: print(f"Warm-up error: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+保有銘柄カードのチャート描画とPNGキャッシュ。
+
+描画は pyplot を使わず Figure を直接生成するため、図がグローバルに残らない。
+render_history_png はプロセスプールからも呼べるよう、引数・戻り値ともpickle可能にしている。
+インタラクティブ表示用の Plotly 版 (build_history_figure) もここに置く。
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+
+DEFAULT_THEME = "dark_background"
+BG_COLOR = '#0e1117'
+CHART_CACHE_ENTRIES = 256
+
+def render_history_png(hist, avg_price, tx_points, cur_sym, theme=DEFAULT_THEME):
+    """価格推移チャート (取得単価ライン・購入ポイント付き) をPNGバイト列で返す"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.style
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter
+
+    with matplotlib.style.context(theme):
+        fig = Figure(figsize=(6, 3))
+        ax = fig.subplots()
+
+        # Background transparent/match streamlits dark
+        fig.patch.set_facecolor(BG_COLOR)
+        ax.set_facecolor(BG_COLOR)
+
+        if len(hist) == 1:
+            ax.plot(hist.index, hist, color='#dddddd', marker='o', linestyle='None', label='Price')
+        else:
+            ax.plot(hist.index, hist, color='#dddddd', lw=1.2, label='Price')
+
+        ax.axhline(y=avg_price, color='red', ls='--', alpha=0.6, label='Avg')
+
+        total_days = (hist.index[-1] - hist.index[0]).days
+        if total_days < 90:
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
+            if total_days == 0:
+                ax.set_xlim(hist.index[0] - timedelta(days=1), hist.index[0] + timedelta(days=1))
+        else:
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%y/%m'))
+
+        # Plot Buy Points
+        for bd, price in tx_points:
+            ax.scatter([bd], [price], color='#ff4b4b', s=30, zorder=5, alpha=0.9)
+
+        ax.legend(fontsize=7, loc='upper left', frameon=False, labelcolor='white')
+        ax.yaxis.set_major_formatter(FuncFormatter(lambda x, p: f"{cur_sym}{x:,.0f}"))
+        ax.grid(True, ls=':', alpha=0.2, color='white')
+        ax.tick_params(labelsize=8, colors='white')
+        for spine in ax.spines.values():
+            spine.set_edgecolor('#444')
+
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", facecolor=fig.get_facecolor(), bbox_inches="tight")
+    return buf.getvalue()
+
+def buy_points(hist, tx):
+    """チャート期間内の購入ポイント [(Timestamp, 単価)]"""
+    if hist.empty: return []
+    pts = []
+    for t in tx:
+        bd = pd.Timestamp(t['date'])
+        if hist.index[0] <= bd <= hist.index[-1]:
+            pts.append((bd, float(t['price'])))
+    return pts
+
+def history_hash(hist):
+    h = hashlib.sha1()
+    h.update(hist.index.asi8.tobytes() if isinstance(hist.index, pd.DatetimeIndex) else str(list(hist.index)).encode())
+    h.update(hist.to_numpy(dtype=float).tobytes())
+    return h.hexdigest()
+
+def chart_key(ticker, hist, avg_price, tx_points, cur_sym, theme=DEFAULT_THEME):
+    """(ticker, 履歴ハッシュ, 取得単価, 購入ポイント, テーマ) のキャッシュキー"""
+    pts = tuple((bd.value, round(p, 6)) for bd, p in tx_points)
+    return (ticker, history_hash(hist), round(float(avg_price), 6), pts, cur_sym, theme)
+
+class ChartCache:
+    """PNGバイト列のLRUキャッシュ (スレッドセーフ)"""
+
+    def __init__(self, max_entries=CHART_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._data.get(key)
+            if png is not None:
+                self._data.move_to_end(key)
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            self._data[key] = png
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+def make_render_pool(max_workers=2):
+    """チャート描画用のプロセスプール (spawn: サーバープロセスのスレッドをforkしない)"""
+    import multiprocessing
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+def render_missing(jobs, cache, pool=None):
+    """
+    jobs: [(key, render_history_png の引数タプル)]
+    キャッシュに無いものだけをプロセスプールで並列描画してキャッシュに入れる。
+    プールが使えない場合はその場で描画する。
+    """
+    misses = [(k, args) for k, args in jobs if cache.get(k) is None]
+    if not misses: return
+    if pool is not None:
+        try:
+            futures = [(k, pool.submit(render_history_png, *args)) for k, args in misses]
+            for k, fut in futures:
+                cache.put(k, fut.result())
+            return
+        except Exception as e:
+            print(f"Chart pool error, rendering inline: {e}")
+    for k, args in misses:
+        if cache.get(k) is None:
+            cache.put(k, render_history_png(*args))
+
+def build_history_figure(hist, avg_price, tx_points, cur_sym):
+    """Plotly のインタラクティブ版チャート (hist は間引き済みを想定)"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    mode = "markers" if len(hist) == 1 else "lines"
+    fig.add_trace(go.Scatter(
+        x=hist.index, y=hist.to_numpy(), mode=mode, name="Price",
+        line=dict(color="#dddddd", width=1.2),
+        hovertemplate=f"%{{x|%Y-%m-%d}}<br>{cur_sym}%{{y:,.2f}}<extra></extra>",
+    ))
+    if tx_points:
+        fig.add_trace(go.Scatter(
+            x=[bd for bd, _ in tx_points], y=[p for _, p in tx_points], mode="markers", name="Buy",
+            marker=dict(color="#ff4b4b", size=7, opacity=0.9),
+            hovertemplate=f"購入 %{{x|%Y-%m-%d}}<br>{cur_sym}%{{y:,.2f}}<extra></extra>",
+        ))
+    fig.add_hline(y=avg_price, line=dict(color="red", dash="dash"), opacity=0.6)
+    fig.update_layout(
+        template="plotly_dark", height=260, margin=dict(t=10, l=0, r=0, b=0),
+        paper_bgcolor=BG_COLOR, plot_bgcolor=BG_COLOR, showlegend=False,
+        yaxis=dict(tickprefix=cur_sym, tickformat=",.0f", gridcolor="rgba(255,255,255,0.1)"),
+        xaxis=dict(gridcolor="rgba(255,255,255,0.1)"),
+    )
+    return fig
+
+def build_portfolio_figure(ts):
+    """ポートフォリオ評価額・投資額の推移 (ts は portfolio_timeseries の結果、間引き済みを想定)"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=ts.index, y=ts["invested"].to_numpy(), mode="lines", name="投資額",
+        line=dict(color="#888888", width=1, dash="dot"),
+        hovertemplate="%{x|%Y-%m-%d}<br>投資額 ¥%{y:,.0f}<extra></extra>",
+    ))
+    fig.add_trace(go.Scatter(
+        x=ts.index, y=ts["value"].to_numpy(), mode="lines", name="評価額",
+        line=dict(color="#dddddd", width=1.5),
+        customdata=ts[["pl", "pl_pct"]].to_numpy(),
+        hovertemplate="%{x|%Y-%m-%d}<br>評価額 ¥%{y:,.0f}<br>損益 ¥%{customdata[0]:,.0f} (%{customdata[1]:+.2f}%)<extra></extra>",
+    ))
+    fig.update_layout(
+        template="plotly_dark", height=300, margin=dict(t=10, l=0, r=0, b=0),
+        paper_bgcolor=BG_COLOR, plot_bgcolor=BG_COLOR,
+        legend=dict(orientation="h", y=1.02, x=0, font=dict(size=10)),
+        yaxis=dict(tickprefix="¥", tickformat=",.0f", gridcolor="rgba(255,255,255,0.1)"),
+        xaxis=dict(gridcolor="rgba(255,255,255,0.1)"),
+    )
+    return fig
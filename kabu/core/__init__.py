@@ -0,0 +1,104 @@
+"""
+株式管理ダッシュボードのデータ取得・キャッシュ・集計ロジック (Streamlit非依存)。
+
+スクリプトやバッチからも副作用なしで import できる。
+サブモジュールは属性アクセス時に遅延 import するため、`import core` 自体は軽い。
+
+    from core import get_history_smart, aggregate_portfolio
+"""
+import importlib
+
+_EXPORTS = {
+    # utils
+    "get_ticker_type": "utils",
+    "safe_float": "utils",
+    # funds
+    "fetch_fund_snapshot": "funds",
+    "fund_snapshot_steps": "funds",
+    "run_steps": "funds",
+    "scrape_japan_fund_history_params": "funds",
+    "parse_fund_history_table": "funds",
+    "parse_fund_history_state": "funds",
+    "parse_fund_state": "funds",
+    "parse_fund_price_board": "funds",
+    # cache
+    "CACHE_DIR": "cache",
+    "load_cached_history": "cache",
+    "load_fund_snapshot": "cache",
+    "merge_history": "cache",
+    "ASSET_TYPES": "cache",
+    "asset_type": "cache",
+    "cache_entries": "cache",
+    "cache_stats": "cache",
+    # freshness
+    "is_fresh": "freshness",
+    "is_trading_day": "freshness",
+    "last_publication": "freshness",
+    "next_publication": "freshness",
+    # fetch
+    "FUND_FETCH_WORKERS": "fetch",
+    "DEFAULT_USDJPY": "fetch",
+    "fetch_usdjpy_rate": "fetch",
+    "get_usdjpy_rate": "fetch",
+    "get_usdjpy_rate_deferred": "fetch",
+    "get_usdjpy_history": "fetch",
+    "invalidate_cache": "fetch",
+    "fetch_fund_name": "fetch",
+    "get_fund_snapshot": "fetch",
+    "get_history_smart": "fetch",
+    "get_histories_batch": "fetch",
+    "prefetch_fund_snapshots": "fetch",
+    # portfolio_store
+    "PORTFOLIO_COLUMNS": "portfolio_store",
+    "load_portfolio": "portfolio_store",
+    "save_portfolio_if_changed": "portfolio_store",
+    "append_transactions": "portfolio_store",
+    "list_portfolios": "portfolio_store",
+    # throttle
+    "CircuitOpenError": "throttle",
+    "guard_for": "throttle",
+    "open_circuits": "throttle",
+    # trace
+    "span": "trace",
+    "start_trace": "trace",
+    "end_trace": "trace",
+    "in_context": "trace",
+    # async_fetch
+    "fetch_all": "async_fetch",
+    "load_cached_wave": "async_fetch",
+    # aggregate
+    "AGG_COLUMNS": "aggregate",
+    "classify_tickers": "aggregate",
+    "normalize_holdings": "aggregate",
+    "transactions_by_ticker": "aggregate",
+    "build_price_table": "aggregate",
+    "aggregate_portfolio": "aggregate",
+    "PAGE_SIZE": "aggregate",
+    "SORT_KEYS": "aggregate",
+    "page_holdings": "aggregate",
+    # timeseries
+    "TS_COLUMNS": "timeseries",
+    "align_prices": "timeseries",
+    "portfolio_timeseries": "timeseries",
+    # resample
+    "RESOLUTIONS": "resample",
+    "resample_history": "resample",
+    "history_view": "resample",
+    # downsample
+    "CHART_POINTS": "downsample",
+    "lttb_indices": "downsample",
+    "downsample_series": "downsample",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
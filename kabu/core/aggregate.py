@@ -0,0 +1,144 @@
+"""
+ポートフォリオ集計エンジン (groupby / NumPy によるベクトル演算)。
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .utils import NUMBER_NOISE
+
+AGG_COLUMNS = [
+    "type", "shares", "cost_sum", "avg_price", "price", "prev", "week_ref",
+    "val_jpy", "inv_jpy", "diff_jpy", "diff_pct",
+    "day_chg", "day_pct", "week_chg", "week_pct",
+]
+
+def classify_tickers(tickers):
+    """get_ticker_type のベクトル版 (Series -> Series)"""
+    t = tickers.astype(str).str.strip().str.upper()
+    return pd.Series(
+        np.select([t.str.endswith(".T"), t.str.isalpha()], ["JP_STOCK", "US_STOCK"], "JP_FUND"),
+        index=tickers.index
+    )
+
+def _to_num(s):
+    """safe_float のベクトル版 (カンマ・%・円は除き、空文字・N/A 等は 0)"""
+    if not pd.api.types.is_numeric_dtype(s):
+        s = s.astype(str)
+        for ch in NUMBER_NOISE: s = s.str.replace(ch, '', regex=False)
+        s = s.str.strip()
+    return pd.to_numeric(s, errors='coerce').fillna(0.0).astype(float)
+
+def normalize_holdings(rows):
+    """編集テーブル (銘柄コード/保有株数/購入単価/購入日) を集計用の列名に揃え、空コード行を除く"""
+    h = pd.DataFrame({
+        "ticker": rows["銘柄コード"].astype(str).str.strip(),
+        "shares": _to_num(rows["保有株数"]),
+        "price": _to_num(rows["購入単価"]),
+        "date": pd.to_datetime(rows["購入日"], errors='coerce').fillna(pd.Timestamp(datetime.now().date())).dt.date,
+    }, index=rows.index)
+    return h[(h["ticker"] != "") & (h["ticker"] != "nan")]
+
+def transactions_by_ticker(holdings):
+    """
+    銘柄ごとの購入明細 {ticker: [{"shares", "price", "date"}, ...]} (入力順)。
+    groupby してグループごとに to_dict するより桁違いに速いので、列をリストにして1回だけ走査する。
+    """
+    out = {}
+    cols = (holdings[c].tolist() for c in ("ticker", "shares", "price", "date"))
+    for t, shares, price, d in zip(*cols):
+        out.setdefault(t, []).append({"shares": shares, "price": price, "date": d})
+    return out
+
+def build_price_table(histories):
+    """
+    銘柄ごとの履歴から 最新値(price)・前回値(prev)・前週参照値(week_ref) の表を作る。
+    前週参照は最新日の7日前以前で最後の値 (足りなければ先頭)。日付で決めるため、
+    日次・週次どちらの履歴でも、休場日を挟んでも同じ意味になる。
+    """
+    recs = {}
+    week = np.timedelta64(7, "D")
+    for t, df in histories.items():
+        c = df['Close'].to_numpy(dtype=float) if not df.empty else np.empty(0)
+        n = len(c)
+        price = c[-1] if n >= 1 else 0.0
+        prev = c[-2] if n >= 2 else 0.0
+        week_ref = 0.0
+        if n >= 2:
+            d = df.index.to_numpy(dtype="datetime64[ns]")
+            i = int(d.searchsorted(d[-1] - week, side="right")) - 1
+            week_ref = c[max(i, 0)]
+        recs[t] = (price, prev, week_ref)
+    prices = pd.DataFrame.from_dict(recs, orient="index", columns=["price", "prev", "week_ref"])
+    return prices.fillna(0.0)
+
+def aggregate_portfolio(holdings, prices, usdjpy_rate):
+    """
+    保有明細 (normalize_holdings の結果) と価格表 (build_price_table の結果) から
+    銘柄ごとの集計値を groupby / NumPy 演算で一括計算する。
+    米国株は USD/JPY を掛け、投信は1万口あたりの基準価額なので /10000 する。
+    戻り値: ticker をindexとし AGG_COLUMNS を列に持つ DataFrame (初出順)
+    """
+    if holdings.empty:
+        return pd.DataFrame(columns=AGG_COLUMNS)
+
+    h = holdings.assign(cost=holdings["shares"] * holdings["price"])
+    g = h.groupby("ticker", sort=False).agg(shares=("shares", "sum"), cost_sum=("cost", "sum"))
+    g = g.join(prices[["price", "prev", "week_ref"]], how="left").fillna(0.0)
+    g["type"] = classify_tickers(g.index.to_series())
+
+    shares = g["shares"].to_numpy()
+    cost = g["cost_sum"].to_numpy()
+    price = g["price"].to_numpy()
+    prev = g["prev"].to_numpy()
+    week_ref = g["week_ref"].to_numpy()
+    is_us = (g["type"] == "US_STOCK").to_numpy()
+    is_fund = (g["type"] == "JP_FUND").to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g["avg_price"] = np.where(shares > 0, cost / shares, 0.0)
+
+        factor = np.where(is_us, usdjpy_rate, 1.0) * np.where(is_fund, 1 / 10000, 1.0)
+        val = price * shares * factor
+        inv = cost * factor
+        g["val_jpy"] = val
+        g["inv_jpy"] = inv
+        g["diff_jpy"] = val - inv
+        g["diff_pct"] = np.where(inv > 0, (val - inv) / inv * 100, 0.0)
+
+        has_day = (price > 0) & (prev > 0)
+        g["day_chg"] = np.where(has_day, price - prev, 0.0)
+        g["day_pct"] = np.where(has_day, (price - prev) / prev * 100, 0.0)
+
+        has_week = week_ref > 0
+        g["week_chg"] = np.where(has_week, price - week_ref, 0.0)
+        g["week_pct"] = np.where(has_week, (price - week_ref) / week_ref * 100, 0.0)
+
+    return g[AGG_COLUMNS]
+
+# --- カード一覧の並び替え・絞り込み・ページ分け ---
+PAGE_SIZE = 20   # 1ページに描くカード数
+SORT_KEYS = {"weight": "val_jpy", "pl": "diff_jpy", "pl_pct": "diff_pct", "day_pct": "day_pct"}
+
+def page_holdings(agg, sort_by=None, ascending=False, asset_types=(), pl=None, pending=(), page=0, page_size=PAGE_SIZE):
+    """
+    集計表 (aggregate_portfolio の結果) を絞り込み・並び替えて、1ページ分の ticker を返す。
+    sort_by: SORT_KEYS のキー (None は登録順)、pl: "gain" / "loss" / None、asset_types: 空なら全タイプ。
+    取得中 (pending) の銘柄は損益が未確定なので、損益で絞り込まず常に末尾に置く。
+    戻り値: (ticker のリスト, 条件に合う件数, ページ番号 (範囲外は最後のページに寄せる))
+    """
+    df = agg[agg["type"].isin(asset_types)] if asset_types else agg
+    waiting = df.index.isin(list(pending))
+    if pl in ("gain", "loss"):
+        keep = waiting | ((df["diff_jpy"] >= 0).to_numpy() == (pl == "gain"))
+        df, waiting = df[keep], waiting[keep]
+    keys = pd.DataFrame({"waiting": waiting, "order": np.arange(len(df))}, index=df.index)
+    if sort_by:
+        keys["value"] = df[SORT_KEYS[sort_by]].to_numpy()
+        keys = keys.sort_values(["waiting", "value", "order"], ascending=[True, ascending, True])
+    else:
+        keys = keys.sort_values(["waiting", "order"])
+    n = len(keys)
+    page = min(max(page, 0), max((n - 1) // page_size, 0))
+    return list(keys.index[page * page_size:(page + 1) * page_size]), n, page
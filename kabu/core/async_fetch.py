@@ -0,0 +1,208 @@
+"""
+asyncio による一括データ取得 (投信ページ・ファンド名・株価・為替を1つのイベントループで同時に取得)。
+
+投信ページは aiohttp で非同期に取得し、手順は同期版と同じ *_steps ジェネレータを使う。
+yfinance (株価一括・為替) は同期APIのため、専用の小さなスレッドプールで1本ずつ並走させる。
+手順の間の解析やキャッシュの読み書き (同期I/O) は asyncio.to_thread で行い、イベントループを止めない。
+UIからは同期ファサード fetch_all() を呼ぶ。取得完了を待たずに描く場合は、先に load_cached_wave() で
+キャッシュだけから同じ形の結果を作り、fetch_all(on_result=...) で届いた分から差し替える。
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from . import http_client
+from .cache import get_store, load_cached_histories, load_fund_snapshot, load_fx_rate
+from .fetch import (
+    DEFAULT_USDJPY, USDJPY_TICKER, cached_fund_snapshot_steps, get_histories_batch, get_usdjpy_rate,
+    get_usdjpy_rate_deferred,
+)
+from .funds import _empty_snapshot
+from .throttle import CircuitOpenError, guard_for, is_response_ok
+from .trace import in_context, span
+
+REQUEST_TIMEOUT = 10   # 1リクエストあたり (秒)
+WAVE_TIMEOUT = 60      # 一括取得全体の締め切り (秒)。超過分はキャンセルしてキャッシュを使う
+
+# asyncio.run は終了時に既定のexecutorの完了を待つため、締め切りを越えた同期呼び出しで
+# ブロックしないよう yfinance 用には別のexecutorを使う
+_sync_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="kabu-sync")
+
+async def _get_text(session, url):
+    """
+    GETして (status, text) を返す。429/5xx と通信エラーは指数バックオフで再試行。
+    同期版 (funds.http_get_text) と同じホスト単位のレート制限・ブレーカーを共有する。
+    """
+    with span("http_get", url=url, mode="async") as attrs:
+        status, text = await _get_text_guarded(session, url)
+        attrs["status"] = status
+        return status, text
+
+async def _get_text_guarded(session, url):
+    import aiohttp
+
+    guard = guard_for(url)
+    try:
+        await guard.before_request_async()
+    except CircuitOpenError:
+        print(f"Circuit open, skipped {url}")
+        return None, ""
+
+    status, text = None, ""
+    try:
+        for attempt in range(http_client.MAX_RETRIES + 1):
+            retry = attempt < http_client.MAX_RETRIES
+            delay = min(http_client.BACKOFF_FACTOR * (2 ** attempt), http_client.BACKOFF_MAX)
+            if attempt:
+                await asyncio.sleep(guard.bucket.reserve())
+            try:
+                async with session.get(url) as res:
+                    if res.status in http_client.RETRY_STATUS and retry:
+                        ra = res.headers.get("Retry-After", "")
+                        await asyncio.sleep(min(float(ra), http_client.RETRY_AFTER_MAX) if ra.isdigit() else delay)
+                        continue
+                    status, text = res.status, await res.text()
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if retry:
+                    await asyncio.sleep(delay)
+                    continue
+                print(f"Request error {url}: {e}")
+    except asyncio.CancelledError:
+        # 締め切りでキャンセルされた場合も失敗として数える (half_open の試行枠を解放する)
+        guard.record(False)
+        raise
+    guard.record(is_response_ok(status))
+    return status, text
+
+def _advance(steps, value):
+    """ジェネレータを1手進めて (完了したか, URL または戻り値) を返す (StopIteration は Future に載せられない)"""
+    try: return False, steps.send(value)
+    except StopIteration as e: return True, e.value
+
+async def run_steps_async(steps, session):
+    """*_steps ジェネレータを aiohttp セッションで実行する (run_steps の非同期版)。通信の間の手順は別スレッドで進める"""
+    done, value = await asyncio.to_thread(_advance, steps, None)
+    while not done:
+        done, value = await asyncio.to_thread(_advance, steps, await _get_text(session, value))
+    return value
+
+async def _fetch_fund(code, session):
+    with span("fund_snapshot", code=code):
+        return await run_steps_async(cached_fund_snapshot_steps(code), session)
+
+def _fallback_snapshot(code):
+    cached, _ = load_fund_snapshot(code)
+    return cached if cached is not None else _empty_snapshot(code)
+
+def _fallback_histories(tickers):
+    """締め切りに間に合わなかった株価はキャッシュで代替し、キャッシュも無い銘柄だけを "timeout" とする"""
+    histories = {t: df for t, (df, _) in load_cached_histories(tickers).items() if not df.empty}
+    return histories, {t: "timeout" for t in tickers if t not in histories}
+
+async def _fetch_wave(fund_codes, stock_tickers, with_fx, defer_fx, on_progress, on_result, timeout):
+    import aiohttp
+
+    result = {"funds": {}, "stocks": ({}, {}), "fx": None, "fx_history": None, "timed_out": []}
+    # USD/JPY の日次履歴 (評価額推移の換算用) は株価と同じ一括ダウンロードに含める
+    batch = stock_tickers + ([USDJPY_TICKER] if with_fx else [])
+    connector = aiohttp.TCPConnector(limit=http_client.FETCH_CONCURRENCY, ttl_dns_cache=300)
+    headers = {k: v for k, v in http_client.HEADERS.items() if k != 'Accept-Encoding'}
+    async with aiohttp.ClientSession(
+        headers=headers, connector=connector,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+    ) as session:
+        tasks = {}
+        for c in fund_codes:
+            task = asyncio.create_task(_fetch_fund(c, session))
+            tasks[task] = ("fund", c)
+        loop = asyncio.get_running_loop()
+        if batch:
+            fut = loop.run_in_executor(_sync_executor, in_context(get_histories_batch, batch))
+            tasks[asyncio.ensure_future(fut)] = ("stocks", None)
+        if with_fx:
+            fut = loop.run_in_executor(_sync_executor, in_context(get_usdjpy_rate_deferred if defer_fx else get_usdjpy_rate))
+            tasks[asyncio.ensure_future(fut)] = ("fx", None)
+
+        deadline = None if timeout is None else loop.time() + timeout
+        pending = set(tasks)
+        n_funds = 0
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=None if deadline is None else max(0.0, deadline - loop.time()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done: break
+            for task in done:
+                kind, key = tasks[task]
+                err = task.exception()
+                if err is not None:
+                    print(f"Async fetch error ({kind} {key or ''}): {err}")
+                if kind == "fund":
+                    snap = task.result() if err is None else await asyncio.to_thread(_fallback_snapshot, key)
+                    result["funds"][key] = snap
+                    n_funds += 1
+                    if on_progress: on_progress(key, n_funds, len(fund_codes))
+                    if on_result: on_result(kind, key, result["funds"][key])
+                elif err is None:
+                    result[kind] = task.result()
+                    if on_result: on_result(kind, key, result[kind])
+
+        # 締め切り超過: 残りはキャンセルし、キャッシュ済みデータで代替する
+        # (yfinance のスレッド自体は止められないが、結果は待たない)
+        for task in pending:
+            task.cancel()
+        for task in pending:
+            kind, key = tasks[task]
+            result["timed_out"].append(key or kind)
+            if kind == "fund":
+                result["funds"][key] = await asyncio.to_thread(_fallback_snapshot, key)
+            elif kind == "stocks":
+                result["stocks"] = await asyncio.to_thread(_fallback_histories, batch)
+        if pending:
+            await asyncio.wait(pending)
+
+    if with_fx and result["fx"] is None:
+        result["fx"] = DEFAULT_USDJPY
+    histories, failures = result["stocks"]
+    fx_hist = histories.pop(USDJPY_TICKER, None)
+    failures.pop(USDJPY_TICKER, None)
+    if fx_hist is not None: result["fx_history"] = fx_hist["Close"]
+    return result
+
+def load_cached_wave(fund_codes=(), stock_tickers=(), with_fx=True):
+    """
+    fetch_all と同じ形の結果を、通信せずにキャッシュだけから作る (取得完了前の仮表示用)。
+    キャッシュに無い銘柄は funds / stocks に含めない。fx は保存済みの前回値 (無ければ None)。
+    """
+    funds = {}
+    for c in dict.fromkeys(fund_codes):
+        snap, _ = load_fund_snapshot(c)
+        if snap is not None: funds[c] = snap
+    batch = list(dict.fromkeys(stock_tickers)) + ([USDJPY_TICKER] if with_fx else [])
+    histories = {t: df for t, (df, _) in load_cached_histories(batch).items() if not df.empty}
+    fx_hist = histories.pop(USDJPY_TICKER, None)
+    return {
+        "funds": funds, "stocks": (histories, {}), "fx": load_fx_rate()[0] if with_fx else None,
+        "fx_history": fx_hist["Close"] if fx_hist is not None else None, "timed_out": [],
+    }
+
+def fetch_all(fund_codes=(), stock_tickers=(), with_fx=True, on_progress=None, timeout=WAVE_TIMEOUT, defer_fx=False,
+              on_result=None):
+    """
+    投信スナップショット (名前・基準価額・履歴)、個別株履歴、USD/JPY をまとめて同時に取得する同期ファサード。
+    on_progress(code, n_done, n_total) は投信1件完了ごとに呼び出し元スレッドで呼ばれる。
+    on_result(kind, key, value) は取得が1つ終わるごとに呼び出し元スレッドで呼ばれる
+    ("fund", code, snapshot) / ("stocks", None, (histories, failures)) / ("fx", None, rate)。
+    histories には為替の日次履歴 (USDJPY=X) も含まれる。
+    defer_fx=True なら為替は保存済みの前回値で済ませ、期限切れの更新を待たない (get_usdjpy_rate_deferred)。
+    timeout は全体の締め切り (秒)。None なら締め切りなしで全件を待つ (1リクエストごとの REQUEST_TIMEOUT は効く)。
+    締め切りに間に合わなかった分はキャッシュで代替して timed_out に載せ、キャッシュも無い株価だけを failures に "timeout" とする。
+    戻り値: {"funds": {code: snapshot}, "stocks": (histories, failures), "fx": rate | None,
+            "fx_history": USD/JPY 日次 Series | None, "timed_out": [...]}
+    実行中のイベントループがあるスレッドからは呼べない (Streamlit のスクリプトスレッドには無い)。
+    """
+    fund_codes = list(dict.fromkeys(fund_codes))
+    stock_tickers = list(dict.fromkeys(stock_tickers))
+    # 各銘柄の保存はストアへの1回の書き込みにまとめる
+    with span("fetch_all", funds=len(fund_codes), stocks=len(stock_tickers)), get_store().batch():
+        return asyncio.run(_fetch_wave(fund_codes, stock_tickers, with_fx, defer_fx, on_progress, on_result, timeout))
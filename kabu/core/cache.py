@@ -0,0 +1,208 @@
+"""
+stock_data_cache ディレクトリへの履歴キャッシュ読み書き。
+
+個別株・投信の履歴は全銘柄を1つの列指向ファイル (prices.arrow, core/price_store.py) にまとめ、
+投信の名前・基準価額はその索引のメタデータに持つ。為替レートは <ペア>.json。
+環境変数 KABU_CACHE_BACKEND で SQLite / Redis に切り替えると、複数レプリカでキャッシュを共有する (core/cache_backend.py)。
+旧形式 (<ティッカー>.csv / 投信の <コード>.json) は、ストアに無い銘柄を読む時に取り込む。
+ストアは容量・銘柄数の上限を超えると最近読まれていない銘柄から捨て (LRU)、
+invalidate() で銘柄・資産タイプ単位に消せる。ヒット・ミスは cache_stats() で確認できる。
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from .funds import _empty_snapshot
+from .cache_backend import CACHE_BACKEND_ENV, open_backend
+from .utils import get_ticker_type
+
+CACHE_DIR = "stock_data_cache"
+HISTORY_DAYS = 730      # 保持する履歴期間 (約2年)
+CACHE_MAX_BYTES = 64 * 1024 * 1024  # 履歴ストアの容量上限 (約2年分の日次で数千銘柄)
+CACHE_MAX_ENTRIES = 2000            # 履歴ストアの銘柄数上限
+FX_PAIRS = ("USDJPY",)
+ASSET_TYPES = ("JP_STOCK", "US_STOCK", "JP_FUND", "FX")
+FETCH_LEASE_TTL = 60    # 1レプリカが取得を担当する最長時間 (秒)。書き込み後に返すまで、他のレプリカは手元のキャッシュを使う
+
+_store = None
+_store_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+def cache_path(ticker, ext="csv"):
+    safe_ticker = "".join(c for c in ticker if c.isalnum())
+    return os.path.join(CACHE_DIR, f"{safe_ticker}.{ext}")
+
+def get_store():
+    """プロセス内で共有するキャッシュのバックエンド (KABU_CACHE_BACKEND、既定はローカルの PriceStore)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_backend(os.environ.get(CACHE_BACKEND_ENV), CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES)
+        return _store
+
+def _legacy_entry(ticker):
+    """
+    旧形式のキャッシュ (投信スナップショット <コード>.json、無ければ <ティッカー>.csv) を
+    ストアに取り込んで (DataFrame, meta) を返す。無ければ (空DataFrame, None)。
+    ファイル名からは元のティッカーを復元できないため、ストアに無い銘柄を読む時に1件ずつ移す (元ファイルは残す)。
+    """
+    try:
+        path = cache_path(ticker, "json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                rec = json.load(f)
+            h = rec.get("history") or {}
+            if h.get("dates"):
+                df = pd.DataFrame({"Close": h["close"]}, index=pd.to_datetime(h["dates"]))
+                get_store().put(
+                    ticker, df, source="legacy_json", updated=os.path.getmtime(path),
+                    name=rec.get("name"), nav=rec.get("nav"), nav_date=rec.get("nav_date"),
+                )
+                return get_store().get(ticker)
+        path = cache_path(ticker)
+        if os.path.exists(path):
+            df = pd.read_csv(path, index_col=0, parse_dates=True)
+            if len(df) > 0:
+                get_store().put(ticker, df[['Close']], source="legacy_csv", updated=os.path.getmtime(path))
+                return get_store().get(ticker)
+    except Exception as e:
+        print(f"Legacy cache import error {ticker}: {e}")
+    return pd.DataFrame(), None
+
+def _entries(tickers):
+    found = get_store().get_many(tickers)
+    missing = [t for t, (_, meta) in found.items() if meta is None]
+    with _stats_lock:
+        _stats["hits"] += len(found) - len(missing)
+        _stats["misses"] += len(missing)
+    if missing:
+        with get_store().batch():
+            for t in missing: found[t] = _legacy_entry(t)
+    return found
+
+def _updated_at(meta):
+    return datetime.fromtimestamp(meta["updated"])
+
+def load_cached_history(ticker):
+    """キャッシュ済み履歴と最終更新日時を返す。無ければ (空DataFrame, None)"""
+    return load_cached_histories([ticker])[ticker]
+
+def load_cached_histories(tickers):
+    """load_cached_history の一括版 {ticker: (DataFrame, 最終更新日時)} (ストアを開くのは1回)"""
+    out = {}
+    for t, (df, meta) in _entries(tickers).items():
+        out[t] = (df, _updated_at(meta)) if meta is not None and not df.empty else (pd.DataFrame(), None)
+    return out
+
+def save_cached_history(ticker, df, source="yfinance"):
+    try:
+        get_store().put(ticker, df, source=source)
+    except Exception as e:
+        print(f"History write error {ticker}: {e}")
+
+def load_fund_snapshot(code):
+    """投信のスナップショット (名前・基準価額・履歴) と最終更新日時を返す。無ければ (None, None)"""
+    df, meta = _entries([code])[code]
+    if meta is None or df.empty: return None, None
+    snap = _empty_snapshot(code)
+    snap["name"] = meta.get("name")
+    snap["nav"] = meta.get("nav")
+    snap["nav_date"] = pd.Timestamp(meta["nav_date"]) if meta.get("nav_date") else None
+    snap["history"] = df
+    return snap, _updated_at(meta)
+
+def save_fund_snapshot(snap):
+    try:
+        get_store().put(
+            snap["code"], snap["history"], source="yahoo_jp",
+            name=snap["name"], nav=snap["nav"],
+            nav_date=snap["nav_date"].strftime("%Y-%m-%d") if snap["nav_date"] is not None else None,
+        )
+    except Exception as e:
+        print(f"Snapshot write error {snap['code']}: {e}")
+
+def load_fx_rate(pair="USDJPY"):
+    """保存済みの為替レートと取得時刻 (aware datetime)。無ければ (None, None)"""
+    try: return get_store().load_fx(pair)
+    except Exception as e:
+        print(f"FX read error {pair}: {e}")
+        return None, None
+
+def save_fx_rate(rate, fetched_at, pair="USDJPY"):
+    try: get_store().save_fx(pair, rate, fetched_at)
+    except Exception as e: print(f"FX write error {pair}: {e}")
+
+def fetch_lease(key, ttl=FETCH_LEASE_TTL):
+    """
+    key (銘柄・為替など) の取得を担当してよいか。共有バックエンドで他のレプリカが取得中なら False
+    (呼び出し側は手元のキャッシュで済ませ、同じページを同時に取りに行かない)。
+    """
+    try: return get_store().lease(key, ttl)
+    except Exception as e:
+        print(f"Cache lease error {key}: {e}")
+        return True
+
+def release_lease(key):
+    """fetch_lease で取った担当を返す (batch() の間は書き込みを反映した後)"""
+    try: get_store().release(key)
+    except Exception as e: print(f"Cache lease error {key}: {e}")
+
+def asset_type(ticker):
+    """キャッシュ管理用の資産タイプ (為替 "USDJPY=X" は FX)"""
+    return "FX" if str(ticker).upper().endswith("=X") else get_ticker_type(ticker)
+
+def invalidate(tickers=(), asset_types=()):
+    """
+    指定した銘柄・資産タイプのキャッシュだけを消す (旧形式のファイルも消し、次回は再取得させる)。
+    戻り値: 消した銘柄のリスト
+    """
+    store = get_store()
+    targets = set(tickers)
+    if asset_types:
+        targets |= {t for t in store.meta() if asset_type(t) in asset_types}
+    removed = store.delete(sorted(targets))
+    files = [cache_path(t, ext) for t in targets for ext in ("csv", "json")]
+    if "FX" in asset_types:
+        removed += [p for p in FX_PAIRS if store.clear_fx(p)]
+    for path in files:
+        try:
+            if os.path.exists(path): os.remove(path)
+        except Exception as e:
+            print(f"Cache remove error {path}: {e}")
+    return removed
+
+def cache_entries():
+    """キャッシュ済み銘柄の索引 {ticker: meta}"""
+    return get_store().meta()
+
+def cache_stats():
+    """件数・容量・資産タイプ別の内訳とヒット率"""
+    store = get_store()
+    meta = store.meta()
+    by_type = {}
+    for t, m in meta.items():
+        n, b = by_type.get(asset_type(t), (0, 0))
+        by_type[asset_type(t)] = (n + 1, b + (m.get("bytes") or 0))
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    return {
+        "entries": len(meta), "bytes": sum(b for _, b in by_type.values()),
+        "max_entries": store.max_entries, "max_bytes": store.max_bytes,
+        "by_type": by_type, "hits": hits, "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else None,
+        "evictions": store.evictions,
+    }
+
+def merge_history(old, new):
+    """差分(new)をキャッシュ(old)に追記する。重複期間はnew側を優先し、保持期間外は捨てる"""
+    if old.empty: return new[['Close']]
+    if new.empty: return old[['Close']]
+    old = old[old.index < new.index.min()]
+    df = pd.concat([old[['Close']], new[['Close']]])
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    cutoff = df.index[-1] - timedelta(days=HISTORY_DAYS)
+    return df[df.index >= cutoff]
@@ -0,0 +1,437 @@
+"""
+履歴キャッシュのバックエンド (ローカルディスク / SQLite / Redis プロトコル)。
+
+複数レプリカ (Cloud Run のオートスケールなど) で同じキャッシュを共有できるよう、保存先を環境変数で切り替える。
+
+    KABU_CACHE_BACKEND=local                        # 既定: stock_data_cache/prices.arrow (core/price_store.py)
+    KABU_CACHE_BACKEND=sqlite:///data/kabu_cache.db # SQLite (共有ボリューム上のファイルなど)
+    KABU_CACHE_BACKEND=redis://:password@host:6379/0 # Redis (Memorystore など)。ローカル確認は python -m core.resp
+
+どのバックエンドも同じインターフェース (CacheBackend) を持つ:
+get / get_many / meta / put / put_many / delete / batch / flush、為替レートの load_fx / save_fx / clear_fx、
+取得の重複を防ぐ lease / release (他のレプリカが取得中なら False。書き込み後に返す)。
+書き込みは batch() の間まとめておき、抜けた時に1回で反映する。容量・銘柄数の上限は LRU で守る。
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+CACHE_BACKEND_ENV = "KABU_CACHE_BACKEND"
+ROW_BYTES = 8 + 8 + 4  # date + close + ticker のオフセット (ticker の文字列分は別に足す)
+SQLITE_TIMEOUT = 30    # 他レプリカの書き込み待ち (秒)
+REDIS_PREFIX = "kabu:"
+
+def entry_bytes(ticker, rows):
+    """1銘柄分のおおよそのサイズ (バイト)"""
+    return rows * (ROW_BYTES + len(ticker.encode("utf-8")))
+
+def empty_frame():
+    return pd.DataFrame()
+
+def frame_to_bytes(df):
+    """Close の DataFrame を [日付(int64) x n, 値(float64) x n] のバイト列にする"""
+    dates = df.index.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    close = df["Close"].to_numpy(dtype=float).view(np.int64)
+    return np.concatenate([dates, close]).tobytes()
+
+def frame_from_bytes(data):
+    arr = np.frombuffer(data, dtype=np.int64)
+    n = len(arr) // 2
+    return pd.DataFrame(
+        {"Close": arr[n:].view(np.float64).copy()},
+        index=pd.DatetimeIndex(arr[:n].view("datetime64[ns]"), name="Date"),
+    )
+
+def lru_victims(entries, keep, max_entries=None, max_bytes=None):
+    """
+    entries {ticker: meta} を上限に収めるために捨てる銘柄 (最後に読まれた時刻が古い順)。
+    keep に含まれる銘柄 (今回書き込むもの) は捨てない。
+    """
+    n = len(entries)
+    total = sum(m.get("bytes") or 0 for m in entries.values())
+    over = lambda: (max_entries is not None and n > max_entries) or (max_bytes is not None and total > max_bytes)
+    victims = []
+    if not over(): return victims
+    for t in sorted((t for t in entries if t not in keep),
+                    key=lambda t: entries[t].get("accessed") or entries[t].get("updated") or 0):
+        if not over(): break
+        victims.append(t)
+        n -= 1
+        total -= entries[t].get("bytes") or 0
+    return victims
+
+class CacheBackend:
+    """
+    バックエンド共通の処理 (未書き込み分の保持・batch・読み込み時刻の記録)。
+    サブクラスは _read_many / _read_index / _commit と為替・lease / _release を実装する。
+    lease の持ち主はインスタンス (= プロセス) ごとの owner で、同じ owner なら担当中でも取り直せる。
+    """
+    name = "base"
+
+    def __init__(self, max_bytes=None, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._pending = {}    # ticker -> (DataFrame, meta) 未書き込み分
+        self._deleted = set() # 未書き込みの削除
+        self._accessed = {}   # ticker -> 最後に読まれた時刻 (未書き込み分)
+        self._deferred = 0
+        self._releases = set() # 書き込み後に返す lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    # --- サブクラスで実装 ---
+    def _read_many(self, tickers):
+        """保存済みの {ticker: (DataFrame, meta)} (無い銘柄は含めない)"""
+        raise NotImplementedError
+
+    def _read_index(self):
+        """保存済みの全銘柄の {ticker: meta}"""
+        raise NotImplementedError
+
+    def _commit(self, pending, deleted, accessed):
+        """未書き込み分を反映し、上限を超えた分を捨てる。成功したら True"""
+        raise NotImplementedError
+
+    def load_fx(self, pair):
+        """(レート, 取得時刻 aware datetime)。無ければ (None, None)"""
+        raise NotImplementedError
+
+    def save_fx(self, pair, rate, fetched_at):
+        raise NotImplementedError
+
+    def clear_fx(self, pair):
+        """保存済みなら消して True"""
+        raise NotImplementedError
+
+    def lease(self, key, ttl):
+        """ttl 秒間 key の取得を担当する。他 (別レプリカ) が担当中なら False。自分が担当中なら期限を延ばして True"""
+        return True
+
+    def _release(self, keys):
+        """自分 (owner) が担当中の lease だけを消す"""
+
+    # --- 読み込み ---
+    def get(self, ticker):
+        """(DataFrame[['Close']], meta)。無ければ (空DataFrame, None)"""
+        return self.get_many([ticker])[ticker]
+
+    def get_many(self, tickers):
+        """{ticker: (DataFrame, meta)}"""
+        with self._lock:
+            stored = self._read_many([t for t in tickers if t not in self._pending and t not in self._deleted])
+            now = time.time()
+            out = {}
+            for t in tickers:
+                hit = None if t in self._deleted else (self._pending.get(t) or stored.get(t))
+                if hit is None:
+                    out[t] = (empty_frame(), None)
+                else:
+                    self._accessed[t] = now
+                    out[t] = hit
+            return out
+
+    def meta(self):
+        """全銘柄の {ticker: meta} (未書き込み分を含む)"""
+        with self._lock:
+            out = self._read_index()
+            out.update({t: m for t, (_, m) in self._pending.items()})
+            for t in self._deleted: out.pop(t, None)
+            return out
+
+    # --- 書き込み ---
+    def put(self, ticker, df, source=None, **meta):
+        """ticker の履歴を置き換える。meta はファンド名などの任意の値 (JSON化できるもの)"""
+        df = df[['Close']].dropna().sort_index()
+        now = time.time()
+        rec = {
+            "bytes": entry_bytes(ticker, len(df)),
+            "start": df.index[0].strftime("%Y-%m-%d") if not df.empty else None,
+            "end": df.index[-1].strftime("%Y-%m-%d") if not df.empty else None,
+            "source": source, "updated": meta.pop("updated", None) or now, "accessed": now, **meta,
+        }
+        with self._lock:
+            self._deleted.discard(ticker)
+            self._pending[ticker] = (df, rec)
+            if not self._deferred:
+                self.flush()
+
+    def put_many(self, items):
+        """[(ticker, df, meta)] をまとめて書き込む"""
+        with self.batch():
+            for ticker, df, meta in items:
+                self.put(ticker, df, **meta)
+
+    def delete(self, tickers):
+        """指定した銘柄を消す。戻り値: 実際に消えた銘柄"""
+        with self._lock:
+            existing = self.meta()
+            removed = [t for t in tickers if t in existing]
+            for t in removed:
+                self._pending.pop(t, None)
+                self._deleted.add(t)
+            if removed and not self._deferred:
+                self.flush()
+            return removed
+
+    def release(self, key):
+        """lease を返す。batch() の間は、まとめた書き込みを反映してから返す"""
+        with self._lock:
+            self._releases.add(key)
+            if not self._deferred:
+                self.flush()
+
+    @contextmanager
+    def batch(self):
+        """この間の put() / delete() は保存せず、抜けた時に1回だけ反映する (入れ子・複数スレッド可)"""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._pending or self._deleted:
+                try:
+                    ok = self._commit(dict(self._pending), set(self._deleted), dict(self._accessed))
+                except Exception as e:
+                    print(f"Cache write error ({self.name}): {e}")
+                    ok = False
+                if ok:
+                    self._pending.clear()
+                    self._deleted.clear()
+                    self._accessed.clear()
+            # 書き込みに失敗しても lease は返す (他のレプリカが取り直せるように)
+            if self._releases:
+                keys, self._releases = sorted(self._releases), set()
+                try: self._release(keys)
+                except Exception as e: print(f"Cache lease release error ({self.name}): {e}")
+
+# --- SQLite ---
+class SQLiteBackend(CacheBackend):
+    """
+    1銘柄1行 (meta は JSON、履歴は frame_to_bytes の BLOB)。WAL モードで複数プロセスから読み書きできる。
+    """
+    name = "sqlite"
+
+    def __init__(self, path, max_bytes=None, max_entries=None):
+        super().__init__(max_bytes, max_entries)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as con:
+            con.executescript("""
+                CREATE TABLE IF NOT EXISTS histories (ticker TEXT PRIMARY KEY, meta TEXT NOT NULL, data BLOB NOT NULL);
+                CREATE TABLE IF NOT EXISTS fx_rates (pair TEXT PRIMARY KEY, rate REAL NOT NULL, fetched_at TEXT NOT NULL);
+            """)
+            # lease は一時的なものなので、owner 列の無い旧形式の表は作り直す
+            if "owner" not in [r[1] for r in con.execute("PRAGMA table_info(leases)")]:
+                con.execute("DROP TABLE IF EXISTS leases")
+            con.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _connect(self):
+        # 接続はスレッドごと (並列取得のワーカーからも呼ばれる)
+        con = getattr(self._local, "con", None)
+        if con is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con = con
+        return con
+
+    def _read_many(self, tickers):
+        out = {}
+        con = self._connect()
+        for i in range(0, len(tickers), 500):
+            chunk = tickers[i:i + 500]
+            rows = con.execute(
+                f"SELECT ticker, meta, data FROM histories WHERE ticker IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            for t, meta, data in rows:
+                out[t] = (frame_from_bytes(data), json.loads(meta))
+        return out
+
+    def _read_index(self):
+        return {t: json.loads(m) for t, m in self._connect().execute("SELECT ticker, meta FROM histories")}
+
+    def _commit(self, pending, deleted, accessed):
+        con = self._connect()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.executemany("DELETE FROM histories WHERE ticker = ?", [(t,) for t in deleted])
+            con.executemany(
+                "INSERT OR REPLACE INTO histories (ticker, meta, data) VALUES (?, ?, ?)",
+                [(t, json.dumps(m, ensure_ascii=False), frame_to_bytes(df)) for t, (df, m) in pending.items()],
+            )
+            index = {t: json.loads(m) for t, m in con.execute("SELECT ticker, meta FROM histories")}
+            touched = []
+            for t, ts in accessed.items():
+                if t in index and t not in pending and ts > (index[t].get("accessed") or 0):
+                    index[t]["accessed"] = ts
+                    touched.append((json.dumps(index[t], ensure_ascii=False), t))
+            con.executemany("UPDATE histories SET meta = ? WHERE ticker = ?", touched)
+            victims = lru_victims(index, pending, self.max_entries, self.max_bytes)
+            con.executemany("DELETE FROM histories WHERE ticker = ?", [(t,) for t in victims])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        self.evictions += len(victims)
+        return True
+
+    def load_fx(self, pair):
+        row = self._connect().execute("SELECT rate, fetched_at FROM fx_rates WHERE pair = ?", (pair,)).fetchone()
+        if row is None: return None, None
+        return float(row[0]), datetime.fromisoformat(row[1])
+
+    def save_fx(self, pair, rate, fetched_at):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO fx_rates (pair, rate, fetched_at) VALUES (?, ?, ?)",
+            (pair, rate, fetched_at.isoformat(timespec="seconds")),
+        )
+
+    def clear_fx(self, pair):
+        return self._connect().execute("DELETE FROM fx_rates WHERE pair = ?", (pair,)).rowcount > 0
+
+    def lease(self, key, ttl):
+        con = self._connect()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+            row = con.execute("SELECT owner FROM leases WHERE key = ?", (key,)).fetchone()
+            got = row is None or row[0] == self.owner
+            if got:
+                con.execute("INSERT OR REPLACE INTO leases (key, owner, expires) VALUES (?, ?, ?)", (key, self.owner, now + ttl))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return got
+
+    def _release(self, keys):
+        self._connect().executemany("DELETE FROM leases WHERE key = ? AND owner = ?", [(k, self.owner) for k in keys])
+
+# --- Redis ---
+class RedisBackend(CacheBackend):
+    """
+    kabu:h:<ticker> に履歴 (frame_to_bytes)、ハッシュ kabu:meta / kabu:accessed に銘柄ごとのメタ・読み込み時刻、
+    kabu:fx:<ペア> に為替レート、kabu:lease:<key> に取得担当の owner (SET NX PX) を置く。
+    """
+    name = "redis"
+
+    def __init__(self, client, max_bytes=None, max_entries=None, prefix=REDIS_PREFIX):
+        super().__init__(max_bytes, max_entries)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return self.prefix + ":".join(parts)
+
+    def _read_many(self, tickers):
+        if not tickers: return {}
+        metas, datas = self.client.pipeline([
+            ["HMGET", self._key("meta"), *tickers],
+            ["MGET", *[self._key("h", t) for t in tickers]],
+        ])
+        out = {}
+        for t, meta, data in zip(tickers, metas, datas):
+            if meta is not None and data is not None:
+                out[t] = (frame_from_bytes(data), json.loads(meta))
+        return out
+
+    def _read_index(self):
+        metas, accessed = self.client.pipeline([["HGETALL", self._key("meta")], ["HGETALL", self._key("accessed")]])
+        index = {t.decode(): json.loads(m) for t, m in _pairs(metas)}
+        for t, ts in _pairs(accessed):
+            t = t.decode()
+            if t in index: index[t]["accessed"] = max(float(ts), index[t].get("accessed") or 0)
+        return index
+
+    def _commit(self, pending, deleted, accessed):
+        cmds = []
+        for t in deleted:
+            cmds += [["DEL", self._key("h", t)], ["HDEL", self._key("meta"), t], ["HDEL", self._key("accessed"), t]]
+        for t, (df, m) in pending.items():
+            cmds += [["SET", self._key("h", t), frame_to_bytes(df)], ["HSET", self._key("meta"), t, json.dumps(m, ensure_ascii=False)]]
+        touched = [x for t, ts in accessed.items() if t not in pending and t not in deleted for x in (t, repr(ts))]
+        if touched:
+            cmds.append(["HSET", self._key("accessed"), *touched])
+        if cmds:
+            self.client.pipeline(cmds)
+        victims = lru_victims(self._read_index(), pending, self.max_entries, self.max_bytes)
+        if victims:
+            self.client.pipeline([
+                ["DEL", *[self._key("h", t) for t in victims]],
+                ["HDEL", self._key("meta"), *victims],
+                ["HDEL", self._key("accessed"), *victims],
+            ])
+            self.evictions += len(victims)
+        return True
+
+    def load_fx(self, pair):
+        raw = self.client.execute("GET", self._key("fx", pair))
+        if raw is None: return None, None
+        rec = json.loads(raw)
+        return float(rec["rate"]), datetime.fromisoformat(rec["fetched_at"])
+
+    def save_fx(self, pair, rate, fetched_at):
+        self.client.execute("SET", self._key("fx", pair), json.dumps({
+            "pair": pair, "rate": rate, "fetched_at": fetched_at.isoformat(timespec="seconds"),
+        }))
+
+    def clear_fx(self, pair):
+        return self.client.execute("DEL", self._key("fx", pair)) > 0
+
+    def lease(self, key, ttl):
+        k, px = self._key("lease", key), int(ttl * 1000)
+        if self.client.execute("SET", k, self.owner, "NX", "PX", px) is not None: return True
+        # 自分が担当中なら期限を延ばす
+        return self.client.exec_if_equal(k, self.owner, [["SET", k, self.owner, "PX", px]]) is not None
+
+    def _release(self, keys):
+        # 期限切れの後に他の owner が取り直した lease は消さない
+        for k in keys:
+            self.client.exec_if_equal(self._key("lease", k), self.owner, [["DEL", self._key("lease", k)]])
+
+def _pairs(flat):
+    """HGETALL の [k1, v1, k2, v2, ...] を [(k, v)] にする"""
+    return zip(flat[::2], flat[1::2])
+
+def open_backend(spec, local_dir, max_bytes=None, max_entries=None):
+    """
+    KABU_CACHE_BACKEND の値からバックエンドを作る (空・"local" はローカルディスク)。
+    "sqlite" だけの場合は local_dir/cache.db を使う。
+    """
+    spec = (spec or "local").strip()
+    scheme = spec.split(":", 1)[0].lower()
+    if scheme == "local":
+        from .price_store import PriceStore
+        return PriceStore(os.path.join(local_dir, "prices.arrow"), max_bytes, max_entries)
+    if scheme == "sqlite":
+        path = spec[len("sqlite:"):]
+        path = path[2:] if path.startswith("//") else path   # sqlite:///abs/path -> /abs/path
+        return SQLiteBackend(path or os.path.join(local_dir, "cache.db"), max_bytes, max_entries)
+    if scheme == "redis":
+        from .resp import RespClient
+        u = urlparse(spec)
+        db = int(u.path.lstrip("/") or 0)
+        client = RespClient(u.hostname or "localhost", u.port or 6379, db=db,
+                            password=unquote(u.password) if u.password else None)
+        return RedisBackend(client, max_bytes, max_entries)
+    # rediss:// (TLS) は未対応。必要ならローカルのプロキシ (stunnel など) 経由で redis:// を使う
+    raise ValueError(f"Unknown {CACHE_BACKEND_ENV}: {spec}")
@@ -0,0 +1,56 @@
+"""
+チャート用の間引き (Largest-Triangle-Three-Buckets)。
+
+表示幅に見合う点数まで減らしつつ、形状 (山・谷) と指定した日付 (購入日など) の点を残す。
+"""
+import numpy as np
+import pandas as pd
+
+CHART_POINTS = 500  # カード1枚あたりの目安点数 (チャート幅のピクセル数程度)
+
+def lttb_indices(x, y, n_out):
+    """
+    LTTB で残す点のインデックス (昇順) を返す。
+    x, y: 1次元の数値配列 (x は昇順)。n_out >= len(x) または n_out < 3 の場合は全点。
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # 先頭・末尾を除いた点を n_out-2 個のバケットに分ける
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=int)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # 次のバケットの平均点 (最後のバケットは末尾点)
+        nlo, nhi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        cx = x[nlo:nhi].mean()
+        cy = y[nlo:nhi].mean()
+        # 前に選んだ点 a・次バケット平均・候補点 の三角形面積が最大の点を選ぶ
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+def downsample_series(s, n_out=CHART_POINTS, keep_dates=()):
+    """
+    日付indexの Series を約 n_out 点に間引く。
+    全期間の最大値・最小値と、keep_dates に最も近い (以前の) 点は必ず残す。
+    """
+    s = s.dropna()
+    if len(s) <= n_out:
+        return s
+
+    x = s.index.asi8 if isinstance(s.index, pd.DatetimeIndex) else np.arange(len(s))
+    y = s.to_numpy(dtype=float)
+    idx = [lttb_indices(x, y, n_out), [int(y.argmax()), int(y.argmin())]]
+    if len(keep_dates) and isinstance(s.index, pd.DatetimeIndex):
+        pos = s.index.searchsorted(pd.DatetimeIndex(keep_dates), side="right") - 1
+        idx.append(pos[pos >= 0])
+    keep = np.unique(np.concatenate(idx))
+    return s.iloc[keep]
@@ -0,0 +1,336 @@
+"""
+株価・基準価額・為替の取得 (キャッシュ・差分更新・一括/並列取得)。
+
+Streamlitには依存しない。進捗表示は .text(msg) を持つ任意のオブジェクトを受け取る。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from . import http_client
+from .cache import (
+    fetch_lease, get_store, invalidate, load_cached_histories, save_cached_history, load_fund_snapshot, save_fund_snapshot,
+    load_fx_rate, save_fx_rate, merge_history, release_lease,
+)
+from .freshness import is_fresh
+from .funds import _empty_snapshot, fund_snapshot_steps, http_get_text, run_steps
+from .throttle import YAHOO_JP_HOST, YFINANCE_HOST, CircuitOpenError, guard_for
+from .trace import span
+from .utils import get_ticker_type, safe_float
+
+FUND_FETCH_WORKERS = http_client.FETCH_CONCURRENCY  # 投信スクレイピングの同時実行数上限
+DEFAULT_USDJPY = 150.0
+USDJPY_TICKER = "USDJPY=X"
+
+_fx_cache = {}
+_fx_lock = threading.Lock()
+_fx_refresh = threading.Lock()   # バックグラウンド更新は1本だけ
+
+def _download_usdjpy():
+    """yfinance から USD/JPY を取得する。失敗時は None"""
+    with span("yfinance.fx"):
+        return _download_usdjpy_guarded()
+
+def _download_usdjpy_guarded():
+    guard = guard_for(YFINANCE_HOST)
+    try:
+        guard.before_request()
+    except CircuitOpenError:
+        return None
+    try:
+        import yfinance as yf
+        ticker = yf.Ticker(USDJPY_TICKER)
+        hist = ticker.history(period="1d")
+        guard.record(not hist.empty)
+        if not hist.empty: return safe_float(hist['Close'].iloc[-1], None)
+    except:
+        guard.record(False)
+    return None
+
+def fetch_usdjpy_rate():
+    rate = _download_usdjpy()
+    return DEFAULT_USDJPY if rate is None else rate
+
+def _fx_hit():
+    """プロセス内、無ければ保存済みの (レート, 取得時刻)。無ければ None (_fx_lock 内で呼ぶ)"""
+    hit = _fx_cache.get("USDJPY")
+    if hit is None:
+        rate, fetched_at = load_fx_rate()
+        if rate is not None: hit = _fx_cache["USDJPY"] = (rate, fetched_at)
+    return hit
+
+def get_usdjpy_rate():
+    """
+    USD/JPY をプロセス内とキャッシュのバックエンド (既定は stock_data_cache/USDJPY.json) にキャッシュして返す。
+    市場が開いている間は1時間ごと、週末は閉場後に1回だけ取得する
+    (ブレーカーが開いている・取得に失敗した場合は期限切れでも前回値)。
+    """
+    with _fx_lock:
+        hit = _fx_hit()
+        if hit and (is_fresh("FX", hit[1]) or guard_for(YFINANCE_HOST).breaker.is_open()):
+            return hit[0]
+        if hit:
+            # 共有キャッシュで他のレプリカが取得済み・取得中ならそれを使う
+            rate, fetched_at = load_fx_rate()
+            if rate is not None and fetched_at > hit[1]:
+                hit = _fx_cache["USDJPY"] = (rate, fetched_at)
+                if is_fresh("FX", fetched_at): return rate
+            if not fetch_lease("fx:USDJPY"): return hit[0]
+        try:
+            rate = _download_usdjpy()
+            if rate is None:
+                return hit[0] if hit else DEFAULT_USDJPY
+            fetched_at = datetime.now(timezone.utc)
+            _fx_cache["USDJPY"] = (rate, fetched_at)
+            save_fx_rate(rate, fetched_at)
+            return rate
+        finally:
+            if hit: release_lease("fx:USDJPY")
+
+def _refresh_usdjpy():
+    try: get_usdjpy_rate()
+    finally: _fx_refresh.release()
+
+def get_usdjpy_rate_deferred():
+    """
+    get_usdjpy_rate の待たない版 (ダッシュボードの起動直後用)。
+    前回値があれば期限切れでもすぐ返し、更新はバックグラウンドで1本だけ行う (次の再実行から反映)。
+    前回値が1つも無い時だけ取得を待つ。
+    """
+    # 更新中のスレッドは _fx_lock を持ったまま取得するので、プロセス内の値はロックを取らずに読む
+    hit = _fx_cache.get("USDJPY")
+    if hit is None:
+        with _fx_lock:
+            hit = _fx_hit()
+    if hit is None: return get_usdjpy_rate()
+    if not is_fresh("FX", hit[1]) and _fx_refresh.acquire(blocking=False):
+        threading.Thread(target=_refresh_usdjpy, name="kabu-fx", daemon=True).start()
+    return hit[0]
+
+def invalidate_cache(tickers=(), asset_types=()):
+    """cache.invalidate に加え、プロセス内の為替レートも捨てる。戻り値: 消した銘柄のリスト"""
+    if "FX" in asset_types:
+        with _fx_lock:
+            _fx_cache.clear()
+    return invalidate(tickers, asset_types)
+
+def get_usdjpy_history():
+    """USD/JPY の日次履歴 (Close の Series)。株価と同じキャッシュ・差分更新を使う"""
+    histories, _ = get_histories_batch([USDJPY_TICKER])
+    h = histories.get(USDJPY_TICKER)
+    return h["Close"] if h is not None else pd.Series(dtype=float)
+
+def cached_fund_snapshot_steps(code):
+    """
+    投信スナップショットをキャッシュ付きで取得する手順 (fund_snapshot_steps と同じ yield/send 形式)。
+    最後の基準価額公表 (営業日20時) 以降に取得済みならキャッシュを返し、
+    古ければ /history の直近分だけ取得して追記する。
+    Yahoo のブレーカーが開いている間は、古くてもキャッシュをそのまま返す。
+    """
+    cached, mtime = load_fund_snapshot(code)
+    has_hist = cached is not None and not cached["history"].empty
+    if has_hist and is_fresh("JP_FUND", mtime, last_data_date=cached["history"].index[-1]):
+        return cached
+    if cached is not None and guard_for(YAHOO_JP_HOST).breaker.is_open():
+        return cached
+    # 共有キャッシュで他のレプリカが同じ投信を取得中なら、そちらの結果を待たずに手元のキャッシュを使う
+    if cached is not None and not fetch_lease(f"fund:{code}"):
+        return cached
+
+    try:
+        snap = None
+        if has_hist:
+            # 差分取得: /history の直近テーブルのみ取得し、キャッシュと連続していれば追記
+            delta = yield from fund_snapshot_steps(code, recent_only=True)
+            if not delta["history"].empty and delta["history"].index.min() <= cached["history"].index[-1]:
+                delta["history"] = merge_history(cached["history"], delta["history"])
+                snap = delta
+
+        # 新規取得 (キャッシュなし / 差分が繋がらない場合)
+        if snap is None:
+            snap = yield from fund_snapshot_steps(code)
+        if snap["history"].empty:
+            return cached if cached is not None else snap
+
+        if not snap["name"] and cached is not None:
+            snap["name"] = cached["name"]
+        save_fund_snapshot(snap)
+        return snap
+    finally:
+        # 担当は書き込み (batch() の間はその反映) の後に返す
+        if cached is not None: release_lease(f"fund:{code}")
+
+def get_fund_snapshot(code, status_placeholder=None):
+    """投信スナップショットをキャッシュ付きで同期取得する"""
+    def get(url):
+        if status_placeholder:
+            status_placeholder.text(f"Fetching {code}...")
+        return http_get_text(url)
+    return run_steps(cached_fund_snapshot_steps(code), get)
+
+def get_history_smart(ticker, data_type, status_placeholder=None):
+    with span("get_history_smart", ticker=ticker, type=data_type):
+        return _get_history_smart(ticker, data_type, status_placeholder)
+
+def _get_history_smart(ticker, data_type, status_placeholder=None):
+    # A. 個別株
+    if data_type != "JP_FUND":
+        histories, _ = get_histories_batch([ticker], status_placeholder)
+        return histories.get(ticker, pd.DataFrame())
+
+    # B. 投資信託
+    return get_fund_snapshot(ticker, status_placeholder)["history"]
+
+def _download_closes(tickers, **kwargs):
+    """
+    yf.download で複数銘柄をまとめて1リクエスト取得し、
+    ティッカーごとの Close DataFrame に分割して返す。
+    戻り値: (histories: {ticker: DataFrame[['Close']]}, failures: {ticker: 理由})
+    """
+    with span("yfinance.download", tickers=len(tickers), **kwargs) as attrs:
+        histories, failures = _download_closes_guarded(tickers, **kwargs)
+        attrs["failures"] = len(failures)
+        return histories, failures
+
+def _download_closes_guarded(tickers, **kwargs):
+    histories, failures = {}, {}
+    import yfinance as yf
+    guard = guard_for(YFINANCE_HOST)
+    try:
+        guard.before_request()
+    except CircuitOpenError:
+        return histories, {t: "circuit open" for t in tickers}
+    try:
+        raw = yf.download(
+            tickers, group_by="ticker",
+            auto_adjust=True, threads=True, progress=False, **kwargs
+        )
+    except Exception as e:
+        guard.record(False)
+        return histories, {t: f"download error: {e}" for t in tickers}
+    # yfinance はレート制限などを内部で握りつぶして空を返す。
+    # 差分取得 (start=) は休場日なら空が正常なので、失敗とみなすのは期間指定の取得のみ
+    guard.record(not (raw is None or raw.empty) or "start" in kwargs)
+    if raw is None or raw.empty:
+        return histories, {t: "no data returned" for t in tickers}
+
+    for t in tickers:
+        try:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if t not in raw.columns.get_level_values(0):
+                    failures[t] = "ticker missing in response"
+                    continue
+                df_t = raw[t]
+            else:
+                df_t = raw
+            if 'Close' not in df_t.columns:
+                failures[t] = "no Close column"
+                continue
+            # 市場ごとの休場日は他銘柄の行がNaNになるため銘柄単位で落とす
+            df_t = df_t[['Close']].dropna()
+            if df_t.empty:
+                failures[t] = "empty history"
+                continue
+            if df_t.index.tz is not None:
+                df_t.index = df_t.index.tz_localize(None)
+            histories[t] = df_t
+        except Exception as e:
+            failures[t] = f"split error: {e}"
+    return histories, failures
+
+def _stock_market(ticker):
+    return "JP_STOCK" if get_ticker_type(ticker) == "JP_STOCK" else "US_STOCK"
+
+def get_histories_batch(tickers, status_placeholder=None):
+    """
+    個別株(JP/US)の履歴をキャッシュ付きで一括取得する。
+    直近の引け後に取得済みのキャッシュはそのまま使い (休場日は再取得しない)、古いキャッシュは最終日以降の差分のみを
+    start= 指定で取得して追記する。キャッシュの無い銘柄は2年分をまとめて取得する。
+    戻り値: (histories: {ticker: DataFrame[['Close']]}, failures: {ticker: 理由})
+    """
+    tickers = list(dict.fromkeys(tickers))
+    histories, failures = {}, {}
+    if not tickers: return histories, failures
+
+    now = datetime.now(timezone.utc)
+    cached_map = {}
+    delta_groups = {}  # 差分開始日 -> [ticker]
+    full_tickers = []
+    for t, (cached, mtime) in load_cached_histories(tickers).items():
+        if cached.empty:
+            full_tickers.append(t)
+        elif is_fresh(_stock_market(t), mtime, now, cached.index[-1]) or not fetch_lease(f"history:{t}"):
+            # 新しい / 他のレプリカが差分を取得中
+            histories[t] = cached
+        else:
+            cached_map[t] = cached
+            start = cached.index[-1].strftime("%Y-%m-%d")
+            delta_groups.setdefault(start, []).append(t)
+
+    # ブレーカーが開いている間は通信せず、古いキャッシュをそのまま使う
+    if (full_tickers or delta_groups) and guard_for(YFINANCE_HOST).breaker.is_open():
+        histories.update(cached_map)
+        failures.update({t: "circuit open" for t in full_tickers})
+        for t in cached_map: release_lease(f"history:{t}")
+        return histories, failures
+
+    if (full_tickers or delta_groups) and status_placeholder:
+        status_placeholder.text(f"⏳ 株価 {len(full_tickers) + len(cached_map)} 銘柄を一括取得中...")
+
+    # ストアへの書き込みは最後に1回にまとめる (担当は書き込みを反映した後に返る)
+    with get_store().batch():
+        try:
+            if full_tickers:
+                fetched, failed = _download_closes(full_tickers, period="2y")
+                failures.update(failed)
+                for t, df_t in fetched.items():
+                    save_cached_history(t, df_t)
+                    histories[t] = df_t
+
+            for start, group in delta_groups.items():
+                fetched, _ = _download_closes(group, start=start)
+                for t in group:
+                    # 差分が取れなくてもキャッシュは有効 (休場日など)
+                    df_t = merge_history(cached_map[t], fetched.get(t, pd.DataFrame()))
+                    save_cached_history(t, df_t)
+                    histories[t] = df_t
+        finally:
+            for t in cached_map: release_lease(f"history:{t}")
+    return histories, failures
+
+def prefetch_fund_snapshots(codes, status_placeholder=None, max_workers=FUND_FETCH_WORKERS):
+    """
+    投信のスナップショット取得を有限スレッドプールで並列実行する。
+    各ワーカーが get_fund_snapshot 経由で stock_data_cache に書き込み、
+    進捗表示は完了順にメインスレッドから更新する。
+    戻り値: {code: snapshot}
+    """
+    codes = list(dict.fromkeys(codes))
+    results = {}
+    if not codes: return results
+
+    total = len(codes)
+    if status_placeholder:
+        status_placeholder.text(f"⏳ 投信 {total} 銘柄を並列取得中...")
+    # Streamlitの要素はワーカースレッドから触らない (status は None で渡す)
+    with get_store().batch(), ThreadPoolExecutor(max_workers=min(max_workers, total)) as ex:
+        futures = {ex.submit(get_fund_snapshot, c, None): c for c in codes}
+        for n, fut in enumerate(as_completed(futures), 1):
+            c = futures[fut]
+            try: results[c] = fut.result()
+            except Exception as e:
+                print(f"Fund fetch error {c}: {e}")
+                results[c] = _empty_snapshot(c)
+            if status_placeholder:
+                status_placeholder.text(f"⏳ 投信取得中... {n}/{total} ({c})")
+    return results
+
+def fetch_fund_name(code):
+    # 名前はスナップショットに含まれるため、取得済みなら追加の通信は発生しない
+    try:
+        snap = get_fund_snapshot(code)
+        if snap["name"]: return snap["name"]
+    except: pass
+    return code
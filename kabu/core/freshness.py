@@ -0,0 +1,176 @@
+"""
+市場カレンダーに基づくキャッシュの鮮度判定。
+
+資産種別ごとに「直近で新しいデータが出得た時刻」(引け後・基準価額の公表後) を求め、
+最終取得がそれ以降ならキャッシュは新鮮とみなして通信しない。
+週末・祝日は前営業日の公表時刻まで遡るため、休場中は再取得が発生しない。
+
+祝日は規則から計算する (臨時休場や半日取引は扱わない)。
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+
+JST = timezone(timedelta(hours=9))
+
+# 引け時刻 + 日足が確定するまでの余裕 (各市場の現地時刻)
+JP_STOCK_READY = time(16, 0)      # 東証 15:30 引け
+US_STOCK_READY = time(16, 30)     # NYSE 16:00 引け (米東部時間)
+FUND_NAV_READY = time(20, 0)      # 投信の当日基準価額の公表 (JST)
+FX_WEEKEND_CLOSE = time(17, 0)    # 為替市場は NY 金曜17時〜日曜17時が休み
+FX_TTL = timedelta(hours=1)       # 為替市場が開いている間の再取得間隔
+LATE_RETRY = timedelta(minutes=30)  # 公表時刻後に取得してもデータ未反映だった場合の再試行間隔
+
+# 資産種別 -> (カレンダー, 公表時刻)
+PUBLICATION = {
+    "JP_STOCK": ("JP", JP_STOCK_READY),
+    "US_STOCK": ("US", US_STOCK_READY),
+    "JP_FUND": ("JP", FUND_NAV_READY),
+}
+
+# --- 0. カレンダー ---
+def _nth_weekday(year, month, weekday, n):
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def _last_weekday(year, month, weekday):
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year):
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+@lru_cache(maxsize=None)
+def jp_holidays(year):
+    """日本の祝日 (振替休日・国民の休日を含む)"""
+    days = {date(year, m, d) for m, d in [(1, 1), (2, 11), (2, 23), (4, 29), (5, 3), (5, 4), (5, 5), (8, 11), (11, 3), (11, 23)]}
+    days |= {_nth_weekday(year, 1, 0, 2), _nth_weekday(year, 7, 0, 3), _nth_weekday(year, 9, 0, 3), _nth_weekday(year, 10, 0, 2)}
+    # 春分・秋分の日 (1980-2099 の近似式)
+    y = year - 1980
+    days.add(date(year, 3, int(20.8431 + 0.242194 * y - y // 4)))
+    days.add(date(year, 9, int(23.2488 + 0.242194 * y - y // 4)))
+    # 国民の休日: 祝日に挟まれた日
+    for d in sorted(days):
+        mid = d + timedelta(days=1)
+        if mid not in days and mid + timedelta(days=1) in days and mid.weekday() != 6:
+            days.add(mid)
+    # 振替休日: 日曜の祝日の後の最初の祝日でない日
+    for d in sorted(days):
+        if d.weekday() == 6:
+            sub = d + timedelta(days=1)
+            while sub in days: sub += timedelta(days=1)
+            days.add(sub)
+    return frozenset(days)
+
+@lru_cache(maxsize=None)
+def us_holidays(year):
+    """NYSE の休場日"""
+    def observed(d):
+        if d.weekday() == 5: return d - timedelta(days=1)
+        if d.weekday() == 6: return d + timedelta(days=1)
+        return d
+    days = {
+        _nth_weekday(year, 1, 0, 3),          # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),          # Presidents' Day
+        _easter(year) - timedelta(days=2),    # Good Friday
+        _last_weekday(year, 5, 0),            # Memorial Day
+        _nth_weekday(year, 9, 0, 1),          # Labor Day
+        _nth_weekday(year, 11, 3, 4),         # Thanksgiving
+        observed(date(year, 7, 4)),
+        observed(date(year, 12, 25)),
+    }
+    if year >= 2022: days.add(observed(date(year, 6, 19)))
+    # 元日が土曜の場合は前年末に振り替えない
+    if date(year, 1, 1).weekday() != 5: days.add(observed(date(year, 1, 1)))
+    return frozenset(days)
+
+def is_trading_day(market, d):
+    """market: "JP" (東証・投信の営業日) / "US" (NYSE)"""
+    if d.weekday() >= 5: return False
+    if market == "JP":
+        return d not in jp_holidays(d.year) and (d.month, d.day) not in [(12, 31), (1, 2), (1, 3)]
+    return d not in us_holidays(d.year)
+
+# --- 1. タイムゾーン ---
+def _us_eastern(d):
+    """米東部時間 (3月第2日曜〜11月第1日曜は夏時間)"""
+    dst = _nth_weekday(d.year, 3, 6, 2) <= d < _nth_weekday(d.year, 11, 6, 1)
+    return timezone(timedelta(hours=-4 if dst else -5))
+
+def _market_tz(market, d):
+    return JST if market == "JP" else _us_eastern(d)
+
+def _to_market_time(market, now):
+    if market == "JP": return now.astimezone(JST)
+    return now.astimezone(_us_eastern((now.astimezone(timezone.utc) - timedelta(hours=5)).date()))
+
+def _aware(dt):
+    """None は現在時刻、naive はローカル時刻 (ファイルの mtime など) として扱う"""
+    if dt is None: return datetime.now(timezone.utc)
+    return dt if dt.tzinfo is not None else dt.astimezone()
+
+# --- 2. 鮮度判定 ---
+def last_publication(asset_type, now=None):
+    """
+    now 時点で最新のデータが出た営業日と、その公表時刻 (aware datetime) を返す。
+    例: 土曜に呼ぶと、個別株は金曜の引け後、投信は金曜20時。
+    """
+    market, ready = PUBLICATION[asset_type]
+    local = _to_market_time(market, _aware(now))
+    d = local.date()
+    if local.time() < ready: d -= timedelta(days=1)
+    while not is_trading_day(market, d): d -= timedelta(days=1)
+    return d, datetime.combine(d, ready, tzinfo=_market_tz(market, d))
+
+def next_publication(asset_type, now=None):
+    """now より後で次に新しいデータが出る営業日と公表時刻 (キャッシュウォーマーの予定用)"""
+    market, ready = PUBLICATION[asset_type]
+    now = _aware(now)
+    d = _to_market_time(market, now).date()
+    while True:
+        if is_trading_day(market, d):
+            at = datetime.combine(d, ready, tzinfo=_market_tz(market, d))
+            if at > now: return d, at
+        d += timedelta(days=1)
+
+def fx_weekend_close(now=None):
+    """為替市場が週末休場中ならその閉場時刻 (金曜17時 NY) を、開いていれば None を返す"""
+    et = _to_market_time("US", _aware(now))
+    wd = et.weekday()
+    if (wd == 4 and et.time() >= FX_WEEKEND_CLOSE) or wd == 5 or (wd == 6 and et.time() < FX_WEEKEND_CLOSE):
+        fri = et.date() - timedelta(days=wd - 4)
+        return datetime.combine(fri, FX_WEEKEND_CLOSE, tzinfo=_us_eastern(fri))
+    return None
+
+def is_fresh(asset_type, last_checked, now=None, last_data_date=None):
+    """
+    最終取得時刻 last_checked のキャッシュが now 時点でも最新とみなせるか。
+    asset_type: "JP_STOCK" / "US_STOCK" / "JP_FUND" / "FX"
+    last_data_date を渡すと、公表時刻後に取得したのに当日分が無い場合 (公表遅れ) は
+    LATE_RETRY ごとに取り直す。取り直すのは公表日のうちだけで、現地の翌日0時以降に取得済みなら
+    (売買が無く当日分が出ない銘柄など) 次の公表まで新鮮とみなす。
+    """
+    if last_checked is None: return False
+    now, last_checked = _aware(now), _aware(last_checked)
+
+    if asset_type == "FX":
+        closed_at = fx_weekend_close(now)
+        if closed_at is not None: return last_checked >= closed_at
+        return now - last_checked < FX_TTL
+
+    session, ready_at = last_publication(asset_type, now)
+    if last_checked < ready_at: return False
+    if last_data_date is not None:
+        if isinstance(last_data_date, datetime): last_data_date = last_data_date.date()
+        if last_data_date < session:
+            market = PUBLICATION[asset_type][0]
+            give_up = datetime.combine(session + timedelta(days=1), time(0), tzinfo=_market_tz(market, session))
+            return last_checked >= give_up or now - last_checked < LATE_RETRY
+    return True
@@ -0,0 +1,287 @@
+"""
+Yahoo!ファイナンス (日本) からの投資信託データ取得。
+
+ページの取得と解析を分け、解析関数 (parse_*) はHTML/JSONを受け取る純粋関数にしている。
+"""
+from datetime import datetime
+
+import pandas as pd
+
+from .http_client import get_session
+from .throttle import CircuitOpenError, guard_for, is_response_ok
+from .trace import span
+from .utils import safe_float
+from .yahoo_parser import extract_preloaded_state, parse_fund_name
+
+def _parse_jp_date(s):
+    if isinstance(s, datetime): return s
+    # "2026年2月6日" -> datetime
+    try:
+        return pd.to_datetime(s, format='%Y年%m月%d日')
+    except:
+        try:
+            return pd.to_datetime(s) # Standard fallback
+        except: return pd.NaT
+
+def parse_fund_history_table(html):
+    """
+    /history ページの「日付・基準価額」テーブルを日次の Close DataFrame にする。
+    DOM を組み立てるため重い (1ページ数百ms)。PRELOADED_STATE に履歴が無いページ用のフォールバック。
+    """
+    from bs4 import BeautifulSoup
+    soup_h = BeautifulSoup(html, 'html.parser')
+    for table in soup_h.find_all('table'):
+        full_text = table.get_text()
+        if "日付" not in full_text or "基準価額" not in full_text: continue
+
+        rows = []
+        header = []
+        for tr in table.find_all('tr'):
+            ths = tr.find_all('th')
+            if ths:
+                header = [th.get_text().strip() for th in ths]
+                continue
+            tds = tr.find_all('td')
+            if tds:
+                row = [td.get_text().strip() for td in tds]
+                if len(row) == len(header):
+                    rows.append(row)
+        if not (header and rows): continue
+
+        df_table = pd.DataFrame(rows, columns=header)
+        col_date = next((c for c in df_table.columns if "日付" in c), None)
+        col_price = next((c for c in df_table.columns if "基準価額" in c), None)
+        if not (col_date and col_price): continue
+
+        df_curr = df_table[[col_date, col_price]].copy()
+        df_curr.columns = ["Date", "Close"]
+        df_curr['Date'] = df_curr['Date'].apply(_parse_jp_date)
+        df_curr['Close'] = df_curr['Close'].apply(safe_float)
+        df_curr = df_curr.dropna().set_index('Date').sort_index()
+        if not df_curr.empty:
+            return df_curr[['Close']]
+    return pd.DataFrame()
+
+def parse_fund_price_board(state):
+    """mainFundPriceBoard から (最新基準価額, 基準日) を取り出す。無ければ (None, None)"""
+    try:
+        fp = state['mainFundPriceBoard']['fundPrices']
+        price = safe_float(fp.get('price'), None)
+        d_str = fp.get('updateDate') # format "12/05"
+        now = datetime.now()
+        dt = datetime.strptime(d_str, '%m/%d').replace(year=now.year)
+        # 年をまたいだ直後 (1/1に 12/31 の基準価額) は前年扱い
+        if dt > now: dt = dt.replace(year=now.year - 1)
+        if price is None: return None, None
+        return price, pd.Timestamp(dt)
+    except: return None, None
+
+def parse_fund_state(state):
+    """
+    PRELOADED_STATE から基準価額の履歴を取り出す。
+    mainYJChart -> chart -> chartLine (約2年) を優先し、無ければ
+    mainFundHistory (約1ヶ月)、最後に mainFundPriceBoard (現在値のみ) を使う。
+    """
+    # データ抽出: mainYJChart -> chart -> chartLine -> [0] -> data
+    # MEMO: chartLineはリスト担っていることが多い
+    chart_data = None
+
+    # 深い階層を安全に探す
+    try:
+        if 'mainYJChart' in state:
+            c = state['mainYJChart']['chart']
+            if 'chartLine' in c:
+                lines = c['chartLine']
+                if isinstance(lines, list) and len(lines) > 0:
+                    chart_data = lines[0].get('data', [])
+    except Exception as e:
+        print(f"Data hierarchy traversal error: {e}")
+
+    if not chart_data:
+        # Fallback to mainFundHistory (approx 1 month data)
+        chart_data = _fund_history_points(state)
+        if chart_data:
+            print(f"Fallback: Found {len(chart_data)} data points in mainFundHistory")
+
+    if not chart_data:
+        # Fallback 2: mainFundPriceBoard (Current Price Only)
+        # Helps to at least show the current valuation even if chart is empty
+        nav, nav_date = parse_fund_price_board(state)
+        if nav is not None:
+            chart_data = [{"date": nav_date, "price": nav}]
+            print(f"Fallback 2: Found current price in mainFundPriceBoard: {nav} ({nav_date:%m/%d})")
+
+    if not chart_data:
+        print("No chart data found in JSON (mainYJChart, mainFundHistory, or mainFundPriceBoard).")
+        return pd.DataFrame()
+    return _points_to_frame(chart_data)
+
+def _fund_history_points(state):
+    """mainFundHistory (約1ヶ月) の [{"date", "price"}]。無ければ []"""
+    # Format: {'date': '2026年2月6日', 'price': '20,696', ...}
+    try:
+        raw_data = state.get('mainFundHistory', {}).get('histories')
+        if isinstance(raw_data, list):
+            return [
+                {"date": item['date'], "price": item['price'].replace(',', '')}
+                for item in raw_data if 'date' in item and 'price' in item
+            ]
+    except Exception as e:
+        print(f"Fallback error: {e}")
+    return []
+
+def parse_fund_history_state(state):
+    """
+    /history ページの PRELOADED_STATE (mainFundHistory) から直近の基準価額を取り出す。
+    テーブルと同じ内容を DOM を組み立てずに読める。無ければ空の DataFrame。
+    """
+    points = _fund_history_points(state) if state else []
+    return _points_to_frame(points) if points else pd.DataFrame()
+
+def _points_to_frame(chart_data):
+    """[{"date", "price"}] (キー名の揺れを含む) を日付順の Close DataFrame にする"""
+    rows = []
+    for d in chart_data:
+        date_val = d.get('date') or d.get('Date')
+        price = d.get('price') or d.get('Close') or d.get('close') or d.get('value')
+        if date_val is not None and price is not None:
+            rows.append({"Date": date_val, "Close": price})
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows)
+    # If fallback 2 used, date is already datetime
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']):
+        if df['Date'].astype(str).str.contains('年').any():
+            df['Date'] = df['Date'].apply(_parse_jp_date)
+        else:
+            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df['Close'] = df['Close'].apply(safe_float)
+    df = df.dropna(subset=['Date'])
+    return df.set_index('Date').sort_index()[['Close']]
+
+def _empty_snapshot(code):
+    return {"code": code, "name": None, "nav": None, "nav_date": None, "history": pd.DataFrame()}
+
+def _fill_snapshot_meta(snap, html, state=None):
+    """ページ内の <title> と mainFundPriceBoard からファンド名・最新基準価額を補完する"""
+    if not snap["name"]:
+        snap["name"] = parse_fund_name(html)
+    if snap["nav"] is None:
+        if state is None: state = extract_preloaded_state(html)
+        if state:
+            snap["nav"], snap["nav_date"] = parse_fund_price_board(state)
+
+def fund_snapshot_steps(code, recent_only=False):
+    """
+    投信1銘柄のファンド名・最新基準価額・基準価額履歴を、なるべく少ないページ取得でまとめて取る手順。
+    まず /history (名前・基準価額・直近の履歴) を取得し、履歴が取れない場合のみ
+    /chart の PRELOADED_STATE (約2年分) にフォールバックする。
+    /history の履歴は PRELOADED_STATE の mainFundHistory から読み、無い時だけテーブルを DOM 解析する。
+    recent_only=True の場合は /history のみ (差分更新用)。
+    履歴は取得したまま (日次) 返す。週次・月次の表示は core.resample で行う。
+
+    取得したいURLを yield し、(status_code, text) を send で受け取るジェネレータなので、
+    同期 (run_steps) / 非同期 (core.async_fetch) のどちらのドライバからも同じ手順で動く。
+    戻り値 (StopIteration.value): {"code", "name", "nav", "nav_date", "history": DataFrame[['Close']]}
+    """
+    snap = _empty_snapshot(code)
+
+    # Attempt 1: Direct HTML Table Parsing (Most reliable for some funds like AJ311217)
+    # This requires fetching /history page, not /chart
+    history_url = f"https://finance.yahoo.co.jp/quote/{code}/history"
+    status, text = yield history_url
+    if status == 200:
+        with span("parse.history_page", code=code) as attrs:
+            try:
+                # PRELOADED_STATE の mainFundHistory を先に読み、テーブル (DOM 解析) は無い時だけ
+                state = extract_preloaded_state(text)
+                _fill_snapshot_meta(snap, text, state)
+                df_curr = parse_fund_history_state(state)
+                attrs["source"] = "state"
+                if df_curr.empty:
+                    df_curr = parse_fund_history_table(text)
+                    attrs["source"] = "table"
+                attrs["rows"] = len(df_curr)
+                if not df_curr.empty:
+                    print(f"Success: Parsed {attrs['source']} with {len(df_curr)} rows.")
+                    snap["history"] = df_curr
+            except Exception as e:
+                print(f"HTML Table Parse Error: {e}")
+
+    # Attempt 2: JSON Extraction (Fallback/Advanced)
+    if snap["history"].empty and not recent_only:
+        chart_url = f"https://finance.yahoo.co.jp/quote/{code}/chart"
+        status, text = yield chart_url
+        if status != 200:
+            print(f"Failed to fetch {chart_url}: {status}")
+        else:
+            with span("parse.chart_page", code=code) as attrs:
+                try:
+                    state = extract_preloaded_state(text)
+                    if not state:
+                        print("No PRELOADED_STATE found.")
+                    else:
+                        _fill_snapshot_meta(snap, text, state)
+                        df = parse_fund_state(state)
+                        attrs["rows"] = len(df)
+                        if not df.empty:
+                            print(f"Found {len(df)} data points for {code}")
+                            snap["history"] = df
+                except Exception as e:
+                    print(f"Top level scrape error: {e}")
+
+    # 履歴より新しい基準価額があれば末尾に追加、NAVが無ければ履歴の最終値で補う
+    hist = snap["history"]
+    if snap["nav"] is not None and not hist.empty and snap["nav_date"] > hist.index[-1]:
+        snap["history"] = pd.concat([hist, pd.DataFrame({"Close": [snap["nav"]]}, index=[snap["nav_date"]])])
+    elif snap["nav"] is None and not hist.empty:
+        snap["nav"], snap["nav_date"] = safe_float(hist['Close'].iloc[-1]), hist.index[-1]
+    return snap
+
+def http_get_text(url, timeout=10):
+    """
+    共有セッションでGETし (status_code, text) を返す。通信エラー時は (None, "")。
+    ホスト単位のレート制限を守り、ブレーカーが開いている間は通信せずに (None, "") を返す。
+    """
+    guard = guard_for(url)
+    with span("http_get", url=url) as attrs:
+        try:
+            guard.before_request()
+        except CircuitOpenError:
+            print(f"Circuit open, skipped {url}")
+            attrs["status"] = "circuit_open"
+            return None, ""
+        try:
+            res = get_session().get(url, timeout=timeout)
+            guard.record(is_response_ok(res.status_code))
+            attrs["status"] = res.status_code
+            return res.status_code, res.text
+        except Exception as e:
+            guard.record(False)
+            print(f"Request error {url}: {e}")
+            return None, ""
+
+def run_steps(steps, get=http_get_text):
+    """*_steps ジェネレータを同期的に実行する (get(url) -> (status, text))"""
+    try:
+        url = next(steps)
+        while True:
+            url = steps.send(get(url))
+    except StopIteration as e:
+        return e.value
+
+def fetch_fund_snapshot(code, status_area=None, recent_only=False):
+    """fund_snapshot_steps を共有HTTPセッションで同期実行する"""
+    if status_area:
+        status_area.text(f"Fetching {code}...")
+    return run_steps(fund_snapshot_steps(code, recent_only))
+
+def scrape_japan_fund_history_params(code, status_area, recent_only=False):
+    """
+    YahooファイナンスのHTML内に埋め込まれたJSON(window.__PRELOADED_STATE__)から
+    mainYJChart -> chart -> chartLine を抽出して株価データを取得する。
+    これにより、HTMLテーブルでは1ヶ月分しか取れない制限を回避し、2年分(週次/日次)を取得する。
+    recent_only=True の場合は /history の直近テーブルのみを取得する (差分更新用)。
+    """
+    return fetch_fund_snapshot(code, status_area, recent_only)["history"]
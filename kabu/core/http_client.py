@@ -0,0 +1,76 @@
+"""
+Yahoo!ファイナンス向けの共有HTTPクライアント。
+
+プロセス内で1つの requests.Session を使い回し、finance.yahoo.co.jp への
+TCP/TLS接続をkeep-aliveで再利用する。接続プールは並列取得数に合わせ、
+5xx / 429 は指数バックオフで再試行する (Retry-After も含め、1回の待ちは上限まで)。
+requests は最初の取得時に読み込む (起動直後の描画をキャッシュだけで済ませる場合は読み込まない)。
+"""
+import threading
+
+FETCH_CONCURRENCY = 6   # 並列取得数 (接続プールのサイズも合わせる)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5    # 0.5s, 1s, 2s ...
+BACKOFF_MAX = 10        # 再試行1回あたりの待ちの上限 (秒)
+RETRY_AFTER_MAX = 10    # Retry-After の上限 (秒)。それ以上の休止はホスト単位のブレーカーに任せる
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+try:
+    import brotli  # noqa: F401  (urllib3がbr展開に使う)
+    _ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    _ACCEPT_ENCODING = 'gzip, deflate'
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
+    'Accept-Encoding': _ACCEPT_ENCODING,
+}
+
+_session = None
+_lock = threading.Lock()
+
+def _build_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class CappedRetry(Retry):
+        """Retry-After が長くても RETRY_AFTER_MAX 秒までしか待たない (ワーカーを塞がない)"""
+        def get_retry_after(self, response):
+            seconds = super().get_retry_after(response)
+            return None if seconds is None else min(seconds, RETRY_AFTER_MAX)
+
+    retry = CappedRetry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        backoff_max=BACKOFF_MAX,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # 再試行後も失敗した場合はステータスコードで判定させる
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=FETCH_CONCURRENCY,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_session():
+    """プロセス共通の Session を返す (初回呼び出し時に生成)"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def get(url, timeout=10, **kwargs):
+    return get_session().get(url, timeout=timeout, **kwargs)
@@ -0,0 +1,188 @@
+"""
+ポートフォリオ (保有明細) の SQLite ストア。
+
+アプリ・stock_research_agent.py・import_stock_data.py が同じ DB に書き込む。
+書き込みはすべて1トランザクションで行い、同時に書かれても行が混ざったり壊れたりしない。
+初回アクセス時に旧形式のCSV (portfolio_main.csv / portfolio_sub.csv) を取り込む。
+"""
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime
+
+import pandas as pd
+
+DB_PATH = "portfolio.db"
+PORTFOLIO_COLUMNS = ["銘柄コード", "銘柄名", "購入日", "保有株数", "購入単価"]
+LEGACY_CSV = {"main": "portfolio_main.csv", "sub": "portfolio_sub.csv"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    portfolio TEXT NOT NULL,
+    position  INTEGER NOT NULL,   -- 表示順
+    ticker    TEXT NOT NULL,
+    name      TEXT,
+    date      TEXT,               -- YYYY-MM-DD
+    shares    REAL,
+    price     REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tx_portfolio ON transactions (portfolio, position);
+CREATE INDEX IF NOT EXISTS idx_tx_ticker ON transactions (ticker);
+CREATE TABLE IF NOT EXISTS migrations (
+    portfolio TEXT PRIMARY KEY,
+    source    TEXT,
+    migrated_at TEXT
+);
+"""
+
+def connect(db_path=None):
+    conn = sqlite3.connect(db_path or DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+# --- 0. 正規化 ---
+def _clean(v):
+    """None / NaN / NaT / pd.NA を None に揃える"""
+    try:
+        if pd.isna(v): return None
+    except (TypeError, ValueError): pass
+    return v
+
+def _to_date_str(v):
+    v = _clean(v)
+    if v is None or v == "": return None
+    if isinstance(v, (datetime, date)): return v.strftime("%Y-%m-%d")
+    ts = pd.to_datetime(str(v), errors="coerce")
+    return None if pd.isna(ts) else ts.strftime("%Y-%m-%d")
+
+def _to_num(v):
+    v = _clean(v)
+    if v is None or v == "": return None
+    try: return float(str(v).replace(",", ""))
+    except ValueError: return None
+
+def normalize_rows(df):
+    """
+    編集表 (PORTFOLIO_COLUMNS) を (ticker, name, date, shares, price) のタプル列にする。
+    銘柄コードが空の行は捨てる。保存・差分判定の両方でこの形を使う。
+    """
+    rows = []
+    if df is None or df.empty: return rows
+    for c in PORTFOLIO_COLUMNS:
+        if c not in df.columns: df = df.assign(**{c: None})
+    for ticker, name, d, shares, price in df[PORTFOLIO_COLUMNS].itertuples(index=False, name=None):
+        ticker = _clean(ticker)
+        if ticker is None or str(ticker).strip() == "": continue
+        name = _clean(name)
+        rows.append((
+            str(ticker).strip(),
+            None if name is None or name == "" else str(name),
+            _to_date_str(d), _to_num(shares), _to_num(price),
+        ))
+    return rows
+
+# --- 1. 旧CSVからの移行 ---
+def _migrate_legacy(conn, portfolio):
+    """未移行で、DBに行が無く旧CSVがあれば取り込む (移行済みの印を残し、以後は読まない)"""
+    if conn.execute("SELECT 1 FROM migrations WHERE portfolio = ?", (portfolio,)).fetchone():
+        return
+    csv_path = LEGACY_CSV.get(portfolio)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM migrations WHERE portfolio = ?", (portfolio,)).fetchone():
+            conn.execute("COMMIT")
+            return
+        has_rows = conn.execute("SELECT 1 FROM transactions WHERE portfolio = ? LIMIT 1", (portfolio,)).fetchone()
+        if not has_rows and csv_path and os.path.exists(csv_path):
+            try:
+                rows = normalize_rows(pd.read_csv(csv_path))
+            except Exception as e:
+                print(f"Legacy CSV read error {csv_path}: {e}")
+                rows = []
+            _insert(conn, portfolio, rows, start=0)
+            print(f"Migrated {len(rows)} rows from {csv_path}")
+        conn.execute(
+            "INSERT INTO migrations (portfolio, source, migrated_at) VALUES (?, ?, ?)",
+            (portfolio, csv_path, datetime.now().isoformat(timespec="seconds")),
+        )
+        conn.execute("COMMIT")
+    except:
+        conn.execute("ROLLBACK")
+        raise
+
+def _insert(conn, portfolio, rows, start):
+    conn.executemany(
+        "INSERT INTO transactions (portfolio, position, ticker, name, date, shares, price) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(portfolio, start + i) + tuple(r) for i, r in enumerate(rows)],
+    )
+
+# --- 2. 読み書き ---
+def load_portfolio(portfolio, db_path=None):
+    """ポートフォリオの明細を編集表 (PORTFOLIO_COLUMNS、購入日は date) として返す"""
+    with closing(connect(db_path)) as conn:
+        _migrate_legacy(conn, portfolio)
+        rows = conn.execute(
+            "SELECT ticker, name, date, shares, price FROM transactions WHERE portfolio = ? ORDER BY position, id",
+            (portfolio,),
+        ).fetchall()
+    df = pd.DataFrame(rows, columns=PORTFOLIO_COLUMNS)
+    df["購入日"] = pd.to_datetime(df["購入日"], errors='coerce').dt.date
+    return df
+
+def save_portfolio_if_changed(portfolio, before_df, after_df, db_path=None):
+    """
+    編集前後の表を比べ、差分があるときだけ明細を置き換える (1トランザクション)。
+    読み込み後に他のプロセスが追記した行は消さずに末尾に残す。
+    戻り値: 書き込んだら True
+    """
+    before, after = normalize_rows(before_df), normalize_rows(after_df)
+    if after == before: return False
+    with closing(connect(db_path)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute(
+                "SELECT ticker, name, date, shares, price FROM transactions WHERE portfolio = ? ORDER BY position, id",
+                (portfolio,),
+            ).fetchall()
+            remaining = list(before)
+            appended = []
+            for r in current:
+                if r in remaining: remaining.remove(r)
+                else: appended.append(r)
+            conn.execute("DELETE FROM transactions WHERE portfolio = ?", (portfolio,))
+            _insert(conn, portfolio, after + appended, start=0)
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+    return True
+
+def append_transactions(portfolio, rows, db_path=None):
+    """
+    明細を末尾に追記する (スクリプトからの追加用)。
+    rows: (銘柄コード, 銘柄名, 購入日, 保有株数, 購入単価) のタプルの列
+    """
+    rows = normalize_rows(pd.DataFrame(list(rows), columns=PORTFOLIO_COLUMNS))
+    if not rows: return 0
+    with closing(connect(db_path)) as conn:
+        _migrate_legacy(conn, portfolio)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (last,) = conn.execute(
+                "SELECT COALESCE(MAX(position), -1) FROM transactions WHERE portfolio = ?", (portfolio,)
+            ).fetchone()
+            _insert(conn, portfolio, rows, start=last + 1)
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+    return len(rows)
+
+def list_portfolios(db_path=None):
+    """既知のポートフォリオ名 (旧CSVの分 + DB に行があるもの)"""
+    with closing(connect(db_path)) as conn:
+        for p in LEGACY_CSV: _migrate_legacy(conn, p)
+        names = [p for (p,) in conn.execute("SELECT DISTINCT portfolio FROM transactions")]
+    return list(dict.fromkeys(list(LEGACY_CSV) + names))
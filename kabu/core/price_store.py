@@ -0,0 +1,234 @@
+"""
+全銘柄の価格履歴を1ファイルにまとめた列指向ストア (Arrow IPC / Feather v2、非圧縮)。
+
+    stock_data_cache/prices.arrow
+        列: ticker (string), date (timestamp[ns]), close (float64)。ticker ごとに日付順で連続して並ぶ。
+        スキーマのメタデータ "kabu.index" に ticker ごとの索引を JSON で持つ:
+        {ticker: {"offset", "rows", "bytes", "start", "end", "source", "updated", "accessed", ...任意のメタ (ファンド名など)}}
+
+読み込みはファイルをメモリマップして索引の範囲を切り出すだけなので、銘柄数によらずファイルを開くのは1回、
+CSVのような解析も発生しない。ファイルが他プロセス (cache_warmer など) に置き換えられたら開き直す。
+書き込みはファイル全体を一時ファイルに書いて置き換える。batch() の間は書き込みをまとめて最後に1回だけ行う。
+複数プロセス (ダッシュボードと cache_warmer など) が同時に書いても更新を失わないよう、
+読み直し・マージ・置き換えの間は隣の prices.arrow.lock をOSのファイルロックで排他し、一時ファイル名は書き込みごとに変える。
+
+容量 (max_bytes) と銘柄数 (max_entries) の上限を超えた分は、書き込み時に最後に読まれた時刻が古い銘柄から捨てる (LRU)。
+読み込み時刻はプロセス内で覚えておき、次の書き込みで索引に反映する。
+未書き込み分の保持・batch() などは core/cache_backend.py の CacheBackend と共通。
+"""
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .cache_backend import CacheBackend, entry_bytes, lru_victims
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+INDEX_KEY = b"kabu.index"
+REPLACE_RETRIES = 3   # Windows で他プロセスがマップ中の場合の置き換え再試行回数
+_POSITION_KEYS = ("offset", "rows")
+
+@contextmanager
+def file_lock(path):
+    """path (ロック用ファイル) のOSの排他ロック。別プロセスが持っていれば解放まで待つ"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # 約10秒待って取れなければ OSError
+                    break
+                except OSError: pass
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _temp_path(path):
+    """path と同じディレクトリの一意な一時ファイル (同じディレクトリなので os.replace で置き換えられる)"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    os.chmod(tmp_path, 0o644)  # mkstemp は 0600 で作るため、通常のファイルと同じ権限に戻す
+    return tmp_path
+
+def _remove(path):
+    try:
+        if path: os.remove(path)
+    except OSError: pass
+
+def _to_frame(dates, close):
+    # メモリマップ上の配列は読み取り専用かつファイルの置き換えで無効になるため、コピーして返す
+    return pd.DataFrame({"Close": np.array(close, dtype=float)}, index=pd.DatetimeIndex(np.array(dates), name="Date"))
+
+class PriceStore(CacheBackend):
+    """ローカルディスクのバックエンド (為替レートは同じディレクトリの <ペア>.json)"""
+    name = "local"
+
+    def __init__(self, path, max_bytes=None, max_entries=None):
+        super().__init__(max_bytes, max_entries)
+        self.path = path
+        self._mm = None
+        self._table = None
+        self._index = {}
+        self._stat = None
+
+    # --- 読み込み ---
+    def _refresh(self):
+        """ファイルが変わっていれば開き直す (ロック内で呼ぶ)"""
+        try:
+            st = os.stat(self.path)
+            sig = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            sig = None
+        if sig == self._stat: return
+        self._close()
+        self._stat = sig
+        if sig is None: return
+        import pyarrow as pa
+        try:
+            self._mm = pa.memory_map(self.path, "r")
+            self._table = pa.ipc.open_file(self._mm).read_all()
+            meta = self._table.schema.metadata or {}
+            self._index = json.loads(meta.get(INDEX_KEY, b"{}"))
+        except Exception as e:
+            print(f"Price store read error {self.path}: {e}")
+            self._close()
+
+    def _close(self):
+        self._table = None
+        self._index = {}
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _read_many(self, tickers):
+        self._refresh()
+        out = {}
+        for t in tickers:
+            meta = self._index.get(t)
+            if meta is None or self._table is None: continue
+            part = self._table.slice(meta["offset"], meta["rows"])
+            out[t] = (_to_frame(part.column("date").to_numpy(), part.column("close").to_numpy()), meta)
+        return out
+
+    def _read_index(self):
+        self._refresh()
+        return {t: {k: v for k, v in m.items() if k not in _POSITION_KEYS} for t, m in self._index.items()}
+
+    def _commit(self, pending, deleted, accessed):
+        # 他プロセスが書いた最新のファイルに、こちらの更新分を重ねる (読み直しから置き換えまでをプロセス間で排他)
+        with file_lock(f"{self.path}.lock"):
+            self._refresh()
+            table = self._merged_table(pending, deleted, accessed)
+            ok = self._write(table)
+            if ok: self._refresh()
+        return ok
+
+    def _merged_table(self, pending, deleted, accessed):
+        import pyarrow as pa
+        # 書き込み後に残す {ticker: rec} (位置情報なし、読み込み時刻を反映)
+        entries = {}
+        for t, m in self._index.items():
+            if t in deleted: continue
+            rec = {k: v for k, v in m.items() if k not in _POSITION_KEYS}
+            rec.setdefault("bytes", entry_bytes(t, m["rows"]))
+            entries[t] = rec
+        entries.update({t: rec for t, (_, rec) in pending.items()})
+        for t, ts in accessed.items():
+            if t in entries:
+                entries[t]["accessed"] = max(ts, entries[t].get("accessed") or 0)
+        victims = lru_victims(entries, pending, self.max_entries, self.max_bytes)
+        for t in victims: del entries[t]
+        self.evictions += len(victims)
+
+        parts, index, offset = [], {}, 0
+        for t in sorted(entries):
+            if t in pending:
+                df = pending[t][0]
+                part = pa.table({
+                    "ticker": pa.array([t] * len(df), pa.string()),
+                    "date": pa.array(df.index.to_numpy(dtype="datetime64[ns]"), pa.timestamp("ns")),
+                    "close": pa.array(df["Close"].to_numpy(dtype=float), pa.float64()),
+                })
+            else:
+                part = self._table.slice(self._index[t]["offset"], self._index[t]["rows"])
+            index[t] = {"offset": offset, "rows": part.num_rows, **entries[t]}
+            offset += part.num_rows
+            parts.append(part)
+        schema = pa.schema(
+            [("ticker", pa.string()), ("date", pa.timestamp("ns")), ("close", pa.float64())],
+            metadata={INDEX_KEY: json.dumps(index, ensure_ascii=False).encode("utf-8")},
+        )
+        if not parts:
+            return schema.empty_table()
+        return pa.concat_tables([p.cast(schema.remove_metadata()) for p in parts]).replace_schema_metadata(schema.metadata)
+
+    def _write(self, table):
+        import pyarrow as pa
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = _temp_path(self.path)
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            # 書き出した後は旧ファイルのマップが不要 (Windows はマップ中のファイルを置き換えられない)
+            self._close()
+            self._stat = None
+            for attempt in range(REPLACE_RETRIES):
+                try:
+                    os.replace(tmp_path, self.path)
+                    return True
+                except PermissionError:
+                    if attempt == REPLACE_RETRIES - 1: raise
+                    time.sleep(0.1 * (attempt + 1))
+        except Exception as e:
+            print(f"Price store write error {self.path}: {e}")
+        _remove(tmp_path)
+        return False
+
+    # --- 為替レート ---
+    def _fx_path(self, pair):
+        return os.path.join(os.path.dirname(self.path), f"{pair}.json")
+
+    def load_fx(self, pair):
+        try:
+            with open(self._fx_path(pair), encoding="utf-8") as f:
+                rec = json.load(f)
+            return float(rec["rate"]), datetime.fromisoformat(rec["fetched_at"])
+        except: return None, None
+
+    def save_fx(self, pair, rate, fetched_at):
+        file_path = self._fx_path(pair)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            tmp_path = _temp_path(file_path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"pair": pair, "rate": rate, "fetched_at": fetched_at.isoformat(timespec="seconds")}, f)
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            print(f"FX write error {pair}: {e}")
+            _remove(tmp_path)
+
+    def clear_fx(self, pair):
+        try:
+            os.remove(self._fx_path(pair))
+            return True
+        except OSError: return False
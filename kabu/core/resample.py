@@ -0,0 +1,49 @@
+"""
+履歴の表示用ビュー (日次 / 週次 / 月次) の遅延計算。
+
+キャッシュには取得した日次データをそのまま保存し、粒度の変換は表示する時に行う。
+結果は (ticker, 粒度, 履歴のハッシュ) 単位でメモ化するため、同じ履歴なら再実行しても再計算しない。
+merge_history は重複期間の値を差し替える (基準価額の訂正など) ので、ハッシュは全件の日付と値から取る。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+RESOLUTIONS = {"D": None, "W": "W-FRI", "M": "ME"}  # 粒度 -> resample の規則 (None は元データ。"ME" は pandas>=2.2)
+VIEW_CACHE_ENTRIES = 1024
+
+_views = OrderedDict()
+_views_lock = threading.Lock()
+
+def _fingerprint(hist):
+    """日付と値のハッシュ (charts.history_hash と同じ)"""
+    h = hashlib.sha1()
+    h.update(hist.index.asi8.tobytes())
+    h.update(hist.to_numpy(dtype=float).tobytes())
+    return h.hexdigest()
+
+def resample_history(hist, resolution="D"):
+    """履歴 (Series / DataFrame) を粒度ごとの最終値に揃える。日次はそのまま返す"""
+    rule = RESOLUTIONS[resolution]
+    if rule is None or hist.empty: return hist
+    return hist.resample(rule).last().dropna()
+
+def history_view(ticker, hist, resolution="D"):
+    """resample_history のメモ化版 (LRU、スレッドセーフ)"""
+    if RESOLUTIONS[resolution] is None: return hist
+    key = (ticker, resolution, _fingerprint(hist))
+    with _views_lock:
+        view = _views.get(key)
+        if view is not None:
+            _views.move_to_end(key)
+            return view
+    view = resample_history(hist, resolution)
+    with _views_lock:
+        _views[key] = view
+        while len(_views) > VIEW_CACHE_ENTRIES:
+            _views.popitem(last=False)
+    return view
+
+def clear_views():
+    with _views_lock:
+        _views.clear()
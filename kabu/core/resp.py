@@ -0,0 +1,292 @@
+"""
+Redis プロトコル (RESP2) の最小クライアントと、ローカル確認用のインメモリ・サーバー。
+
+クライアントはキャッシュのバックエンド (core/cache_backend.RedisBackend) が使うコマンドだけを送れればよいので、
+redis-py には依存しない。サーバーはその同じコマンドだけを実装した、開発・動作確認用の代用品。
+
+    python -m core.resp --port 6379                         # 代用サーバーを起動
+    KABU_CACHE_BACKEND=redis://localhost:6379/0 streamlit run stock_app.py
+"""
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+CONNECT_TIMEOUT = 5
+SOCKET_TIMEOUT = 10
+
+class RespError(Exception):
+    """サーバーが返したエラー応答 (-ERR ...)"""
+
+def encode_command(args):
+    out = [b"*%d\r\n" % len(args)]
+    for a in args:
+        if isinstance(a, bytes): b = a
+        elif isinstance(a, str): b = a.encode("utf-8")
+        else: b = str(a).encode("ascii")
+        out.append(b"$%d\r\n%s\r\n" % (len(b), b))
+    return b"".join(out)
+
+class RespClient:
+    """1接続を共有する同期クライアント (スレッドセーフ)。切断されていたら1回だけ繋ぎ直す"""
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None):
+        self.host, self.port, self.db, self.password = host, port, db, password
+        self._sock = None
+        self._buf = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        sock.settimeout(SOCKET_TIMEOUT)
+        self._sock, self._buf = sock, sock.makefile("rb")
+        for cmd in ([["AUTH", self.password]] if self.password else []) + ([["SELECT", self.db]] if self.db else []):
+            reply = self._call([cmd])[0]
+            if isinstance(reply, RespError): raise reply
+
+    def _close(self):
+        try:
+            if self._sock: self._sock.close()
+        except OSError: pass
+        self._sock = self._buf = None
+
+    def _read_reply(self):
+        line = self._buf.readline()
+        if not line: raise ConnectionError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+": return rest.decode()
+        if kind == b"-": return RespError(rest.decode())
+        if kind == b":": return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0: return None
+            data = self._buf.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read_reply() for _ in range(n)]
+        raise ConnectionError(f"bad reply: {line!r}")
+
+    def _call(self, commands):
+        self._sock.sendall(b"".join(encode_command(c) for c in commands))
+        return [self._read_reply() for _ in commands]
+
+    def pipeline(self, commands):
+        """複数コマンドを1往復で送り、応答のリストを返す (エラー応答があれば RespError)"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None: self._connect()
+                    replies = self._call(commands)
+                    break
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt: raise
+        for r in replies:
+            if isinstance(r, RespError): raise r
+        return replies
+
+    def execute(self, *args):
+        return self.pipeline([list(args)])[0]
+
+    def exec_if_equal(self, key, value, commands):
+        """
+        key の値が value の時だけ commands を MULTI/EXEC で実行する (WATCH で比較から実行までの変更を検出)。
+        戻り値: commands の応答のリスト。値が違う・途中で変更された場合は None
+        """
+        value = value.encode("utf-8") if isinstance(value, str) else value
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None: self._connect()
+                    _, current = self._call([["WATCH", key], ["GET", key]])
+                    if current != value:
+                        self._call([["UNWATCH"]])
+                        return None
+                    replies = self._call([["MULTI"], *commands, ["EXEC"]])
+                    break
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt: raise
+        for r in replies:
+            if isinstance(r, RespError): raise r
+        return replies[-1]
+
+# --- ローカル確認用のサーバー ---
+class MemoryServer:
+    """
+    RedisBackend が使うコマンド (GET/SET[NX|XX|EX|PX]/MGET/DEL/HSET/HGET/HMGET/HDEL/HGETALL/HLEN、
+    WATCH/UNWATCH/MULTI/EXEC/DISCARD) と PING/SELECT/AUTH/FLUSHDB/DBSIZE だけを持つインメモリのサーバー。
+    永続化・レプリケーションは無い。
+    """
+
+    def __init__(self):
+        self.dbs = {}
+        self.expires = {}
+        self.versions = {}  # (db, key) -> 変更回数 (WATCH 用)
+
+    def _touch(self, db, key):
+        self.versions[(id(db), key)] = self.versions.get((id(db), key), 0) + 1
+
+    def _db(self, state):
+        return self.dbs.setdefault(state["db"], {})
+
+    def _alive(self, db, key):
+        exp = self.expires.get((id(db), key))
+        if exp is not None and exp <= time.time():
+            db.pop(key, None)
+            self.expires.pop((id(db), key), None)
+            self._touch(db, key)
+        return key in db
+
+    def _hash(self, db, key, create=False):
+        if not self._alive(db, key):
+            if not create: return {}
+            db[key] = {}
+            self._touch(db, key)
+        h = db[key]
+        if not isinstance(h, dict): raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return h
+
+    def handle(self, args, state):
+        cmd = args[0].upper().decode()
+        a = args[1:]
+        db = self._db(state)
+        if state.get("multi") is not None and cmd not in ("EXEC", "DISCARD", "MULTI", "WATCH"):
+            state["multi"].append(args)
+            return "QUEUED"
+        if cmd == "PING": return "PONG"
+        if cmd == "AUTH": return "OK"
+        if cmd == "SELECT":
+            state["db"] = int(a[0])
+            return "OK"
+        if cmd == "FLUSHDB":
+            for k in db: self._touch(db, k)
+            db.clear()
+            return "OK"
+        if cmd == "WATCH":
+            if state.get("multi") is not None: raise RespError("ERR WATCH inside MULTI is not allowed")
+            for k in a:
+                self._alive(db, k)
+                state.setdefault("watch", []).append((db, k, self.versions.get((id(db), k), 0)))
+            return "OK"
+        if cmd == "UNWATCH":
+            state.pop("watch", None)
+            return "OK"
+        if cmd == "MULTI":
+            if state.get("multi") is not None: raise RespError("ERR MULTI calls can not be nested")
+            state["multi"] = []
+            return "OK"
+        if cmd == "DISCARD":
+            if state.get("multi") is None: raise RespError("ERR DISCARD without MULTI")
+            state["multi"] = None
+            state.pop("watch", None)
+            return "OK"
+        if cmd == "EXEC":
+            if state.get("multi") is None: raise RespError("ERR EXEC without MULTI")
+            queued, state["multi"] = state["multi"], None
+            for wdb, k, version in state.pop("watch", []):
+                self._alive(wdb, k)
+                if self.versions.get((id(wdb), k), 0) != version: return None
+            replies = []
+            for q in queued:
+                try: replies.append(self.handle(q, state))
+                except RespError as e: replies.append(e)
+            return replies
+        if cmd == "DBSIZE": return sum(1 for k in list(db) if self._alive(db, k))
+        if cmd == "GET":
+            v = db.get(a[0]) if self._alive(db, a[0]) else None
+            if isinstance(v, dict): raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return v
+        if cmd == "MGET":
+            return [db[k] if self._alive(db, k) and not isinstance(db[k], dict) else None for k in a]
+        if cmd == "SET":
+            key, value, opts = a[0], a[1], [o.upper() for o in a[2:]]
+            if b"NX" in opts and self._alive(db, key): return None
+            if b"XX" in opts and not self._alive(db, key): return None
+            db[key] = value
+            self._touch(db, key)
+            self.expires.pop((id(db), key), None)
+            for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+                if unit in opts:
+                    self.expires[(id(db), key)] = time.time() + int(a[2 + opts.index(unit) + 1]) * scale
+            return "OK"
+        if cmd == "DEL":
+            n = 0
+            for k in a:
+                if self._alive(db, k):
+                    del db[k]
+                    self._touch(db, k)
+                    n += 1
+            return n
+        if cmd == "HSET":
+            h = self._hash(db, a[0], create=True)
+            pairs = list(zip(a[1::2], a[2::2]))
+            added = sum(1 for f, _ in pairs if f not in h)
+            h.update(pairs)
+            self._touch(db, a[0])
+            return added
+        if cmd == "HGET": return self._hash(db, a[0]).get(a[1])
+        if cmd == "HMGET":
+            h = self._hash(db, a[0])
+            return [h.get(f) for f in a[1:]]
+        if cmd == "HDEL":
+            h = self._hash(db, a[0])
+            n = sum(1 for f in a[1:] if h.pop(f, None) is not None)
+            if n: self._touch(db, a[0])
+            return n
+        if cmd == "HGETALL": return [x for kv in self._hash(db, a[0]).items() for x in kv]
+        if cmd == "HLEN": return len(self._hash(db, a[0]))
+        raise RespError(f"ERR unknown command '{cmd.lower()}'")
+
+def encode_reply(value):
+    if value is None: return b"$-1\r\n"
+    if isinstance(value, RespError): return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, str): return b"+%s\r\n" % value.encode()
+    if isinstance(value, int): return b":%d\r\n" % value
+    if isinstance(value, bytes): return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply(v) for v in value)
+
+async def _read_command(reader):
+    line = await reader.readline()
+    if not line: return None
+    if not line.startswith(b"*"):
+        return line.split()  # インラインコマンド (telnet など)
+    args = []
+    for _ in range(int(line[1:-2])):
+        n = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(n + 2))[:-2])
+    return args
+
+async def serve(host="127.0.0.1", port=6379, server=None):
+    server = server or MemoryServer()
+
+    async def client(reader, writer):
+        state = {"db": 0}
+        try:
+            while True:
+                args = await _read_command(reader)
+                if args is None: break
+                if not args: continue
+                try: reply = server.handle(args, state)
+                except RespError as e: reply = e
+                except Exception as e: reply = RespError(f"ERR {e}")
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError): pass
+        finally:
+            writer.close()
+
+    srv = await asyncio.start_server(client, host, port)
+    print(f"RESP stand-in listening on {host}:{port}")
+    async with srv:
+        await srv.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redis 代用のインメモリ・サーバー (開発・確認用)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try: asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt: pass
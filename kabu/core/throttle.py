@@ -0,0 +1,145 @@
+"""
+ホスト単位のレート制限 (トークンバケット) とサーキットブレーカー。
+
+finance.yahoo.co.jp へのスクレイピングと yfinance 呼び出しはすべてここを通す。
+連続して失敗したホストはブレーカーが開き、一定時間は通信せずにキャッシュへ回す。
+"""
+import threading
+import time
+from urllib.parse import urlsplit
+
+YAHOO_JP_HOST = "finance.yahoo.co.jp"
+YFINANCE_HOST = "yfinance"   # yfinance は内部で複数ホストを使うため論理名でまとめる
+
+# host -> (1秒あたりのリクエスト数, バースト上限)
+HOST_LIMITS = {
+    YAHOO_JP_HOST: (3.0, 6),
+    YFINANCE_HOST: (2.0, 4),
+}
+DEFAULT_LIMIT = (5.0, 10)
+
+FAILURE_THRESHOLD = 5    # 連続失敗でブレーカーを開く回数
+RESET_TIMEOUT = 60.0     # 開いてから試行を1件だけ通すまでの秒数
+
+class CircuitOpenError(Exception):
+    pass
+
+class TokenBucket:
+    """rate 個/秒で補充され、最大 capacity 個まで貯まるトークン。clock は差し替え可能な単調時計 (テスト用)"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """トークンを1つ予約し、使えるようになるまでの待ち秒数を返す (0なら即時)"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens >= 0: return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0: time.sleep(wait)
+
+class CircuitBreaker:
+    """
+    closed -> (連続失敗) -> open -> (RESET_TIMEOUT 経過) -> half_open -> 成功で closed / 失敗で open。
+    clock は TokenBucket と同じく差し替え可能な単調時計。
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self):
+        """通信すればブロックされる状態か (half_open の試行枠が空いている場合は False)"""
+        with self._lock:
+            if self.state == "closed": return False
+            if self.state == "open":
+                return self.clock() - self.opened_at < self.reset_timeout
+            return self._trial_in_flight
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = self.clock()
+            self._trial_in_flight = False
+
+class HostGuard:
+    def __init__(self, host):
+        rate, burst = HOST_LIMITS.get(host, DEFAULT_LIMIT)
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+
+    def before_request(self):
+        """同期呼び出し用: ブレーカーが開いていれば CircuitOpenError、そうでなければレート制限で待つ"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.host)
+        self.bucket.acquire()
+
+    async def before_request_async(self):
+        import asyncio
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.host)
+        wait = self.bucket.reserve()
+        if wait > 0: await asyncio.sleep(wait)
+
+    def record(self, ok):
+        if ok: self.breaker.record_success()
+        else: self.breaker.record_failure()
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+def guard_for(host_or_url):
+    host = urlsplit(host_or_url).hostname if "://" in host_or_url else host_or_url
+    with _guards_lock:
+        g = _guards.get(host)
+        if g is None:
+            g = _guards[host] = HostGuard(host)
+        return g
+
+def is_response_ok(status):
+    """ブレーカー判定用: 通信エラー・429・5xx を失敗とみなす"""
+    return status is not None and status != 429 and status < 500
+
+def open_circuits():
+    """現在ブレーカーが開いているホスト名の一覧"""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return [g.host for g in guards if g.breaker.is_open()]
@@ -0,0 +1,103 @@
+"""
+ポートフォリオ評価額の時系列エンジン。
+
+全銘柄の履歴を1つの日付軸に揃えた価格行列 (日付 x 銘柄) を作り、
+購入日から求めた日ごとの保有数・取得額と掛け合わせて、評価額・損益の推移を一括計算する。
+換算は aggregate_portfolio と同じ (米国株は各日の USD/JPY、投信は /10000)。
+"""
+import numpy as np
+import pandas as pd
+
+from .aggregate import classify_tickers
+
+TS_COLUMNS = ["value", "invested", "pl", "pl_pct"]
+
+def align_prices(histories, tickers, start=None):
+    """
+    {ticker: DataFrame[['Close']]} を共通の日付軸に揃える (各銘柄の休場日は直前値で埋める)。
+    戻り値: (dates: DatetimeIndex, prices: ndarray[日付, 銘柄]。履歴開始前は NaN)
+    """
+    series = {}
+    for t in tickers:
+        h = histories.get(t)
+        if h is None or h.empty: continue
+        series[t] = (h.index.to_numpy(dtype="datetime64[ns]"), h["Close"].to_numpy(dtype=float))
+    if not series:
+        return pd.DatetimeIndex([]), np.empty((0, len(tickers)))
+
+    # 全銘柄の日付の和集合を軸にし、各銘柄の値をその位置に置く
+    dates = np.unique(np.concatenate([d for d, _ in series.values()]))
+    prices = np.full((len(dates), len(tickers)), np.nan)
+    for j, t in enumerate(tickers):
+        if t in series:
+            d, v = series[t]
+            prices[dates.searchsorted(d), j] = v   # 重複日は後の値が残る
+
+    # 休場日などの欠損を直前値で埋める (列ごとに最後の有効行を累積 max で求める)
+    rows = np.where(~np.isnan(prices), np.arange(len(dates))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    prices = prices[rows, np.arange(len(tickers))]
+
+    dates = pd.DatetimeIndex(dates)
+    if start is not None:
+        keep = dates >= start
+        dates, prices = dates[keep], prices[keep]
+    return dates, prices
+
+def _cumulative_by_date(dates, col_idx, tx_dates, amounts, n_cols):
+    """
+    取引 (日付, 銘柄列, 量) を日付軸上の累積値の行列にする (取引日以降に反映)。
+    履歴の最終日より後の取引 (当日の購入で株価が未確定など) は最終日に含め、集計表 (aggregate_portfolio) と揃える。
+    """
+    rows = np.minimum(dates.searchsorted(tx_dates, side="left"), len(dates) - 1)
+    delta = np.zeros((len(dates), n_cols))
+    np.add.at(delta, (rows, col_idx), amounts)
+    return np.cumsum(delta, axis=0)
+
+def portfolio_timeseries(holdings, histories, usdjpy=None):
+    """
+    holdings: normalize_holdings の結果 (ticker, shares, price, date)
+    histories: {ticker: DataFrame[['Close']]}
+    usdjpy: USD/JPY の Series (日付index) または定数。None なら米国株は換算しない (1.0)。
+    戻り値: 日付indexで TS_COLUMNS を持つ DataFrame (最初の購入日以降)
+    """
+    if holdings.empty:
+        return pd.DataFrame(columns=TS_COLUMNS)
+
+    tickers = list(dict.fromkeys(holdings["ticker"]))
+    tx_dates = pd.to_datetime(holdings["date"]).to_numpy()
+    dates, prices = align_prices(histories, tickers)
+    if len(dates) == 0:
+        return pd.DataFrame(columns=TS_COLUMNS)
+    # 最初の購入日以降 (全て履歴の最終日より後の購入でも最終日は残す)
+    keep = dates >= min(pd.Timestamp(tx_dates.min()), dates[-1])
+    dates, prices = dates[keep], prices[keep]
+
+    col_idx = pd.Index(tickers).get_indexer(holdings["ticker"])
+    shares_amt = holdings["shares"].to_numpy(dtype=float)
+    cost_amt = shares_amt * holdings["price"].to_numpy(dtype=float)
+    shares = _cumulative_by_date(dates, col_idx, tx_dates, shares_amt, len(tickers))
+    cost = _cumulative_by_date(dates, col_idx, tx_dates, cost_amt, len(tickers))
+
+    # 各日の USD/JPY (履歴の無い日は前後の値で補う)
+    if isinstance(usdjpy, pd.Series) and not usdjpy.empty:
+        fx = usdjpy[~usdjpy.index.duplicated(keep="last")].sort_index()
+        fx = fx.reindex(fx.index.union(dates)).ffill().bfill().reindex(dates).to_numpy(dtype=float)
+    else:
+        fx = np.full(len(dates), 1.0 if usdjpy is None else float(usdjpy))
+
+    types = classify_tickers(pd.Series(tickers)).to_numpy()
+    is_us = types == "US_STOCK"
+    unit = np.where(types == "JP_FUND", 1 / 10000, 1.0)
+    factor = np.where(is_us[None, :], fx[:, None], 1.0) * unit[None, :]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 履歴が購入日まで遡れない期間は取得単価で評価する (損益0として扱う)
+        avg = np.where(shares > 0, cost / shares, 0.0)
+        px = np.where(np.isnan(prices), avg, prices)
+        value = (shares * px * factor).sum(axis=1)
+        invested = (cost * factor).sum(axis=1)
+        pl = value - invested
+        pl_pct = np.where(invested > 0, pl / invested * 100, 0.0)
+
+    return pd.DataFrame({"value": value, "invested": invested, "pl": pl, "pl_pct": pl_pct}, index=dates)
@@ -0,0 +1,129 @@
+"""
+処理段階ごとの軽量な計測 (トレーススパン)。
+
+    trace = start_trace("rerun")
+    with span("aggregate", rows=len(df)) as attrs:
+        ...
+        attrs["status"] = 200   # 終了時に分かる値は後から追加できる
+    end_trace(trace)
+    trace.records()   # デバッグパネル用
+
+スパンは contextvars で親子関係とトレースを引き継ぐ (asyncio のタスクにも伝わる)。
+スレッドプールへ渡す関数は in_context() で包むと同じトレースに記録される。
+環境変数 KABU_TRACE_LOG にパスを指定すると、スパンを1行1JSONで追記する。
+トレースもログも無い場合の span() はほぼ何もしない。
+"""
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_LOG_ENV = "KABU_TRACE_LOG"
+
+_current_trace = contextvars.ContextVar("kabu_trace", default=None)
+_current_span = contextvars.ContextVar("kabu_span", default=None)
+_ids = itertools.count(1)
+_log_lock = threading.Lock()
+_log_file = None
+_log_path = None
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.id = f"{os.getpid()}-{int(time.time())}-{next(_ids)}"
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def add(self, rec):
+        with self._lock:
+            self._spans.append(rec)
+
+    def records(self):
+        """開始順のスパン一覧 [{"span", "start_ms", "ms", "depth", "thread", "attrs", "error"}]"""
+        with self._lock:
+            return sorted(self._spans, key=lambda r: r["start_ms"])
+
+def _log_target():
+    """KABU_TRACE_LOG が変わったら開き直す"""
+    global _log_file, _log_path
+    path = os.environ.get(TRACE_LOG_ENV) or None
+    if path != _log_path:
+        if _log_file: _log_file.close()
+        _log_file = None
+        _log_path = path
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                _log_file = open(path, "a", encoding="utf-8", buffering=1)
+            except Exception as e:
+                print(f"Trace log open error {path}: {e}")
+    return _log_file
+
+def _write_log(rec):
+    with _log_lock:
+        f = _log_target()
+        if f is None: return
+        try: f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+        except Exception as e: print(f"Trace log write error: {e}")
+
+def start_trace(name, **attrs):
+    """新しいトレースを開始し、以降このコンテキストの span() を記録する"""
+    trace = Trace(name, **attrs)
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+def end_trace(trace):
+    trace.duration_ms = (time.perf_counter() - trace.started) * 1000
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    if os.environ.get(TRACE_LOG_ENV):
+        _write_log({
+            "ts": datetime.now().isoformat(timespec="milliseconds"), "trace": trace.id,
+            "span": trace.name, "ms": round(trace.duration_ms, 3), "depth": -1, **trace.attrs,
+        })
+    return trace
+
+@contextmanager
+def span(name, **attrs):
+    trace = _current_trace.get()
+    if trace is None and not os.environ.get(TRACE_LOG_ENV):
+        yield attrs
+        return
+    parent = _current_span.get()
+    depth = parent[1] + 1 if parent else 0
+    token = _current_span.set((name, depth))
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        _current_span.reset(token)
+        rec = {
+            "span": name, "ms": round(ms, 3), "depth": depth,
+            "start_ms": round((t0 - trace.started) * 1000, 3) if trace else None,
+            "parent": parent[0] if parent else None,
+            "thread": threading.current_thread().name, "attrs": attrs, "error": error,
+        }
+        if trace is not None: trace.add(rec)
+        if os.environ.get(TRACE_LOG_ENV):
+            _write_log({
+                "ts": datetime.now().isoformat(timespec="milliseconds"),
+                "trace": trace.id if trace else None, **{k: v for k, v in rec.items() if k != "attrs"}, **attrs,
+            })
+
+def in_context(fn, *args, **kwargs):
+    """現在のトレース・スパンを引き継いで fn を実行する呼び出し可能オブジェクト (executor 用)"""
+    return functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,25 @@
+"""
+銘柄コード判定・数値変換などの共通ユーティリティ。
+"""
+import math
+
+def get_ticker_type(ticker):
+    t = str(ticker).strip().upper()
+    if t.endswith(".T"): return "JP_STOCK"
+    if t.isalpha(): return "US_STOCK"
+    return "JP_FUND"
+
+NUMBER_NOISE = (',', '%', '円')  # 数値の文字列から取り除く記号 (集計の _to_num も同じものを使う)
+
+def safe_float(value, default=0.0):
+    try:
+        if value is None: return default
+        if isinstance(value, (int, float)):
+            if math.isnan(value): return default
+            return float(value)
+        s = str(value)
+        for ch in NUMBER_NOISE: s = s.replace(ch, '')
+        s = s.strip()
+        if not s or s in ['-', '---', 'N/A']: return default
+        return float(s)
+    except: return default
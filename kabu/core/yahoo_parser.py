@@ -0,0 +1,43 @@
+"""
+Yahoo!ファイナンスのページ解析ヘルパー。
+"""
+import json
+import re
+from html import unescape
+
+PRELOADED_STATE_MARKER = "window.__PRELOADED_STATE__"
+
+_decoder = json.JSONDecoder()
+
+def extract_preloaded_state(html):
+    """
+    HTML文字列から window.__PRELOADED_STATE__ のJSONオブジェクトだけを取り出す。
+    DOMは構築せず、マーカー位置から raw_decode でオブジェクト1つ分だけをデコードする。
+    (文字列値中の ';' で途切れることもない)
+    見つからない / 壊れている場合は None。
+    """
+    if not html: return None
+    pos = html.find(PRELOADED_STATE_MARKER)
+    if pos < 0: return None
+    pos = html.find("=", pos + len(PRELOADED_STATE_MARKER))
+    if pos < 0: return None
+    pos += 1
+    n = len(html)
+    while pos < n and html[pos] in " \t\r\n":
+        pos += 1
+    try:
+        obj, _ = _decoder.raw_decode(html, pos)
+    except ValueError as e:
+        print(f"JSON parse error: {e}")
+        return None
+    return obj if isinstance(obj, dict) else None
+
+_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+def parse_fund_name(html):
+    """<title> からファンド名を取り出す (例: 'eMAXIS Slim 米国株式【03311187】：...' -> 'eMAXIS Slim 米国株式')"""
+    if not html: return None
+    m = _TITLE_RE.search(html)
+    if not m: return None
+    name = unescape(m.group(1)).split('【')[0].split(' - ')[0].strip()
+    return name or None
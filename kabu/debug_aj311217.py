@@ -1,32 +1,16 @@
-import requests
-import json
-from bs4 import BeautifulSoup
-
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-}
+from core import http_client
+from core.yahoo_parser import extract_preloaded_state
 
 def debug_json(code):
     url = f"https://finance.yahoo.co.jp/quote/{code}/chart"
     print(f"Fetching {url}...")
     
-    res = requests.get(url, headers=headers, timeout=10)
+    res = http_client.get(url, timeout=10)
     if res.status_code != 200:
         print(f"Failed to fetch: {res.status_code}")
         return
 
-    soup = BeautifulSoup(res.text, 'html.parser')
-    scripts = soup.find_all('script')
-    
-    target_json = None
-    for s in scripts:
-        if s.string and "window.__PRELOADED_STATE__" in s.string:
-            try:
-                json_str = s.string.split("window.__PRELOADED_STATE__ = ")[1].split(";")[0]
-                target_json = json.loads(json_str)
-                break
-            except Exception as e:
-                print(f"JSON parse error: {e}")
+    target_json = extract_preloaded_state(res.text)
 
     if not target_json:
         print("No PRELOADED_STATE found.")
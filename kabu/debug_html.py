@@ -1,15 +1,12 @@
-import requests
+from core import http_client
 from bs4 import BeautifulSoup
 import pandas as pd
 
 def test_html_table(code):
     url = f"https://finance.yahoo.co.jp/quote/{code}/history"
     print(f"Fetching {url} for HTML table...")
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    }
     try:
-        res = requests.get(url, headers=headers, timeout=10)
+        res = http_client.get(url, timeout=10)
         soup = BeautifulSoup(res.text, 'html.parser')
         tables = soup.find_all('table')
         print(f"Found {len(tables)} tables.")
@@ -3,9 +3,10 @@ import yfinance as yf
 import re
 from datetime import datetime, timedelta
 import os
+from core.portfolio_store import append_transactions
 
 INPUT_FILE = "import_data.txt"
-OUTPUT_FILE = "portfolio_sub.csv"
+OUTPUT_PORTFOLIO = "sub"  # 仮想保有株式
 
 def get_historical_price(ticker_symbol, target_date_str):
     """
@@ -149,19 +150,17 @@ def main():
         print("No valid stocks found to import.")
         return
 
-    print(f"\n=== Appending {len(new_stocks)} stocks to {OUTPUT_FILE} ===")
+    print(f"\n=== Appending {len(new_stocks)} stocks to portfolio '{OUTPUT_PORTFOLIO}' ===")
     
     try:
-        with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-            # Check if file has content and ends with newline
-             # (Simple append, assuming file exists per prev context)
-            for s in new_stocks:
-                line = f"{s['code']},{s['name']},{s['date']},{s['shares']},{s['price']:.0f}"
-                f.write(line + "\n")
-                print(f"Appended: {line}")
+        # 1トランザクションでまとめて追記 (アプリや他スクリプトと同時に書いても壊れない)
+        rows = [(s['code'], s['name'], s['date'], s['shares'], round(s['price'])) for s in new_stocks]
+        append_transactions(OUTPUT_PORTFOLIO, rows)
+        for r in rows:
+            print(f"Appended: {','.join(str(v) for v in r)}")
         print("Done.")
     except Exception as e:
-        print(f"Error writing to CSV: {e}")
+        print(f"Error writing to portfolio store: {e}")
 
 if __name__ == "__main__":
     main()
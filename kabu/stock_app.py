@@ -1,23 +1,23 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import plotly.express as px
-from datetime import datetime, timedelta
 import os
-import math
-import requests
-from bs4 import BeautifulSoup
-import re
 import time
-import shutil
-import random
-from urllib.parse import urljoin
+from core import (
+    ASSET_TYPES, DEFAULT_USDJPY, cache_entries, cache_stats, invalidate_cache, get_ticker_type, safe_float, fetch_all, load_cached_wave,
+    normalize_holdings, transactions_by_ticker, build_price_table, aggregate_portfolio, downsample_series, open_circuits,
+    PORTFOLIO_COLUMNS, load_portfolio, save_portfolio_if_changed, span, start_trace, end_trace,
+    portfolio_timeseries, history_view, PAGE_SIZE, page_holdings,
+)
+from charts import (
+    ChartCache, buy_points, build_history_figure, build_portfolio_figure, chart_key, make_render_pool, render_missing,
+)
 
 # --- ページ設定 ---
 st.set_page_config(page_title="株式管理ダッシュボード", layout="wide")
 
+# --- 処理時間の計測 (末尾のデバッグパネル / 環境変数 KABU_TRACE_LOG のJSONログ) ---
+trace = start_trace("rerun")
+
 # --- カスタムCSS ---
 st.markdown("""
     <style>
@@ -36,25 +36,8 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ==========================================
-# 0. ユーティリティ
+# 0. ユーティリティ (表示用)
 # ==========================================
-def get_ticker_type(ticker):
-    t = str(ticker).strip().upper()
-    if t.endswith(".T"): return "JP_STOCK"
-    if t.isalpha(): return "US_STOCK"
-    return "JP_FUND"
-
-def safe_float(value, default=0.0):
-    try:
-        if value is None: return default
-        if isinstance(value, (int, float)):
-            if math.isnan(value): return default
-            return float(value)
-        s = str(value).replace(',', '').replace('%', '').replace('円', '').strip()
-        if not s or s in ['-', '---', 'N/A']: return default
-        return float(s)
-    except: return default
-
 def safe_fmt(value, fmt=",.0f", symbol=""):
     val = safe_float(value)
     try: return f"{symbol}{val:{fmt}}"
@@ -73,303 +56,23 @@ def create_badge_f(val, pct, symbol="$"):
     return f'<span class="{css}">{icon} {symbol}{abs(val):,.2f} ({"+" if val>=0 else ""}{pct:.2f}%)</span>'
 
 # ==========================================
-# 1. データ取得ロジック
+# 1. データ取得 (ロジック本体は core/)
 # ==========================================
-CACHE_DIR = "stock_data_cache"
-if not os.path.exists(CACHE_DIR): os.makedirs(CACHE_DIR)
-
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-    'Accept-Language': 'ja,en-US;q=0.7,en;q=0.3',
-}
-
-@st.cache_data(ttl=3600)
-def get_usdjpy_rate():
-    try:
-        ticker = yf.Ticker("USDJPY=X")
-        hist = ticker.history(period="1d")
-        if not hist.empty: return safe_float(hist['Close'].iloc[-1], 150.0)
-    except: pass
-    return 150.0
-
-usdjpy_rate = get_usdjpy_rate()
+# 投信・株価・為替は集計時に core.fetch_all でまとめて取得する
+@st.cache_resource
+def get_chart_cache():
+    return ChartCache()
 
-import json
-
-def scrape_japan_fund_history_params(code, status_area):
-    """
-    YahooファイナンスのHTML内に埋め込まれたJSON(window.__PRELOADED_STATE__)から
-    mainYJChart -> chart -> chartLine を抽出して株価データを取得する。
-    これにより、HTMLテーブルでは1ヶ月分しか取れない制限を回避し、2年分(週次/日次)を取得する。
-    """
-    base_url = f"https://finance.yahoo.co.jp/quote/{code}/chart"
-    
-    session = requests.Session()
-    session.headers.update(HEADERS)
-    
-    if status_area:
-        status_area.text(f"Fetching {code} (JSON method)...")
-
-    # Attempt 1: Direct HTML Table Parsing (Most reliable for some funds like AJ311217)
-    # This requires fetching /history page, not /chart
-    history_url = f"https://finance.yahoo.co.jp/quote/{code}/history"
-    try:
-        # print(f"Trying HTML table parse for {code}...")
-        res_h = session.get(history_url, timeout=10)
-        if res_h.status_code == 200:
-            soup_h = BeautifulSoup(res_h.text, 'html.parser')
-            tables = soup_h.find_all('table')
-            
-            for table in tables:
-                full_text = table.get_text()
-                if "日付" in full_text and "基準価額" in full_text:
-                    rows = []
-                    trs = table.find_all('tr')
-                    header = []
-                    for tr in trs:
-                        ths = tr.find_all('th')
-                        if ths:
-                            header = [th.get_text().strip() for th in ths]
-                            continue
-                        tds = tr.find_all('td')
-                        if tds:
-                            row = [td.get_text().strip() for td in tds]
-                            if len(row) == len(header):
-                                rows.append(row)
-                    
-                    if header and rows:
-                        df_table = pd.DataFrame(rows, columns=header)
-                        col_date = next((c for c in df_table.columns if "日付" in c), None)
-                        col_price = next((c for c in df_table.columns if "基準価額" in c), None)
-                        
-                        if col_date and col_price:
-                            df_curr = df_table[[col_date, col_price]].copy()
-                            df_curr.columns = ["Date", "Close"]
-                            
-                            def parse_jp_date(s):
-                                try: return pd.to_datetime(s, format='%Y年%m月%d日')
-                                except: return pd.to_datetime(s, errors='coerce')
-                            
-                            df_curr['Date'] = df_curr['Date'].apply(parse_jp_date)
-                            df_curr['Close'] = df_curr['Close'].apply(safe_float)
-                            df_curr = df_curr.dropna().set_index('Date').sort_index()
-                            
-                            if not df_curr.empty:
-                                print(f"Success: Parsed HTML table with {len(df_curr)} rows.")
-                                # Return immediately if successful
-                                if len(df_curr) > 30:
-                                   return df_curr.resample('W-FRI').last().dropna()[['Close']]
-                                else:
-                                   return df_curr[['Close']]
-    except Exception as e:
-        print(f"HTML Table Parse Error: {e}")
-
-    # Attempt 2: JSON Extraction (Fallback/Advanced)
-    try:
-        res = session.get(base_url, timeout=10)
-        if res.status_code != 200:
-            print(f"Failed to fetch {base_url}: {res.status_code}")
-            return pd.DataFrame()
-
-        soup = BeautifulSoup(res.text, 'html.parser')
-        scripts = soup.find_all('script')
-        
-        target_json = None
-        for s in scripts:
-            if s.string and "window.__PRELOADED_STATE__" in s.string:
-                try:
-                    json_str = s.string.split("window.__PRELOADED_STATE__ = ")[1].split(";")[0]
-                    target_json = json.loads(json_str)
-                    break
-                except Exception as e:
-                    print(f"JSON parse error: {e}")
-
-        if not target_json:
-            print("No PRELOADED_STATE found.")
-            return pd.DataFrame()
-            
-        # データ抽出: mainYJChart -> chart -> chartLine -> [0] -> data
-        # MEMO: chartLineはリスト担っていることが多い
-        chart_data = None
-        
-        # 深い階層を安全に探す
-        try:
-            if 'mainYJChart' in target_json:
-                c = target_json['mainYJChart']['chart']
-                if 'chartLine' in c:
-                    lines = c['chartLine']
-                    if isinstance(lines, list) and len(lines) > 0:
-                        chart_data = lines[0].get('data', [])
-        except Exception as e:
-            print(f"Data hierarchy traversal error: {e}")
-            
-        if not chart_data:
-            # Fallback to mainFundHistory (approx 1 month data)
-            # print("No chart data in mainYJChart, checking mainFundHistory...")
-            try:
-                if 'mainFundHistory' in target_json:
-                    hist = target_json['mainFundHistory']
-                    if 'histories' in hist:
-                        # Extract from histories
-                        # Format: {'date': '2026年2月6日', 'price': '20,696', ...}
-                        raw_data = hist['histories']
-                        if isinstance(raw_data, list) and len(raw_data) > 0:
-                            chart_data = []
-                            for item in raw_data:
-                                if 'date' in item and 'price' in item:
-                                    # Normalize date
-                                    d_str = item['date'] # "2026年2月6日"
-                                    # We can handle date parsing later or here
-                                    # Cleaning price
-                                    p_str = item['price'].replace(',', '')
-                                    chart_data.append({"date": d_str, "price": p_str})
-                            print(f"Fallback: Found {len(chart_data)} data points in mainFundHistory")
-            except Exception as e:
-                print(f"Fallback error: {e}")
-
-        if not chart_data:
-            # Fallback 2: mainFundPriceBoard (Current Price Only)
-            # Helps to at least show the current valuation even if chart is empty
-            try:
-                if 'mainFundPriceBoard' in target_json:
-                    pb = target_json['mainFundPriceBoard']
-                    if 'fundPrices' in pb:
-                         fp = pb['fundPrices']
-                         if 'price' in fp and 'updateDate' in fp:
-                             p_str = fp['price'].replace(',', '')
-                             d_str = fp['updateDate'] # format "12/05"
-                             
-                             # Estimate year
-                             now = datetime.now()
-                             try:
-                                 # Parse MM/DD
-                                 dt_part = datetime.strptime(d_str, '%m/%d')
-                                 # Assign current year first
-                                 dt = dt_part.replace(year=now.year)
-                                 # If date is in future (e.g. data says 12/31 but today is 1/1), sub 1 year?
-                                 # But updateDate is usually past.
-                                 # Use simple logic: valid date.
-                                 
-                                 chart_data = [{"date": dt, "price": p_str}]
-                                 print(f"Fallback 2: Found current price in mainFundPriceBoard: {p_str} ({d_str})")
-                             except: pass
-            except Exception as e:
-                print(f"Fallback 2 error: {e}")
-
-        if not chart_data:
-            print("No chart data found in JSON (mainYJChart, mainFundHistory, or mainFundPriceBoard).")
-            return pd.DataFrame()
-            
-        print(f"Found {len(chart_data)} data points for {code}")
-        
-        # DataFrame化
-        rows = []
-        for d in chart_data:
-            date_val = d.get('date') or d.get('Date')
-            price = d.get('price') or d.get('Close') or d.get('close') or d.get('value')
-            
-            if date_val is not None and price is not None:
-                rows.append({"Date": date_val, "Close": price})
-                
-        if not rows:
-            return pd.DataFrame()
-            
-        df = pd.DataFrame(rows)
-        
-        # Date parsing handling
-        # If fallback 2 used, date is already datetime
-        if not pd.api.types.is_datetime64_any_dtype(df['Date']):
-             # Try multiple formats
-            def parse_jp_date(s):
-                 if isinstance(s, datetime): return s
-                 # "2026年2月6日" -> datetime
-                 try:
-                     return pd.to_datetime(s, format='%Y年%m月%d日')
-                 except:
-                     try:
-                         return pd.to_datetime(s) # Standard fallback
-                     except: return pd.NaT
-
-            if df['Date'].astype(str).str.contains('年').any():
-                 df['Date'] = df['Date'].apply(parse_jp_date)
-            else:
-                 df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        
-        df['Close'] = df['Close'].apply(safe_float)
-        
-        df = df.dropna(subset=['Date'])
-        df = df.set_index('Date').sort_index()
-        
-        # 週次に間引く
-        if len(df) > 30:
-            df_weekly = df.resample('W-FRI').last().dropna()
-            return df_weekly[['Close']]
-        else:
-            return df[['Close']]
-
-
-
-    except Exception as e:
-        print(f"Top level scrape error: {e}")
-        return pd.DataFrame()
-
-def get_history_smart(ticker, data_type, status_placeholder=None):
-    # A. 個別株
-    if data_type != "JP_FUND":
-        if status_placeholder:
-            status_placeholder.text(f"⏳ {ticker} (株) 取得中...")
-        try:
-            stock = yf.Ticker(ticker)
-            df = stock.history(period="2y")
-            if not df.empty:
-                if df.index.tz is not None:
-                    df.index = df.index.tz_localize(None)
-                return df[['Close']]
-        except: pass
-        return pd.DataFrame()
-
-    # B. 投資信託
-    safe_ticker = "".join(c for c in ticker if c.isalnum())
-    file_path = os.path.join(CACHE_DIR, f"{safe_ticker}.csv")
-    
-    # キャッシュチェック
-    if os.path.exists(file_path):
-        try:
-            df = pd.read_csv(file_path, index_col=0, parse_dates=True)
-            mtime = datetime.fromtimestamp(os.path.getmtime(file_path)).date()
-            if len(df) > 0 and mtime == datetime.now().date():
-                return df
-        except: pass
-
-    # 新規取得
-    df = scrape_japan_fund_history_params(ticker, status_placeholder)
-    
-    # 保存
-    if not df.empty:
-        try: df[['Close']].to_csv(file_path)
-        except: pass
-    
-    return df
-
-@st.cache_data(ttl=3600*24)
-def get_fund_name(code):
-    url = f"https://finance.yahoo.co.jp/quote/{code}"
-    try:
-        res = requests.get(url, headers=HEADERS, timeout=5)
-        soup = BeautifulSoup(res.text, 'html.parser')
-        t_tag = soup.find('title')
-        if t_tag:
-            return t_tag.text.split('【')[0].split(' - ')[0]
-    except: pass
-    return code
+@st.cache_resource
+def get_render_pool():
+    return make_render_pool(max_workers=min(4, os.cpu_count() or 1))
 
 # ==========================================
 # 2. メイン処理 & UI
 # ==========================================
 PORTFOLIOS = {
-    "保有株式": "portfolio_main.csv",
-    "仮想保有株式": "portfolio_sub.csv"
+    "保有株式": "main",
+    "仮想保有株式": "sub"
 }
 
 # Sidebar Title Removed per user request
@@ -397,36 +100,45 @@ div.stButton > button:first-child:hover {
 metric_placeholder = st.sidebar.empty()
 st.sidebar.markdown("---")
 
+# キャッシュは銘柄・資産タイプ単位で消す (他の銘柄の温まったキャッシュは残す)
+CACHE_TYPE_LABELS = {"JP_STOCK": "日本株", "US_STOCK": "米国株", "JP_FUND": "投資信託", "FX": "為替"}
 c1, c2 = st.columns([9, 1])
-with c2:
-    if st.button("cache clear", key="cache_clear_top"):
-        if os.path.exists(CACHE_DIR):
-            try:
-                shutil.rmtree(CACHE_DIR)
-                os.makedirs(CACHE_DIR)
-                st.cache_data.clear()
-                st.success("Cleared")
-                time.sleep(0.5)
-                st.rerun()
-            except: pass
+with c2.popover("cache"):
+    stats = cache_stats()
+    hit_rate = f"{stats['hit_rate']:.0%}" if stats["hit_rate"] is not None else "-"
+    st.caption(
+        f"{stats['entries']:,} / {stats['max_entries']:,} 銘柄・{stats['bytes'] / 2**20:,.1f} / {stats['max_bytes'] / 2**20:,.0f} MB"
+        f"・ヒット率 {hit_rate} ({stats['hits']:,} / {stats['misses']:,} ミス)・追い出し {stats['evictions']:,}"
+    )
+    if stats["by_type"]:
+        st.dataframe(pd.DataFrame(
+            [(CACHE_TYPE_LABELS[k], n, f"{b / 1024:,.0f} KB") for k, (n, b) in stats["by_type"].items()],
+            columns=["資産タイプ", "銘柄数", "容量"]
+        ), hide_index=True, use_container_width=True)
+    picked = st.multiselect("銘柄", sorted(cache_entries()), key="cache_pick_tickers")
+    picked_types = st.multiselect(
+        "資産タイプ", ASSET_TYPES, format_func=CACHE_TYPE_LABELS.get, key="cache_pick_types"
+    )
+    if st.button("選択したキャッシュを削除して再取得", key="cache_invalidate", disabled=not (picked or picked_types)):
+        removed = invalidate_cache(picked, picked_types)
+        st.toast(f"{len(removed)} 件のキャッシュを削除しました")
+        time.sleep(0.5)
+        st.rerun()
 
 selected_pf_name = st.radio(
     "ポートフォリオ選択", list(PORTFOLIOS.keys()),
     horizontal=True, label_visibility="collapsed"
 )
-current_csv_file = PORTFOLIOS[selected_pf_name]
+current_pf = PORTFOLIOS[selected_pf_name]
 
 # Header removed per user request
 
-if os.path.exists(current_csv_file):
-    try:
-        df = pd.read_csv(current_csv_file)
-        for c in ["銘柄コード", "銘柄名", "購入日", "保有株数", "購入単価"]:
-            if c not in df.columns: df[c] = ""
-        df["購入日"] = pd.to_datetime(df["購入日"], errors='coerce').dt.date
-    except: df = pd.DataFrame()
-else:
-    df = pd.DataFrame(columns=["銘柄コード", "銘柄名", "購入日", "保有株数", "購入単価"])
+try:
+    with span("load_portfolio", portfolio=current_pf):
+        df = load_portfolio(current_pf)
+except Exception as e:
+    print(f"Portfolio load error: {e}")
+    df = pd.DataFrame(columns=PORTFOLIO_COLUMNS)
 
 # Hint caption removed per user request
 
@@ -450,287 +162,416 @@ edited_df = st.data_editor(
     key=f"editor_{selected_pf_name}"
 )
 
-try:
-    df_save = edited_df.dropna(subset=["銘柄コード"])
-    if not df_save.empty or not df.empty: df_save.to_csv(current_csv_file, index=False)
-except: pass
+# 編集があった場合のみ保存 (再実行ごとの書き込みはしない)
+try: save_portfolio_if_changed(current_pf, df, edited_df)
+except Exception as e: print(f"Portfolio save error: {e}")
 
 st.divider()
 
 # ==========================================
 # 3. 集計・分析
 # ==========================================
-analyzed_data = []
-total_val = 0; total_inv = 0
+# 取得の完了は待たない: まずキャッシュ済みのデータ (load_cached_wave) で全体を描き、
+# fetch_all の結果が1つ届くたびに集計し直して、値が変わったカードと合計・ヒートマップだけ描き直す
+PROGRESS_INTERVAL = 0.5   # 取得中に描き直す最短間隔 (秒)。最後の結果は間隔によらず描く
+GRID_SORTS = {"登録順": None, "構成比": "weight", "損益額": "pl", "損益率": "pl_pct", "前日比": "day_pct"}
+GRID_PL = {"すべて": None, "利益": "gain", "損失": "loss"}
+
+def pending_tickers(tickers, types, wave, finished):
+    """まだデータが1つも無く、取得も終わっていない銘柄"""
+    stock_hists, _ = wave["stocks"]
+    return {
+        t for t in tickers
+        if t not in finished and t not in (wave["funds"] if types[t] == "JP_FUND" else stock_hists)
+    }
+
+def analyze(holdings, tickers, types, tx_map, entered_names, wave, pending):
+    """
+    fetch_all / load_cached_wave の結果を集計する。
+    購入明細 (tx_map) と入力された銘柄名 (entered_names) は取得結果によらないので、呼び出し側で1回だけ作って渡す。
+    戻り値: (カード用データのリスト, 評価額合計, 投資額合計, 履歴 {ticker: DataFrame}, USD/JPY, 集計表)
+    取得中 (pending) の銘柄は合計に含めない。
+    """
+    fund_snaps = wave["funds"]
+    stock_hists, _ = wave["stocks"]
+    usdjpy_rate = wave["fx"] or DEFAULT_USDJPY
+
+    hists = {}
+    for t in tickers:
+        if types[t] == "JP_FUND":
+            hists[t] = fund_snaps[t]["history"] if t in fund_snaps else pd.DataFrame()
+        else:
+            hists[t] = stock_hists.get(t, pd.DataFrame())
+
+    # 銘柄名: 入力値 (最初の非空) → 投信は取得した名前 → コード
+    names = {}
+    for t in tickers:
+        name = entered_names.get(t)
+        if types[t] == "JP_FUND" and (pd.isna(name) or not name or name == t):
+            name = fund_snaps[t]["name"] if t in fund_snaps else None
+        if pd.isna(name) or not name: name = t
+        names[t] = name
+
+    # --- 集計 ---
+    with span("aggregate", rows=len(holdings), tickers=len(tickers), pending=len(pending)):
+        agg = aggregate_portfolio(holdings, build_price_table(hists), usdjpy_rate)
+        done = ~agg.index.isin(list(pending))
+        total_val = float(agg["val_jpy"][done].sum()); total_inv = float(agg["inv_jpy"][done].sum())
+
+    analyzed_data = []
+    for ticker, r in zip(agg.index, agg.to_dict("records")):
+        is_us = r["type"] == "US_STOCK"
+        cur_sym = "$" if is_us else "¥"
+        hist = hists[ticker]['Close'] if not hists[ticker].empty else pd.Series(dtype=float)
+
+        if is_us:
+            html_day = create_badge_f(r["day_chg"], r["day_pct"])
+            html_week = create_badge_f(r["week_chg"], r["week_pct"])
+        else:
+            html_day = create_badge(r["day_chg"], r["day_pct"])
+            html_week = create_badge(r["week_chg"], r["week_pct"])
+        html_pl = create_badge(r["diff_jpy"], r["diff_pct"])
+
+        analyzed_data.append({
+            "ticker": ticker, "name": names[ticker], "type": r["type"],
+            "safe_id": "".join(c for c in ticker if c.isalnum()),
+            "hist": hist, "cur_sym": cur_sym,
+            "disp_price": r["price"], "disp_avg": r["avg_price"],
+            "html_day": html_day, "html_week": html_week, "html_pl": html_pl,
+            "shares": r["shares"], "tx": tx_map[ticker],
+            "val_jpy": r["val_jpy"], "diff_pct": r["diff_pct"], "day_pct": r["day_pct"],
+            "hm_label": f"{names[ticker]}<br>({ticker})", "pending": ticker in pending,
+        })
+    return analyzed_data, total_val, total_inv, hists, usdjpy_rate, agg
+
+# ==========================================
+# 4. 表示
+# ==========================================
+# Removed duplicate header and divider
+# st.sidebar.divider(); st.sidebar.subheader("📌 保有銘柄")
+def render_summary(analyzed_data, page_items, n_matched, total_val, total_inv, rev):
+    """サイドバーの評価額・表示中のページの銘柄一覧とヒートマップ (取得中は届いた分だけで描き直す)"""
+    n_pending = sum(item['pending'] for item in analyzed_data)
+    if total_inv > 0:
+        diff = total_val - total_inv
+        pct = (diff/total_inv*100)
+        label = "💰 ポートフォリオ評価額" + (f" (取得中 {n_pending} 銘柄)" if n_pending else "")
+        # 最上部のプレースホルダーに表示
+        metric_placeholder.metric(label, safe_fmt(total_val, symbol="¥"), f"{diff:,.0f} ({pct:+.2f}%)")
+
+    with sidebar_list.container():
+        if n_matched > len(page_items):
+            st.caption(f"{n_matched:,} 銘柄中 {len(page_items)} 銘柄 (表示中のページ)")
+        for item in page_items:
+            icon = "⏳" if item['pending'] else "🟢" if item['diff_pct']>=0 else "🔴"
+            st.markdown(f"[{icon} {item['name']} <span style='color:gray'>({item['diff_pct']:.1f}%)</span>](#{item['safe_id']})", unsafe_allow_html=True)
+
+    df_viz = pd.DataFrame(analyzed_data)
+    df_viz['diff_pct'] = df_viz['diff_pct'].fillna(0)
+    df_viz['day_pct'] = df_viz['day_pct'].fillna(0)
+    df_viz['val_jpy'] = df_viz['val_jpy'].fillna(0)
+    df_viz = df_viz[(df_viz['val_jpy'] > 0) & ~df_viz['pending']]
+
+    if df_viz.empty:
+        treemap_slot.empty()
+        return
+    with span("treemap", items=len(df_viz)):
+        import plotly.express as px  # 最初の描画を待たせないよう、ヒートマップを描く時に読み込む
+        col = 'diff_pct' if "トータル" in hm_mode else 'day_pct'
+        fig = px.treemap(
+            df_viz, path=['hm_label'], values='val_jpy', color=col,
+            custom_data=[col], color_continuous_scale=['red', 'white', 'green'], color_continuous_midpoint=0
+        )
+        fig.update_layout(margin=dict(t=10, l=0, r=0, b=0), height=300)
+        fig.update_traces(texttemplate="%{label}<br>%{customdata[0]:.2f}%", hovertemplate="<b>%{label}</b><br>評価額: ¥%{value:,.0f}<br>%{customdata[0]:.2f}%")
+        # 同じ再実行の中で描き直すため、描くたびに別のkeyにする
+        treemap_slot.plotly_chart(fig, use_container_width=True, key=f"treemap_{rev}")
+
+def card_signature(item):
+    """カードの表示内容を決める値 (変わったカードだけ描き直す)"""
+    h = item['hist']
+    return (
+        item['name'], item['pending'], item['disp_price'], item['disp_avg'], item['val_jpy'], item['html_pl'],
+        item['html_day'], item['html_week'], len(h), h.index[-1] if len(h) else None,
+    )
+
+def prepare_charts(items):
+    """カードのチャート用に履歴を間引き、画像モードなら未描画分のPNGを描く"""
+    # 日次の履歴から選んだ粒度のビューを作り (メモ化)、表示幅相当の点数に間引く (山・谷・購入日の点は残す)
+    with span("chart_downsample", items=len(items), resolution=chart_res):
+        for item in items:
+            if item['hist'].empty: continue
+            view = history_view(item['ticker'], item['hist'], chart_res)
+            item['chart_pts'] = buy_points(view, item['tx'])
+            item['chart_hist'] = downsample_series(view, keep_dates=[bd for bd, _ in item['chart_pts']])
+
+    # 画像モードは (ticker, 履歴, 取得単価, 購入点, テーマ) 単位でPNGをキャッシュし、未描画分だけプロセスプールで描く
+    if not interactive:
+        chart_jobs = []
+        for item in items:
+            if item['hist'].empty: continue
+            h, pts = item['chart_hist'], item['chart_pts']
+            item['chart_key'] = chart_key(item['ticker'], h, item['disp_avg'], pts, item['cur_sym'])
+            chart_jobs.append((item['chart_key'], (h, item['disp_avg'], pts, item['cur_sym'])))
+        with span("chart_render", jobs=len(chart_jobs)):
+            render_missing(chart_jobs, chart_cache, get_render_pool())
+
+def render_card(item, slot, rev):
+    with slot.container(border=True), span("card", ticker=item['ticker']): # Card Style
+        # 1. Header (Dynamic Sizing for Alignment)
+        name = item['name']
+        # タイトルが長い場合はフォントサイズを小さくし、高さを固定してズレを防ぐ
+        title_style = "font-size:1.1em; line-height:1.4;" if len(name) > 15 else "font-size:1.4em; line-height:1.2;"
+
+        if item['pending']:
+            st.markdown(f"""
+            <div style="margin-bottom:10px; line-height:1.2;">
+                <a href='#{item['safe_id']}' style="text-decoration:none; color:inherit; font-weight:bold; {title_style}">{name}</a>
+                <span style="font-size:0.75em; color:#aaa; margin-left:6px; font-weight:normal;">{item['ticker']}</span>
+            </div>
+            """, unsafe_allow_html=True)
+            st.info("⏳ 取得中...")
+            return
+
+        # Define price strings BEFORE usage in st.markdown
+        if item['cur_sym'] == '$':
+            price_str = safe_fmt(item['disp_price'], ",.2f", "$")
+            avg_str = safe_fmt(item['disp_avg'], ",.2f", "$")
+        else:
+            price_str = safe_fmt(item['disp_price'], ",.0f", "¥")
+            avg_str = safe_fmt(item['disp_avg'], ",.0f", "¥")
+
+        # 投信も日次の履歴を持つので、個別株と同じく前日比・前週比 (7日前基準) を出す
+        metrics_html = f'<span><span style="color:#aaa;">前日比:</span> {item["html_day"]}</span>'
+        metrics_html += f'<span><span style="color:#aaa;">前週比:</span> {item["html_week"]}</span>'
+
+        st.markdown(f"""
+        <div style="margin-bottom:0px; line-height:1.2;">
+            <a href='#{item['safe_id']}' style="text-decoration:none; color:inherit; font-weight:bold; {title_style}">{name}</a>
+            <span style="font-size:0.75em; color:#aaa; margin-left:6px; font-weight:normal;">{item['ticker']}</span>
+        </div>
+
+        <div style="margin-bottom:10px; display:flex; align-items:baseline; flex-wrap:wrap; column-gap:12px;">
+            <div style="font-size:1.4em; font-weight:bold; color:#fff;">
+                {price_str}
+            </div>
+            <div style="font-size:0.85em; display:flex; gap:8px;">
+                {metrics_html}
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+
+        # 3. Holdings Info Box (Dark Mode Background)
+        unit = "口" if item['type']=='JP_FUND' else "株"
+        val_str = safe_fmt(item['val_jpy'], ",.0f", "¥")
+
+        st.markdown(f"""
+        <div style="background-color:rgba(255,255,255,0.05); padding:10px; border-radius:8px; margin-bottom:15px; font-size:0.9em;">
+            <div style="display:flex; justify-content:space-between; margin-bottom:4px;">
+                <span style="color:#bbb;">保有数量</span>
+                <span style="font-weight:500; color:#eee;">{item['shares']:,.0f} {unit}</span>
+            </div>
+            <div style="display:flex; justify-content:space-between; margin-bottom:4px;">
+                <span style="color:#bbb;">取得単価</span>
+                <span style="font-weight:500; color:#eee;">{avg_str}</span>
+            </div>
+            <div style="border-top:1px solid rgba(255,255,255,0.1); margin:4px 0;"></div>
+            <div style="display:flex; justify-content:space-between; align-items:center;">
+                <span style="color:#bbb;">評価額</span>
+                <div>
+                    <span style="font-weight:bold; font-size:1.1em; color:#fff;">{val_str}</span>
+                    <span style="margin-left:5px;">{item['html_pl']}</span>
+                </div>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+
+        with st.expander("詳細履歴", expanded=False):
+            for t in item['tx']:
+                st.caption(f"{t['date']}: {t['shares']:,.0f}{unit} @ {item['cur_sym']}{t['price']:,.0f}")
+
+        # 4. Chart (Dark Theme)
+        hist = item['hist']
+        if not hist.empty and interactive:
+            fig_h = build_history_figure(item['chart_hist'], item['disp_avg'], item['chart_pts'], item['cur_sym'])
+            # 同じ再実行で描き直す時だけ別のkeyにする
+            key = f"chart_{item['safe_id']}" + (f"_{rev}" if rev is not None else "")
+            st.plotly_chart(fig_h, use_container_width=True, key=key)
+        elif not hist.empty:
+            st.image(chart_cache.get(item['chart_key']), use_container_width=True)
+        else:
+            st.info("チャートデータなし")
+
+def page_count(n_matched):
+    return (n_matched - 1) // PAGE_SIZE + 1 if n_matched else 1
+
+def draw(wave, pending, analyzed=None):
+    """集計し直して、合計・ヒートマップと表示中のページで値が変わったカードを描く (progress に描いた内容を記録)"""
+    analyzed = analyzed or analyze(holdings, tickers, types, tx_map, entered_names, wave, pending)
+    analyzed_data, total_val, total_inv = analyzed[:3]
+    by_ticker = {item['ticker']: item for item in analyzed_data}
+    page_tickers, n_matched, _ = page_holdings(
+        analyzed[5], grid["sort_by"], grid["ascending"], grid["types"], grid["pl"], pending, grid["page"]
+    )
+    page_items = [by_ticker[t] for t in page_tickers]
+    render_summary(analyzed_data, page_items, n_matched, total_val, total_inv, progress["rev"])
+
+    # カードは表示位置ごとに描き、銘柄か値が変わった位置だけ描き直す
+    changed = [
+        (i, item) for i, item in enumerate(page_items)
+        if progress["drawn"].get(i) != (item['ticker'], card_signature(item))
+    ]
+    prepare_charts([item for _, item in changed])
+    for i, item in changed:
+        render_card(item, card_slots[i], progress["rev"] if item['ticker'] in progress["seen"] else None)
+        progress["drawn"][i] = (item['ticker'], card_signature(item))
+        progress["seen"].add(item['ticker'])
+    for i in range(len(page_items), len(card_slots)):
+        if progress["drawn"].pop(i, None) is not None: card_slots[i].empty()
+    progress["rev"] += 1
+    progress["last"] = time.perf_counter()
+    return analyzed
+
+st.sidebar.subheader("📌 保有銘柄")
+sidebar_list = st.sidebar.empty()
 
 if not edited_df.empty:
     valid_rows = edited_df.dropna(subset=["銘柄コード"])
-    if not valid_rows.empty:
-        
+    holdings = normalize_holdings(valid_rows)
+    if not holdings.empty:
+
+        tickers = list(dict.fromkeys(holdings["ticker"]))
+        types = {t: get_ticker_type(t) for t in tickers}
+        stock_tickers = [t for t in tickers if types[t] != "JP_FUND"]
+        fund_tickers = [t for t in tickers if types[t] == "JP_FUND"]
+        with_fx = any(types[t] == "US_STOCK" for t in tickers)
+        # 取得結果によらない値は取得前に1回だけ作る (取得中の描き直しでは価格・合計だけ計算し直す)
+        tx_map = transactions_by_ticker(holdings)
+        entered_names = valid_rows.assign(ticker=holdings["ticker"]).groupby("ticker", sort=False)["銘柄名"].first()
+
+        # --- 描く場所を先に作る (取得中はこの中身だけを差し替える) ---
+        notices = st.container()   # 取得失敗・タイムアウトの警告 (取得後に追記)
         status_text = st.empty()
-        pf_map = {}
-        
-        for i, (idx, row) in enumerate(valid_rows.iterrows()):
-            ticker = str(row["銘柄コード"]).strip()
-            if not ticker or ticker=="nan": continue
-            
-            if ticker not in pf_map:
-                data_type = get_ticker_type(ticker)
-                is_us = (data_type == "US_STOCK")
-                is_fund = (data_type == "JP_FUND")
-                
-                name = row["銘柄名"]
-                price = 0.0
-                prev = 0.0
-                
-                hist_df = get_history_smart(ticker, data_type, status_text)
-                
-                if not hist_df.empty:
-                    price = safe_float(hist_df['Close'].iloc[-1])
-                    if len(hist_df) >= 2:
-                        prev = safe_float(hist_df['Close'].iloc[-2])
-                
-                if is_fund and (pd.isna(name) or not name or name == ticker):
-                    name = get_fund_name(ticker)
-                if pd.isna(name) or not name: name = ticker
-
-                pf_map[ticker] = {
-                    "type": data_type, "name": name, "is_us": is_us,
-                    "hist": hist_df, "price": price, "prev": prev, "tx": []
-                }
-
-            if ticker in pf_map:
-                try:
-                    s = safe_float(row["保有株数"])
-                    p = safe_float(row["購入単価"])
-                    d_raw = row["購入日"]
-                    d = pd.to_datetime(d_raw).date() if pd.notna(d_raw) else datetime.now().date()
-                    pf_map[ticker]["tx"].append({"shares":s, "price":p, "date":d})
-                except: continue
-        
-        status_text.empty()
-
-        # --- 集計 ---
-        for ticker, d in pf_map.items():
-            tx = d["tx"]
-            if not tx: continue 
-            
-            total_shares = sum(t["shares"] for t in tx)
-            cost_sum = sum(t["shares"]*t["price"] for t in tx)
-            avg_price = (cost_sum/total_shares) if total_shares>0 else 0
-            
-            curr_price = d["price"]
-            hist = d["hist"]['Close'] if not d["hist"].empty else pd.Series(dtype=float)
-            
-            day_chg=0; day_pct=0; week_chg=0; week_pct=0
-            
-            # 変動計算
-            if curr_price > 0 and d["prev"] > 0:
-                day_chg = curr_price - d["prev"]
-                day_pct = (day_chg / d["prev"] * 100)
-            
-            if not hist.empty and len(hist)>=2:
-                idx = -2 if d["type"] == "JP_FUND" else (-6 if len(hist)>=6 else 0)
-                if len(hist) >= abs(idx):
-                    w = safe_float(hist.iloc[idx])
-                    if w > 0:
-                        week_chg = curr_price - w
-                        week_pct = (week_chg/w*100)
-
-            is_us = d["is_us"]
-            cur_sym = "$" if is_us else "¥"
-            
-            if is_us:
-                val_jpy = (curr_price * usdjpy_rate) * total_shares
-                inv_jpy = cost_sum * usdjpy_rate
+        with st.expander("📊 ポートフォリオ・ヒートマップ", expanded=True):
+            hm_mode = st.radio("hm_mode", ["トータル損益率", "前日比"], horizontal=True, label_visibility="collapsed")
+            treemap_slot = st.empty()
+        # 全銘柄の履歴を日付で揃えて、ポートフォリオ全体の評価額・損益の推移を計算 (取得完了後に1回)
+        timeseries_box = st.expander("📈 評価額の推移", expanded=False)
+
+        st.divider()
+
+        # --- Grid Display (2 Columns) ---
+        def chunked(iterable, n):
+            return [iterable[i:i + n] for i in range(0, len(iterable), n)]
+
+        chart_mode = st.sidebar.radio("チャート表示", ["画像 (高速)", "インタラクティブ"], horizontal=True)
+        interactive = chart_mode == "インタラクティブ"
+        chart_res = {"日次": "D", "週次": "W", "月次": "M"}[st.sidebar.radio("チャート粒度", ["日次", "週次", "月次"], horizontal=True)]
+        chart_cache = get_chart_cache()
+
+        # --- キャッシュ済みのデータで集計 (ページ数を決め、先に描く) ---
+        progress = {"rev": 0, "drawn": {}, "seen": set(), "last": 0.0, "done": 0}
+        with span("cached_wave", tickers=len(tickers)):
+            live = load_cached_wave(fund_tickers, stock_tickers, with_fx=with_fx)
+        finished = set()
+        pending = pending_tickers(tickers, types, live, finished)
+        first = analyze(holdings, tickers, types, tx_map, entered_names, live, pending)
+
+        # --- カードの並び替え・絞り込み (集計表の上で計算し、表示中のページのカードだけ描く) ---
+        g1, g2, g3, g4, g5 = st.columns([3, 1.2, 3, 2, 2], vertical_alignment="bottom")
+        sort_by = GRID_SORTS[g1.selectbox("並び順", list(GRID_SORTS), key="grid_sort")]
+        ascending = g2.toggle("昇順", key="grid_asc", disabled=sort_by is None)
+        grid_types = g3.multiselect(
+            "資産タイプ", [k for k in CACHE_TYPE_LABELS if k in types.values()],
+            format_func=CACHE_TYPE_LABELS.get, key="grid_types"
+        )
+        pl = GRID_PL[g4.selectbox("損益", list(GRID_PL), key="grid_pl")]
+        # ページ数は取得後に変わりうる (取得中の銘柄は損益で絞り込まない) ので、ページ選択は取得後に描く
+        pager = g5.empty()
+        _, n_matched, page = page_holdings(first[5], sort_by, ascending, grid_types, pl, pending,
+                                           st.session_state.get("grid_page", 0))
+        if page_count(n_matched) > 1:
+            pager.caption(f"ページ {page + 1} / {page_count(n_matched)}")
+        grid = {"sort_by": sort_by, "ascending": ascending, "types": grid_types, "pl": pl, "page": page}
+
+        # 表示位置 (最大 PAGE_SIZE) ごとの枠。銘柄数が増えても描く要素の数は変わらない
+        n_slots = min(PAGE_SIZE, sum(1 for t in tickers if not grid_types or types[t] in grid_types))
+        card_slots = []
+        for row in chunked(range(n_slots), 2):
+            cols = st.columns(2)
+            for _, col in zip(row, cols):
+                card_slots.append(col.empty())
+
+        draw(live, pending, first)
+
+        # --- 投信ページ (名前・基準価額・履歴)、株価一括、為替を1つのイベントループで同時に取得し、届いた分から描き直す ---
+        n_jobs = len(fund_tickers) + bool(stock_tickers or with_fx) + with_fx   # 投信ごと・株価一括・為替
+        status_text.text(f"⏳ {len(tickers)} 銘柄を取得中...")
+
+        def on_result(kind, key, value):
+            if kind == "fund":
+                live["funds"][key] = value
+                finished.add(key)
+            elif kind == "stocks":
+                histories, failures = value
+                live["stocks"] = ({**live["stocks"][0], **histories}, failures)
+                finished.update(stock_tickers)
             else:
-                if d["type"] == "JP_FUND":
-                    val_jpy = (curr_price / 10000) * total_shares
-                    inv_jpy = (cost_sum / 10000)
-                else:
-                    val_jpy = curr_price * total_shares
-                    inv_jpy = cost_sum
-
-            diff_jpy = val_jpy - inv_jpy
-            diff_pct = (diff_jpy/inv_jpy*100) if inv_jpy>0 else 0.0
-            
-            total_val += val_jpy; total_inv += inv_jpy
-            
-            if is_us:
-                html_day = create_badge_f(day_chg, day_pct)
-                html_week = create_badge_f(week_chg, week_pct)
+                live[kind] = value
+            progress["done"] += 1
+            status_text.text(f"⏳ 取得中... {progress['done']}/{n_jobs}" + (f" ({key})" if key else ""))
+            if time.perf_counter() - progress["last"] >= PROGRESS_INTERVAL:
+                draw(live, pending_tickers(tickers, types, live, finished))
+
+        wave = fetch_all(fund_tickers, stock_tickers, with_fx=with_fx, defer_fx=True, on_result=on_result)
+        _, stock_failures = wave["stocks"]   # 締め切りに間に合わなかった株価はキャッシュで代替済み
+        status_text.empty()
+        with notices:
+            if stock_failures:
+                st.warning("株価取得失敗: " + ", ".join(f"{t} ({r})" for t, r in stock_failures.items()))
+            if wave["timed_out"]:
+                st.warning("タイムアウト (キャッシュを表示): " + ", ".join(wave["timed_out"]))
+            if open_circuits():
+                st.warning("応答エラーが続いているため一時停止中 (キャッシュを表示): " + ", ".join(open_circuits()))
+
+        final = analyze(holdings, tickers, types, tx_map, entered_names, wave, set())
+        _, n_matched, _ = page_holdings(final[5], sort_by, ascending, grid_types, pl)
+        n_pages = page_count(n_matched)
+        grid["page"] = 0
+        pager.empty()
+        if n_pages > 1:
+            # 件数が減って範囲外になったページは最後のページに寄せる (ウィジェットを描く前に直す)
+            if st.session_state.get("grid_page", 0) >= n_pages: st.session_state["grid_page"] = n_pages - 1
+            grid["page"] = pager.selectbox("ページ", range(n_pages), format_func=lambda p: f"{p + 1} / {n_pages}", key="grid_page")
+        analyzed_data, total_val, total_inv, hists, usdjpy_rate, _ = draw(wave, set(), final)
+        fx_hist = wave["fx_history"]
+
+        with timeseries_box:
+            with span("timeseries", tickers=len(analyzed_data)):
+                ts = portfolio_timeseries(holdings, hists, fx_hist if fx_hist is not None else usdjpy_rate)
+            if ts.empty:
+                st.info("履歴データなし")
             else:
-                html_day = create_badge(day_chg, day_pct)
-                html_week = create_badge(week_chg, week_pct)
-            html_pl = create_badge(diff_jpy, diff_pct)
-
-            analyzed_data.append({
-                "ticker": ticker, "name": d["name"], "type": d["type"],
-                "safe_id": "".join(c for c in ticker if c.isalnum()),
-                "hist": hist, "cur_sym": cur_sym, 
-                "disp_price": curr_price, "disp_avg": avg_price,
-                "html_day": html_day, "html_week": html_week, "html_pl": html_pl,
-                "shares": total_shares, "tx": tx,
-                "val_jpy": val_jpy, "diff_pct": diff_pct, "day_pct": day_pct,
-                "hm_label": f"{d['name']}<br>({ticker})"
-            })
+                last = ts.iloc[-1]
+                st.caption(f"{ts.index[0]:%Y-%m-%d} 〜 {ts.index[-1]:%Y-%m-%d}　損益 ¥{last['pl']:,.0f} ({last['pl_pct']:+.2f}%)")
+                ts_chart = ts.loc[downsample_series(ts["value"]).index]
+                st.plotly_chart(build_portfolio_figure(ts_chart), use_container_width=True)
 
 # ==========================================
-# 4. 表示
+# 5. デバッグ (処理時間)
 # ==========================================
-# Removed duplicate header and divider
-# st.sidebar.divider(); st.sidebar.subheader("📌 保有銘柄")
-if total_inv > 0:
-    diff = total_val - total_inv
-    pct = (diff/total_inv*100)
-    # 最上部のプレースホルダーに表示
-    metric_placeholder.metric("💰 ポートフォリオ評価額", safe_fmt(total_val, symbol="¥"), f"{diff:,.0f} ({pct:+.2f}%)")
-
-st.sidebar.subheader("📌 保有銘柄")
-for item in analyzed_data:
-    icon = "🟢" if item['diff_pct']>=0 else "🔴"
-    st.sidebar.markdown(f"[{icon} {item['name']} <span style='color:gray'>({item['diff_pct']:.1f}%)</span>](#{item['safe_id']})", unsafe_allow_html=True)
-
-if analyzed_data:
-    with st.expander("📊 ポートフォリオ・ヒートマップ", expanded=True):
-        mode = st.radio("hm_mode", ["トータル損益率", "前日比(投信は前週)"], horizontal=True, label_visibility="collapsed")
-        df_viz = pd.DataFrame(analyzed_data)
-        df_viz['diff_pct'] = df_viz['diff_pct'].fillna(0)
-        df_viz['day_pct'] = df_viz['day_pct'].fillna(0)
-        df_viz['val_jpy'] = df_viz['val_jpy'].fillna(0)
-        df_viz = df_viz[df_viz['val_jpy'] > 0]
-        
-        if not df_viz.empty:
-            col = 'diff_pct' if "トータル" in mode else 'day_pct'
-            fig = px.treemap(
-                df_viz, path=['hm_label'], values='val_jpy', color=col,
-                custom_data=[col], color_continuous_scale=['red', 'white', 'green'], color_continuous_midpoint=0
-            )
-            fig.update_layout(margin=dict(t=10, l=0, r=0, b=0), height=300)
-            fig.update_traces(texttemplate="%{label}<br>%{customdata[0]:.2f}%", hovertemplate="<b>%{label}</b><br>評価額: ¥%{value:,.0f}<br>%{customdata[0]:.2f}%")
-            st.plotly_chart(fig, use_container_width=True)
-    
-    st.divider()
-
-    # --- Grid Display (2 Columns) ---
-    def chunked(iterable, n):
-        return [iterable[i:i + n] for i in range(0, len(iterable), n)]
-
-    for row_items in chunked(analyzed_data, 2):
-        cols = st.columns(2)
-        for item, col in zip(row_items, cols):
-            with col:
-                with st.container(border=True): # Card Style
-                    # 1. Header (Dynamic Sizing for Alignment)
-                    name = item['name']
-                    # タイトルが長い場合はフォントサイズを小さくし、高さを固定してズレを防ぐ
-                    title_style = "font-size:1.1em; line-height:1.4;" if len(name) > 15 else "font-size:1.4em; line-height:1.2;"
-
-                    # Define price strings BEFORE usage in st.markdown
-                    if item['cur_sym'] == '$':
-                        price_str = safe_fmt(item['disp_price'], ",.2f", "$")
-                        avg_str = safe_fmt(item['disp_avg'], ",.2f", "$")
-                    else:
-                        price_str = safe_fmt(item['disp_price'], ",.0f", "¥")
-                        avg_str = safe_fmt(item['disp_avg'], ",.0f", "¥")
-
-                    if item['type'] == 'JP_FUND':
-                        lbl_primary = "前週比"
-                        show_secondary = False
-                    else:
-                        lbl_primary = "前日比"
-                        lbl_secondary = "前週比"
-                        show_secondary = True
-                    
-                    metrics_html = f'<span><span style="color:#aaa;">{lbl_primary}:</span> {item["html_day"]}</span>'
-                    if show_secondary:
-                        metrics_html += f'<span><span style="color:#aaa;">{lbl_secondary}:</span> {item["html_week"]}</span>'
-
-                    st.markdown(f"""
-                    <div style="margin-bottom:0px; line-height:1.2;">
-                        <a href='#{item['safe_id']}' style="text-decoration:none; color:inherit; font-weight:bold; {title_style}">{name}</a>
-                        <span style="font-size:0.75em; color:#aaa; margin-left:6px; font-weight:normal;">{item['ticker']}</span>
-                    </div>
-
-                    <div style="margin-bottom:10px; display:flex; align-items:baseline; flex-wrap:wrap; column-gap:12px;">
-                        <div style="font-size:1.4em; font-weight:bold; color:#fff;">
-                            {price_str}
-                        </div>
-                        <div style="font-size:0.85em; display:flex; gap:8px;">
-                            {metrics_html}
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                    # 3. Holdings Info Box (Dark Mode Background)
-                    unit = "口" if item['type']=='JP_FUND' else "株"
-                    val_str = safe_fmt(item['val_jpy'], ",.0f", "¥")
-                    
-                    st.markdown(f"""
-                    <div style="background-color:rgba(255,255,255,0.05); padding:10px; border-radius:8px; margin-bottom:15px; font-size:0.9em;">
-                        <div style="display:flex; justify-content:space-between; margin-bottom:4px;">
-                            <span style="color:#bbb;">保有数量</span>
-                            <span style="font-weight:500; color:#eee;">{item['shares']:,.0f} {unit}</span>
-                        </div>
-                        <div style="display:flex; justify-content:space-between; margin-bottom:4px;">
-                            <span style="color:#bbb;">取得単価</span>
-                            <span style="font-weight:500; color:#eee;">{avg_str}</span>
-                        </div>
-                        <div style="border-top:1px solid rgba(255,255,255,0.1); margin:4px 0;"></div>
-                        <div style="display:flex; justify-content:space-between; align-items:center;">
-                            <span style="color:#bbb;">評価額</span>
-                            <div>
-                                <span style="font-weight:bold; font-size:1.1em; color:#fff;">{val_str}</span>
-                                <span style="margin-left:5px;">{item['html_pl']}</span>
-                            </div>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    with st.expander("詳細履歴", expanded=False):
-                        for t in item['tx']:
-                            st.caption(f"{t['date']}: {t['shares']:,.0f}{unit} @ {item['cur_sym']}{t['price']:,.0f}")
-
-                    # 4. Chart (Dark Theme)
-                    hist = item['hist']
-                    if not hist.empty:
-                        # Use dark_background context
-                        with plt.style.context('dark_background'):
-                            fig, ax = plt.subplots(figsize=(6, 3))
-                            
-                            # Background transparent/match streamlits dark
-                            bg_color = '#0e1117'
-                            fig.patch.set_facecolor(bg_color)
-                            ax.set_facecolor(bg_color)
-                            
-                            if len(hist) == 1:
-                                ax.plot(hist.index, hist, color='#dddddd', marker='o', linestyle='None', label='Price')
-                            else:
-                                ax.plot(hist.index, hist, color='#dddddd', lw=1.2, label='Price')
-                            
-                            ax.axhline(y=item['disp_avg'], color='red', ls='--', alpha=0.6, label='Avg')
-                            
-                            total_days = (hist.index[-1] - hist.index[0]).days
-                            if total_days < 90:
-                                ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-                                if total_days == 0:
-                                    ax.set_xlim(hist.index[0] - timedelta(days=1), hist.index[0] + timedelta(days=1))
-                            else:
-                                ax.xaxis.set_major_formatter(mdates.DateFormatter('%y/%m'))
-                            
-                            # Plot Buy Points
-                            for t in item['tx']:
-                                bd = pd.Timestamp(t['date'])
-                                if bd >= hist.index[0] and bd <= hist.index[-1]:
-                                    ax.scatter([bd], [t['price']], color='#ff4b4b', s=30, zorder=5, alpha=0.9)
-                            
-                            ax.legend(fontsize=7, loc='upper left', frameon=False, labelcolor='white')
-                            ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f"{item['cur_sym']}{x:,.0f}"))
-                            ax.grid(True, ls=':', alpha=0.2, color='white')
-                            ax.tick_params(labelsize=8, colors='white')
-                            for spine in ax.spines.values():
-                                spine.set_edgecolor('#444')
-
-                            st.pyplot(fig, use_container_width=True)
-                    else:
-                        st.info("チャートデータなし")
\ No newline at end of file
+end_trace(trace)
+if st.sidebar.toggle("🔧 処理時間", key="debug_trace"):
+    recs = trace.records()
+    st.sidebar.caption(f"再実行 合計 {trace.duration_ms:,.0f} ms / スパン {len(recs)} 件")
+    if recs:
+        df_tr = pd.DataFrame(recs)
+        summary = (
+            df_tr.groupby("span")["ms"].agg(["count", "sum", "max"])
+            .sort_values("sum", ascending=False).round(1)
+        )
+        st.sidebar.dataframe(summary, use_container_width=True)
+        with st.sidebar.expander("スパン一覧"):
+            df_tr["name"] = ["　" * d + n for d, n in zip(df_tr["depth"], df_tr["span"])]
+            df_tr["detail"] = [", ".join(f"{k}={v}" for k, v in a.items()) for a in df_tr["attrs"]]
+            st.dataframe(df_tr[["name", "start_ms", "ms", "detail", "thread"]].round(1), hide_index=True, use_container_width=True)
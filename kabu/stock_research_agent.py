@@ -3,6 +3,7 @@ import yfinance as yf
 import pandas as pd
 import google.generativeai as genai
 from datetime import datetime
+from core.portfolio_store import append_transactions
 
 # --- Configuration ---
 # You need to set your Gemini API Key here or in environment variables
@@ -197,26 +198,23 @@ def main():
     # Limit to top 5 if more
     final_selection = verified_stocks[:5]
     
-    # Append to CSV
-    csv_path = "portfolio_sub.csv"
+    # Append to portfolio store (仮想保有株式)
     current_date = datetime.now().strftime("%Y-%m-%d")
     shares_default = 100 # Default unit
     
     new_rows = []
     for s in final_selection:
         # Format: 銘柄コード,銘柄名,購入日,保有株数,購入単価
-        row = f"{s['code']},{s['name']},{current_date},{shares_default},{s['price']}"
+        row = (s['code'], s['name'], current_date, shares_default, s['price'])
         new_rows.append(row)
         print(f"Adding: {row}")
 
     if new_rows:
         try:
-            with open(csv_path, "a", encoding="utf-8") as f:
-                for row in new_rows:
-                    f.write(row + "\n")
-            print(f"\nSuccessfully appended {len(new_rows)} stocks to {csv_path}")
+            n = append_transactions("sub", new_rows)
+            print(f"\nSuccessfully appended {n} stocks to portfolio 'sub'")
         except Exception as e:
-            print(f"Error writing to CSV: {e}")
+            print(f"Error writing to portfolio store: {e}")
             
     print("=== Task Completed ===")
 
@@ -0,0 +1,33 @@
+"""
+core/ の単体テスト (ネットワーク不要)。kabu/ で `python -m pytest -q` で実行する。
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_history(n=30, start="2024-01-01", base=100.0):
+    """終値が base, base+1, ... の日次履歴"""
+    idx = pd.date_range(start, periods=n, freq="D", name="Date")
+    return pd.DataFrame({"Close": base + np.arange(n, dtype=float)}, index=idx)
+
+@pytest.fixture
+def cache_store(tmp_path, monkeypatch):
+    """core.cache の保存先を tmp_path のローカルストアに差し替える (ヒット・ミスの集計も0から)"""
+    from core import cache
+    from core.price_store import PriceStore
+    store = PriceStore(str(tmp_path / "prices.arrow"), cache.CACHE_MAX_BYTES, cache.CACHE_MAX_ENTRIES)
+    monkeypatch.setattr(cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(cache, "_store", store)
+    monkeypatch.setattr(cache, "_stats", {"hits": 0, "misses": 0})
+    return store
+
+@pytest.fixture
+def fresh_guards(monkeypatch):
+    """ホストごとのレート制限・ブレーカーをテストごとに作り直す"""
+    from core import throttle
+    monkeypatch.setattr(throttle, "_guards", {})
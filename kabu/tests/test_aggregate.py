@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from conftest import make_history
+from core.aggregate import (
+    _to_num, aggregate_portfolio, build_price_table, classify_tickers, normalize_holdings, page_holdings,
+    transactions_by_ticker,
+)
+from core.utils import safe_float
+
+def _rows():
+    return pd.DataFrame({
+        "銘柄コード": ["7203.T", "AAPL", "7203.T", " ", "01314184"],
+        "保有株数": [100, "1,000", 50, 1, "10000"],
+        "購入単価": [2000, 150.5, "2,100円", 1, 15000],
+        "購入日": ["2024-01-04", "2024-02-01", "2024-03-01", None, "2024-01-10"],
+    })
+
+def test_transactions_by_ticker_matches_groupby():
+    h = normalize_holdings(_rows())
+    expected = {
+        t: g[["shares", "price", "date"]].to_dict("records")
+        for t, g in h.groupby("ticker", sort=False)
+    }
+    assert transactions_by_ticker(h) == expected
+    assert list(transactions_by_ticker(h)) == ["7203.T", "AAPL", "01314184"]
+
+def test_normalize_holdings():
+    h = normalize_holdings(_rows())
+    assert h["ticker"].tolist() == ["7203.T", "AAPL", "7203.T", "01314184"]
+    assert h["shares"].tolist() == [100.0, 1000.0, 50.0, 10000.0]
+    assert h["price"].tolist() == [2000.0, 150.5, 2100.0, 15000.0]
+    assert classify_tickers(h["ticker"]).tolist() == ["JP_STOCK", "US_STOCK", "JP_STOCK", "JP_FUND"]
+
+def test_to_num_matches_safe_float():
+    values = ["1,234", "1.5%", "2,100円", " 3 ", "", "-", "---", "N/A", "abc", None, float("nan"), 7, 2.5]
+    assert _to_num(pd.Series(values, dtype=object)).tolist() == [safe_float(v) for v in values]
+    assert _to_num(pd.Series([1, 2])).tolist() == [1.0, 2.0]
+
+def test_build_price_table():
+    daily = make_history(30, start="2024-01-01")            # 1/1..1/30 に 100..129
+    weekly = pd.DataFrame({"Close": [100.0, 101.0, 102.0, 103.0]},
+                          index=pd.date_range("2024-01-05", periods=4, freq="7D"))  # 金曜ごと
+    prices = build_price_table({"D": daily, "W": weekly, "ONE": make_history(1), "NONE": pd.DataFrame()})
+    assert prices.loc["D"].tolist() == [129.0, 128.0, 122.0]   # 前週参照は 1/23
+    assert prices.loc["W"].tolist() == [103.0, 102.0, 102.0]
+    assert prices.loc["ONE"].tolist() == [100.0, 0.0, 0.0]
+    assert prices.loc["NONE"].tolist() == [0.0, 0.0, 0.0]
+
+def _agg():
+    h = normalize_holdings(_rows())
+    prices = pd.DataFrame(
+        {"price": [2500.0, 200.0, 16000.0], "prev": [2400.0, 0.0, 15000.0], "week_ref": [2000.0, 180.0, 0.0]},
+        index=["7203.T", "AAPL", "01314184"],
+    )
+    return aggregate_portfolio(h, prices, usdjpy_rate=150.0)
+
+def test_aggregate_portfolio():
+    agg = _agg()
+    assert list(agg.index) == ["7203.T", "AAPL", "01314184"]
+    toyota, aapl, fund = agg.loc["7203.T"], agg.loc["AAPL"], agg.loc["01314184"]
+    assert toyota["shares"] == 150 and toyota["avg_price"] == pytest.approx(305000 / 150)
+    assert toyota["val_jpy"] == 375000 and toyota["diff_jpy"] == 70000
+    assert toyota["day_pct"] == pytest.approx(100 / 24) and toyota["week_chg"] == 500
+    # 米国株は USD/JPY を掛ける。前日値が無ければ前日比は 0
+    assert aapl["val_jpy"] == 200 * 1000 * 150 and aapl["inv_jpy"] == 150.5 * 1000 * 150
+    assert aapl["day_chg"] == 0 and aapl["week_pct"] == pytest.approx(20 / 180 * 100)
+    # 投信は1万口あたり
+    assert fund["val_jpy"] == 16000 and fund["inv_jpy"] == 15000
+    assert aggregate_portfolio(normalize_holdings(_rows().iloc[:0]), pd.DataFrame(), 150.0).empty
+
+def test_page_holdings_sort_filter_pending():
+    agg = _agg()   # diff_jpy: 7203.T +70000 / AAPL +7,425,000 / 01314184 +1000
+    assert page_holdings(agg)[0] == ["7203.T", "AAPL", "01314184"]
+    assert page_holdings(agg, "pl")[0] == ["AAPL", "7203.T", "01314184"]
+    assert page_holdings(agg, "pl", ascending=True)[0] == ["01314184", "7203.T", "AAPL"]
+    assert page_holdings(agg, asset_types=["JP_STOCK", "JP_FUND"])[:2] == (["7203.T", "01314184"], 2)
+    assert page_holdings(agg, pl="loss")[:2] == ([], 0)
+    # 取得中の銘柄は損益で絞り込まず末尾に置く
+    assert page_holdings(agg, "pl", pl="loss", pending=["AAPL"])[0] == ["AAPL"]
+    assert page_holdings(agg, "pl", pending=["AAPL"])[0] == ["7203.T", "01314184", "AAPL"]
+
+def test_page_holdings_pages():
+    agg = pd.DataFrame({"type": "JP_STOCK", "diff_jpy": 0.0}, index=[f"{i:04d}.T" for i in range(45)])
+    tickers, n, page = page_holdings(agg, page=2, page_size=20)
+    assert (tickers[0], len(tickers), n, page) == ("0040.T", 5, 45, 2)
+    assert page_holdings(agg, page=9, page_size=20)[2] == 2    # 範囲外は最後のページ
+    assert page_holdings(agg, page=-1, page_size=20)[2] == 0
+    assert page_holdings(agg.iloc[:0], page=3) == ([], 0, 0)
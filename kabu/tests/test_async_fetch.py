@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+import pandas as pd
+import pytest
+
+from conftest import make_history
+from core import async_fetch
+from core.async_fetch import fetch_all, load_cached_wave, run_steps_async
+from core.cache import save_cached_history, save_fund_snapshot
+
+def _snap(code, name):
+    return {"code": code, "name": name, "nav": 10000.0, "nav_date": pd.Timestamp("2024-01-30"), "history": make_history()}
+
+@pytest.fixture
+def fake_sources(monkeypatch, cache_store):
+    """投信 "FAST" はすぐ届き、"SLOW" と株価一括は締め切りまで返らない取得関数に差し替える"""
+    release = threading.Event()
+    async def fetch_fund(code, session):
+        if code == "SLOW": await asyncio.sleep(30)
+        return _snap(code, "届いた")
+    def histories_batch(tickers):
+        release.wait(30)
+        return {t: make_history(base=1.0) for t in tickers}, {}
+    monkeypatch.setattr(async_fetch, "_fetch_fund", fetch_fund)
+    monkeypatch.setattr(async_fetch, "get_histories_batch", histories_batch)
+    monkeypatch.setattr(async_fetch, "get_usdjpy_rate_deferred", lambda: 150.0)
+    yield
+    release.set()
+
+def test_partial_wave_falls_back_to_cache(fake_sources):
+    save_cached_history("7203.T", make_history())
+    save_fund_snapshot(_snap("SLOW", "キャッシュ"))
+    calls = []
+    wave = fetch_all(["FAST", "SLOW"], ["7203.T", "AAPL"], defer_fx=True, timeout=0.5,
+                     on_result=lambda kind, key, value: calls.append((kind, key)))
+    assert sorted(calls) == [("fund", "FAST"), ("fx", None)]
+    assert sorted(wave["timed_out"]) == ["SLOW", "stocks"]
+    assert wave["funds"]["FAST"]["name"] == "届いた" and wave["funds"]["SLOW"]["name"] == "キャッシュ"
+    histories, failures = wave["stocks"]
+    # キャッシュのある銘柄は表示でき、まだ取れていない銘柄だけが "timeout"
+    assert list(histories) == ["7203.T"] and histories["7203.T"]["Close"].iloc[0] == 100.0
+    assert failures == {"AAPL": "timeout"}
+    assert wave["fx"] == 150.0 and wave["fx_history"] is None
+
+def test_load_cached_wave_has_fetch_all_shape(cache_store):
+    save_cached_history("7203.T", make_history())
+    save_cached_history("USDJPY=X", make_history(base=150.0))
+    save_fund_snapshot(_snap("01314184", "ファンド"))
+    wave = load_cached_wave(["01314184", "MISSING"], ["7203.T", "AAPL"])
+    assert list(wave["funds"]) == ["01314184"]
+    assert list(wave["stocks"][0]) == ["7203.T"] and wave["stocks"][1] == {}
+    assert wave["fx_history"].iloc[0] == 150.0 and wave["timed_out"] == []
+
+def test_run_steps_async_advances_off_the_loop(monkeypatch):
+    async def get_text(session, url):
+        return 200, url.upper()
+    monkeypatch.setattr(async_fetch, "_get_text", get_text)
+    threads = []
+    def steps():
+        threads.append(threading.get_ident())
+        a = yield "a"
+        threads.append(threading.get_ident())
+        b = yield "b"
+        return a, b
+    async def run():
+        return threading.get_ident(), await run_steps_async(steps(), None)
+    loop_thread, value = asyncio.run(run())
+    assert value == ((200, "A"), (200, "B"))
+    assert loop_thread not in threads
@@ -0,0 +1,51 @@
+import os
+from datetime import datetime, timezone
+
+from conftest import make_history
+from core.cache import (
+    cache_path, cache_stats, invalidate, load_cached_histories, load_fx_rate, save_cached_history, save_fx_rate,
+)
+
+def _fill():
+    for t in ("7203.T", "6758.T", "AAPL", "01314184"):
+        save_cached_history(t, make_history())
+    save_fx_rate(150.0, datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+def test_invalidate_by_ticker_removes_legacy_files(cache_store):
+    _fill()
+    legacy = cache_path("AAPL")
+    make_history().to_csv(legacy)
+    assert invalidate(tickers=["AAPL"]) == ["AAPL"]
+    assert sorted(cache_store.meta()) == ["01314184", "6758.T", "7203.T"]
+    # 旧形式のCSVも消えるので、次の読み込みで取り込み直されない
+    assert not os.path.exists(legacy)
+    assert load_cached_histories(["AAPL"])["AAPL"][1] is None
+
+def test_invalidate_by_asset_type(cache_store):
+    _fill()
+    assert sorted(invalidate(asset_types=["JP_STOCK"])) == ["6758.T", "7203.T"]
+    assert sorted(cache_store.meta()) == ["01314184", "AAPL"]
+    assert load_fx_rate()[0] == 150.0
+    assert invalidate(asset_types=["FX"]) == ["USDJPY"]
+    assert load_fx_rate() == (None, None)
+    assert sorted(cache_store.meta()) == ["01314184", "AAPL"]
+
+def test_cache_stats_hits_misses_and_breakdown(cache_store):
+    _fill()
+    load_cached_histories(["7203.T", "AAPL", "MISSING"])
+    stats = cache_stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == 2 / 3
+    assert stats["entries"] == 4
+    assert {k: n for k, (n, _) in stats["by_type"].items()} == {"JP_STOCK": 2, "US_STOCK": 1, "JP_FUND": 1}
+    assert stats["bytes"] == sum(b for _, b in stats["by_type"].values()) > 0
+
+def test_cache_stats_counts_lru_evictions(cache_store):
+    cache_store.max_entries = 2
+    save_cached_history("A", make_history())
+    save_cached_history("B", make_history())
+    load_cached_histories(["A"])          # B が最も古い
+    save_cached_history("C", make_history())
+    stats = cache_stats()
+    assert sorted(cache_store.meta()) == ["A", "C"]
+    assert (stats["entries"], stats["max_entries"], stats["evictions"]) == (2, 2, 1)
@@ -0,0 +1,88 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from conftest import make_history
+from core.cache_backend import RedisBackend, SQLiteBackend
+from core.resp import MemoryServer, RespClient, serve
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture(scope="module")
+def resp_port():
+    """core.resp の代用サーバーを別スレッドのイベントループで起動する"""
+    port = _free_port()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(serve("127.0.0.1", port, MemoryServer()), loop)
+    for _ in range(100):
+        try:
+            RespClient("127.0.0.1", port).execute("PING")
+            break
+        except OSError:
+            time.sleep(0.05)
+    yield port
+    server.cancel()
+    loop.call_soon_threadsafe(loop.stop)
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_backend(request, tmp_path):
+    """同じ保存先を共有するバックエンド (= 別レプリカ) を作る関数"""
+    if request.param == "sqlite":
+        return lambda **kw: SQLiteBackend(str(tmp_path / "cache.db"), **kw)
+    port = request.getfixturevalue("resp_port")
+    RespClient("127.0.0.1", port).execute("FLUSHDB")
+    return lambda **kw: RedisBackend(RespClient("127.0.0.1", port), **kw)
+
+def test_put_get_delete(make_backend):
+    store = make_backend()
+    store.put("7203.T", make_history(), source="test", name="トヨタ")
+    df, meta = make_backend().get("7203.T")
+    assert df["Close"].tolist() == make_history()["Close"].tolist()
+    assert meta["source"] == "test" and meta["name"] == "トヨタ"
+    assert store.delete(["7203.T", "missing"]) == ["7203.T"]
+    df, meta = make_backend().get("7203.T")
+    assert df.empty and meta is None
+
+def test_lru_cap(make_backend):
+    store = make_backend(max_entries=2)
+    store.put("A", make_history(), source="test")
+    store.put("B", make_history(), source="test")
+    store.get("A")
+    store.put("C", make_history(), source="test")
+    assert sorted(make_backend().meta()) == ["A", "C"]
+    assert store.evictions == 1
+
+def test_lease_exclusive_reentrant_and_released(make_backend):
+    a, b = make_backend(), make_backend()
+    assert a.lease("fund:X", 60)
+    assert not b.lease("fund:X", 60)
+    assert a.lease("fund:X", 60)      # 持ち主は取り直せる
+    b.release("fund:X")               # 持ち主以外は返せない
+    assert not b.lease("fund:X", 60)
+    a.release("fund:X")
+    assert b.lease("fund:X", 60)
+
+def test_lease_released_after_batch_write(make_backend):
+    a, b = make_backend(), make_backend()
+    with a.batch():
+        assert a.lease("history:A", 60)
+        a.put("A", make_history(), source="test")
+        a.release("history:A")
+        assert not b.lease("history:A", 60)
+    assert "A" in b.meta()
+    assert b.lease("history:A", 60)
+
+def test_lease_expires(make_backend):
+    a, b = make_backend(), make_backend()
+    assert a.lease("fx:USDJPY", 0.05)
+    time.sleep(0.1)
+    assert b.lease("fx:USDJPY", 60)
+    a.release("fx:USDJPY")            # 期限切れ後に取り直された lease は消さない
+    assert not a.lease("fx:USDJPY", 60)
@@ -0,0 +1,17 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+def test_import_has_no_side_effects(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    import cache_warmer  # noqa: F401
+    assert os.getcwd() == str(tmp_path)
+
+def test_next_run_after_publication():
+    from cache_warmer import WARM_DELAY, next_run
+    jst = timezone(timedelta(hours=9))
+    # 金曜 15:00 JST -> 東証の引け後 16:00 + WARM_DELAY
+    assert next_run(datetime(2024, 3, 1, 15, 0, tzinfo=jst)) == datetime(2024, 3, 1, 16, 0, tzinfo=jst) + WARM_DELAY
+    # 公表直後 (WARM_DELAY 以内) に呼ばれたらその回
+    assert next_run(datetime(2024, 3, 1, 16, 5, tzinfo=jst)) == datetime(2024, 3, 1, 16, 0, tzinfo=jst) + WARM_DELAY
+    # 投信の 20時の後は NYSE の引け (16:30 ET = 06:30 JST 翌日)
+    assert next_run(datetime(2024, 3, 1, 21, 0, tzinfo=jst)) == datetime(2024, 3, 2, 6, 30, tzinfo=jst) + WARM_DELAY
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from core.downsample import downsample_series, lttb_indices
+
+def _walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 + rng.normal(0, 1, n).cumsum(), index=pd.date_range("2020-01-01", periods=n, name="Date"))
+
+def test_lttb_indices():
+    s = _walk(1000)
+    idx = lttb_indices(s.index.asi8, s.to_numpy(), 100)
+    assert len(idx) == 100 and idx[0] == 0 and idx[-1] == 999
+    assert (np.diff(idx) > 0).all()
+    assert lttb_indices(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+    assert lttb_indices(np.arange(10), np.arange(10), 2).tolist() == list(range(10))
+
+def test_lttb_keeps_spike():
+    y = np.zeros(1000)
+    y[500] = 50.0
+    assert 500 in lttb_indices(np.arange(1000), y, 50)
+
+def test_downsample_series_keeps_extremes_and_dates():
+    s = _walk(2000, seed=1)
+    keep = [pd.Timestamp("2021-03-03"), pd.Timestamp("2019-01-01")]
+    out = downsample_series(s, n_out=200, keep_dates=keep)
+    assert len(out) <= 200 + 3
+    assert s.idxmax() in out.index and s.idxmin() in out.index
+    assert pd.Timestamp("2021-03-03") in out.index
+    assert out.index.is_monotonic_increasing
+    short = _walk(50)
+    assert downsample_series(short, n_out=200).equals(short)
@@ -0,0 +1,69 @@
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.fetch import _download_closes, get_histories_batch
+
+DATES = pd.date_range("2024-03-01", periods=5, freq="B", tz="America/New_York")
+
+def _frame(closes):
+    return pd.DataFrame({"Open": closes, "Close": closes}, index=DATES)
+
+def _multi(frames):
+    """group_by="ticker" の yf.download と同じ (ticker, 列) の MultiIndex"""
+    return pd.concat(frames, axis=1)
+
+@pytest.fixture
+def yf_download(monkeypatch, fresh_guards):
+    """yf.download を差し替え、呼び出しの (tickers, kwargs) を記録する"""
+    calls = []
+    def install(result):
+        def download(tickers, **kwargs):
+            calls.append((list(tickers), kwargs))
+            if isinstance(result, Exception): raise result
+            return result(tickers) if callable(result) else result
+        monkeypatch.setitem(sys.modules, "yfinance", types.SimpleNamespace(download=download))
+        return calls
+    return install
+
+def test_split_multiindex_per_ticker(yf_download):
+    raw = _multi({
+        "7203.T": _frame([1.0, 2.0, 3.0, 4.0, 5.0]),
+        "AAPL": _frame([10.0, np.nan, 12.0, np.nan, 14.0]),   # 休場日は銘柄単位で落とす
+        "DEAD": _frame([np.nan] * 5),
+    })
+    calls = yf_download(raw)
+    histories, failures = _download_closes(["7203.T", "AAPL", "DEAD", "MISSING"], period="2y")
+    assert calls == [(["7203.T", "AAPL", "DEAD", "MISSING"], {
+        "group_by": "ticker", "auto_adjust": True, "threads": True, "progress": False, "period": "2y",
+    })]
+    assert sorted(histories) == ["7203.T", "AAPL"]
+    assert histories["7203.T"]["Close"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert list(histories["7203.T"].columns) == ["Close"] and histories["7203.T"].index.tz is None
+    assert histories["AAPL"]["Close"].tolist() == [10.0, 12.0, 14.0]
+    assert failures == {"DEAD": "empty history", "MISSING": "ticker missing in response"}
+
+def test_single_ticker_flat_frame(yf_download):
+    yf_download(_frame([1.0, 2.0, 3.0, 4.0, 5.0]))
+    histories, failures = _download_closes(["7203.T"], period="2y")
+    assert failures == {} and histories["7203.T"]["Close"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+def test_download_failures(yf_download):
+    yf_download(RuntimeError("rate limited"))
+    histories, failures = _download_closes(["A", "B"], period="2y")
+    assert histories == {} and failures == {"A": "download error: rate limited", "B": "download error: rate limited"}
+    yf_download(pd.DataFrame())
+    assert _download_closes(["A"], period="2y") == ({}, {"A": "no data returned"})
+
+def test_get_histories_batch_saves_and_reuses(yf_download, cache_store):
+    calls = yf_download(lambda tickers: _multi({t: _frame([1.0, 2.0, 3.0, 4.0, 5.0]) for t in tickers if t != "MISSING"}))
+    histories, failures = get_histories_batch(["7203.T", "AAPL", "7203.T", "MISSING"])
+    assert calls[0][0] == ["7203.T", "AAPL", "MISSING"] and calls[0][1]["period"] == "2y"
+    assert sorted(histories) == ["7203.T", "AAPL"] and failures == {"MISSING": "ticker missing in response"}
+    assert sorted(cache_store.meta()) == ["7203.T", "AAPL"]
+    # 取得直後のキャッシュは新しいので通信しない
+    histories, _ = get_histories_batch(["7203.T", "AAPL"])
+    assert len(calls) == 1 and histories["AAPL"]["Close"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
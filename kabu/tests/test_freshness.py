@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta, timezone
+
+from core.freshness import (
+    FX_TTL, JST, LATE_RETRY, fx_weekend_close, is_fresh, is_trading_day, jp_holidays, last_publication,
+    next_publication, us_holidays,
+)
+
+def jst(*args):
+    return datetime(*args, tzinfo=JST)
+
+def test_jp_holidays():
+    days = jp_holidays(2024)
+    assert date(2024, 3, 20) in days          # 春分の日
+    assert date(2024, 2, 12) in days          # 建国記念の日 (日曜) の振替休日
+    assert date(2024, 5, 6) in days           # こどもの日 (日曜) の振替休日
+    assert date(2024, 9, 23) in days          # 秋分の日 (日曜) の振替休日
+    assert date(2026, 9, 22) in jp_holidays(2026)  # 敬老の日と秋分の日に挟まれた国民の休日
+    assert date(2024, 3, 21) not in days
+
+def test_us_holidays():
+    assert date(2024, 3, 29) in us_holidays(2024)   # Good Friday
+    assert date(2022, 6, 20) in us_holidays(2022)   # Juneteenth (日曜) の振替
+    assert date(2026, 7, 3) in us_holidays(2026)    # 独立記念日 (土曜) は金曜に
+    assert date(2021, 12, 24) in us_holidays(2021)
+    assert is_trading_day("US", date(2021, 12, 31)) # 2022年の元日 (土曜) は前年に振り替えない
+
+def test_is_trading_day():
+    assert not is_trading_day("JP", date(2024, 12, 31))
+    assert not is_trading_day("JP", date(2025, 1, 2))
+    assert not is_trading_day("JP", date(2024, 3, 2))
+    assert is_trading_day("JP", date(2024, 3, 1))
+    assert is_trading_day("US", date(2024, 3, 20))
+
+def test_last_and_next_publication():
+    # 土曜 -> 金曜の引け後 / 20時
+    assert last_publication("JP_STOCK", jst(2024, 3, 2, 12, 0)) == (date(2024, 3, 1), jst(2024, 3, 1, 16, 0))
+    assert last_publication("JP_FUND", jst(2024, 3, 2, 12, 0)) == (date(2024, 3, 1), jst(2024, 3, 1, 20, 0))
+    # 振替休日明けの火曜の引け前 -> 前の金曜
+    assert last_publication("JP_STOCK", jst(2024, 2, 13, 15, 0))[0] == date(2024, 2, 9)
+    # NYSE は米東部時間 (3/1 は冬時間: 16:30 ET = 21:30 UTC)
+    _, at = last_publication("US_STOCK", jst(2024, 3, 2, 12, 0))
+    assert at.astimezone(timezone.utc) == datetime(2024, 3, 1, 21, 30, tzinfo=timezone.utc)
+    assert next_publication("JP_STOCK", jst(2024, 3, 1, 16, 0)) == (date(2024, 3, 4), jst(2024, 3, 4, 16, 0))
+    assert next_publication("JP_STOCK", jst(2024, 3, 1, 15, 59))[0] == date(2024, 3, 1)
+
+def test_fx_freshness():
+    # 金曜 17時 (NY) 以降は週末休場
+    assert fx_weekend_close(jst(2024, 3, 2, 12, 0)).astimezone(timezone.utc) == datetime(2024, 3, 1, 22, 0, tzinfo=timezone.utc)
+    assert fx_weekend_close(jst(2024, 3, 6, 12, 0)) is None
+    now = jst(2024, 3, 6, 12, 0)
+    assert is_fresh("FX", now - FX_TTL + timedelta(minutes=1), now)
+    assert not is_fresh("FX", now - FX_TTL, now)
+    # 休場中は閉場後に1回取っていれば新鮮
+    assert is_fresh("FX", jst(2024, 3, 2, 8, 0), jst(2024, 3, 3, 12, 0))
+    assert not is_fresh("FX", jst(2024, 3, 2, 6, 0), jst(2024, 3, 3, 12, 0))
+
+def test_is_fresh_publication():
+    assert not is_fresh("JP_STOCK", None)
+    assert is_fresh("JP_STOCK", jst(2024, 3, 1, 16, 0), jst(2024, 3, 4, 15, 0))
+    assert not is_fresh("JP_STOCK", jst(2024, 3, 1, 15, 59), jst(2024, 3, 1, 16, 1))
+    assert not is_fresh("JP_FUND", jst(2024, 3, 1, 19, 0), jst(2024, 3, 1, 20, 30))
+
+def test_late_print_retried_on_publication_day():
+    # 2024-03-01 (金) 16:00 公表、17:00 に取得したが当日分が無い
+    checked = jst(2024, 3, 1, 17, 0)
+    prev = date(2024, 2, 29)
+    assert is_fresh("JP_STOCK", checked, checked + LATE_RETRY - timedelta(minutes=1), prev)
+    assert not is_fresh("JP_STOCK", checked, checked + LATE_RETRY, prev)
+
+def test_late_retry_stops_after_publication_day():
+    # 翌日0時以降に取得しても当日分が無ければ、次の公表 (月曜16時) まで取り直さない
+    checked = jst(2024, 3, 2, 0, 10)
+    prev = date(2024, 2, 29)
+    assert is_fresh("JP_STOCK", checked, jst(2024, 3, 4, 15, 59), prev)
+    assert not is_fresh("JP_STOCK", checked, jst(2024, 3, 4, 16, 0), prev)
+
+def test_late_retry_uses_market_local_day():
+    # NYSE 2024-03-01 (金) の公表は 16:30 ET = 3/2 06:30 JST。東部時間の翌日0時 = 3/2 14:00 JST
+    prev = date(2024, 2, 29)
+    assert not is_fresh("US_STOCK", jst(2024, 3, 2, 13, 0), jst(2024, 3, 2, 13, 30), prev)
+    assert is_fresh("US_STOCK", jst(2024, 3, 2, 14, 0), jst(2024, 3, 3, 12, 0), prev)
+
+def test_current_print_is_fresh_until_next_publication():
+    checked = jst(2024, 3, 1, 16, 5)
+    assert last_publication("JP_STOCK", jst(2024, 3, 3, 12, 0))[0] == date(2024, 3, 1)
+    assert is_fresh("JP_STOCK", checked, jst(2024, 3, 4, 15, 0), date(2024, 3, 1))
@@ -0,0 +1,14 @@
+from core import http_client
+
+class FakeResponse:
+    def __init__(self, retry_after):
+        self.headers = {"Retry-After": retry_after}
+
+def test_retry_after_is_capped():
+    retry = http_client._build_session().adapters["https://"].max_retries
+    assert retry.get_retry_after(FakeResponse("3600")) == http_client.RETRY_AFTER_MAX
+    assert retry.get_retry_after(FakeResponse("2")) == 2
+    # 再試行のたびに作り直される Retry にも上限が引き継がれる
+    retry = retry.new(total=1)
+    assert retry.get_retry_after(FakeResponse("3600")) == http_client.RETRY_AFTER_MAX
+    assert retry.backoff_max == http_client.BACKOFF_MAX
@@ -0,0 +1,94 @@
+import os
+
+import pandas as pd
+
+from core.funds import (
+    fund_snapshot_steps, parse_fund_history_state, parse_fund_history_table, parse_fund_price_board, parse_fund_state,
+    run_steps,
+)
+from core.yahoo_parser import extract_preloaded_state, parse_fund_name
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+
+def fixture(code, kind):
+    with open(os.path.join(FIXTURE_DIR, f"{code}_{kind}.html"), encoding="utf-8") as f:
+        return f.read()
+
+def test_extract_preloaded_state():
+    html = '<script>window.__PRELOADED_STATE__ = {"a": "x;y", "b": [1, 2]};var z = 1;</script>'
+    assert extract_preloaded_state(html) == {"a": "x;y", "b": [1, 2]}
+    assert extract_preloaded_state("<html></html>") is None
+    assert extract_preloaded_state("window.__PRELOADED_STATE__ = {broken") is None
+    assert extract_preloaded_state("window.__PRELOADED_STATE__ = [1]") is None
+
+def test_parse_fund_name():
+    assert parse_fund_name("<title>eMAXIS Slim 米国株式【03311187】：時系列 - Yahoo!ファイナンス</title>") == "eMAXIS Slim 米国株式"
+    assert parse_fund_name("<title>A &amp; B - Yahoo</title>") == "A & B"
+    assert parse_fund_name("<html></html>") is None
+    assert parse_fund_name(fixture("BENCH001", "history")) == "ベンチ 全世界株式インデックス"
+
+def test_parse_fund_history_table():
+    df = parse_fund_history_table(fixture("BENCH001", "history"))
+    assert len(df) == 20 and list(df.columns) == ["Close"]
+    assert df.index.is_monotonic_increasing
+    assert df.index[-1] == pd.Timestamp("2026-01-30")
+    assert parse_fund_history_table("<table><tr><th>x</th></tr></table>").empty
+
+def test_parse_fund_history_state_matches_table():
+    # DOM を組まない mainFundHistory の読み取りは、テーブル解析と同じ結果になる
+    html = fixture("BENCH001", "history")
+    df = parse_fund_history_state(extract_preloaded_state(html))
+    pd.testing.assert_frame_equal(df, parse_fund_history_table(html), check_names=False)
+    assert parse_fund_history_state(None).empty
+    assert parse_fund_history_state({"mainFundPriceBoard": {"fundPrices": {"price": "1", "updateDate": "01/05"}}}).empty
+
+def test_parse_fund_state_chart_line():
+    df = parse_fund_state(extract_preloaded_state(fixture("BENCH001", "chart")))
+    assert len(df) == 520
+    assert df.index.is_monotonic_increasing and df["Close"].notna().all()
+
+def test_parse_fund_state_price_board_fallback():
+    state = {"mainFundPriceBoard": {"fundPrices": {"price": "12,345", "updateDate": "01/05"}}}
+    price, d = parse_fund_price_board(state)
+    assert price == 12345.0 and (d.month, d.day) == (1, 5)
+    df = parse_fund_state(state)
+    assert df["Close"].tolist() == [12345.0]
+    assert parse_fund_state({}).empty
+    assert parse_fund_price_board({}) == (None, None)
+
+def _pages(code, **overrides):
+    pages = {f"https://finance.yahoo.co.jp/quote/{code}/{k}": (200, fixture(code, k)) for k in ("history", "chart")}
+    pages.update({f"https://finance.yahoo.co.jp/quote/{code}/{k}": v for k, v in overrides.items()})
+    requested = []
+    def get(url):
+        requested.append(url)
+        return pages[url]
+    return get, requested
+
+def test_fund_snapshot_steps_one_fetch():
+    # 名前・基準価額・直近の履歴を /history 1ページから取る
+    get, requested = _pages("BENCH001")
+    snap = run_steps(fund_snapshot_steps("BENCH001"), get)
+    assert requested == ["https://finance.yahoo.co.jp/quote/BENCH001/history"]
+    assert snap["name"] == "ベンチ 全世界株式インデックス"
+    assert len(snap["history"]) == 20 and snap["nav"] == snap["history"]["Close"].iloc[-1]
+
+def test_fund_snapshot_steps_table_without_state():
+    # PRELOADED_STATE が無い /history はテーブルを解析する (それでも1ページ)
+    html = fixture("BENCH001", "history")
+    html = html[:html.index("<script>window.__PRELOADED_STATE__")]
+    get, requested = _pages("BENCH001", history=(200, html))
+    snap = run_steps(fund_snapshot_steps("BENCH001"), get)
+    assert len(requested) == 1 and len(snap["history"]) == 20
+    assert snap["name"] == "ベンチ 全世界株式インデックス"
+
+def test_fund_snapshot_steps_falls_back_to_chart():
+    get, requested = _pages("BENCH001", history=(500, ""))
+    snap = run_steps(fund_snapshot_steps("BENCH001"), get)
+    assert requested[-1].endswith("/chart")
+    assert snap["name"] == "ベンチ 全世界株式インデックス"
+    assert len(snap["history"]) == 520
+    # recent_only は /history だけ
+    get, requested = _pages("BENCH001", history=(500, ""))
+    snap = run_steps(fund_snapshot_steps("BENCH001", recent_only=True), get)
+    assert snap["history"].empty and len(requested) == 1
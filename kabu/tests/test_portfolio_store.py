@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import textwrap
+from contextlib import closing
+from datetime import date
+
+import pandas as pd
+
+from core.portfolio_store import (
+    PORTFOLIO_COLUMNS, append_transactions, connect, list_portfolios, load_portfolio, save_portfolio_if_changed,
+)
+
+LEGACY = """銘柄コード,銘柄名,購入日,保有株数,購入単価
+AJ312217,Smart-i ゴールドファンド(H有),2024-01-01,"206,223",14695.0
+,空行,2024-01-01,1,1
+7203.T,トヨタ,2024/02/01,100,2000
+"""
+
+def _db(tmp_path):
+    return str(tmp_path / "portfolio.db")
+
+def _count(db_path, portfolio):
+    with closing(connect(db_path)) as conn:
+        return conn.execute("SELECT COUNT(*) FROM transactions WHERE portfolio = ?", (portfolio,)).fetchone()[0]
+
+def test_migrates_legacy_csv_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "portfolio_main.csv").write_text(LEGACY, encoding="utf-8")
+    df = load_portfolio("main", _db(tmp_path))
+    assert list(df.columns) == PORTFOLIO_COLUMNS
+    assert df["銘柄コード"].tolist() == ["AJ312217", "7203.T"]
+    assert df["保有株数"].tolist() == [206223.0, 100.0]
+    assert df["購入日"].tolist() == [date(2024, 1, 1), date(2024, 2, 1)]
+    # 移行済みなら、全行を消しても CSV から取り込み直さない
+    assert save_portfolio_if_changed("main", df, df.iloc[:0], _db(tmp_path))
+    assert load_portfolio("main", _db(tmp_path)).empty
+    assert list_portfolios(_db(tmp_path)) == ["main", "sub"]
+
+def test_save_only_when_changed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = _db(tmp_path)
+    append_transactions("main", [("7203.T", "トヨタ", "2024-02-01", 100, 2000)], db)
+    before = load_portfolio("main", db)
+    # 表記の揺れ (カンマ・日付の型・空の名前) だけなら書き込まない
+    same = before.assign(保有株数=["100"], 購入単価=["2,000"], 購入日=["2024-02-01"])
+    assert not save_portfolio_if_changed("main", before, same, db)
+    after = pd.concat([before, pd.DataFrame([["AAPL", None, "2024-03-01", 5, 180.0]], columns=PORTFOLIO_COLUMNS)])
+    assert save_portfolio_if_changed("main", before, after, db)
+    assert load_portfolio("main", db)["銘柄コード"].tolist() == ["7203.T", "AAPL"]
+
+def test_save_keeps_rows_appended_by_others(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = _db(tmp_path)
+    append_transactions("main", [("7203.T", "トヨタ", "2024-02-01", 100, 2000)], db)
+    before = load_portfolio("main", db)
+    # 読み込み後に別プロセス (リサーチエージェントなど) が追記
+    append_transactions("main", [("6758.T", "ソニー", "2024-04-01", 10, 13000)], db)
+    after = before.assign(保有株数=[150])
+    assert save_portfolio_if_changed("main", before, after, db)
+    df = load_portfolio("main", db)
+    assert df["銘柄コード"].tolist() == ["7203.T", "6758.T"]
+    assert df["保有株数"].tolist() == [150.0, 10.0]
+
+APPENDER = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {root!r})
+    from core.portfolio_store import append_transactions
+    for i in range(20):
+        append_transactions("main", [(f"{{sys.argv[1]}}{{i}}", None, "2024-01-01", 1, 1)], {db!r})
+""")
+
+def test_concurrent_appends_keep_all_rows(tmp_path):
+    """複数プロセスが同時に追記しても行が失われず、表示順も重ならない (BEGIN IMMEDIATE)"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    db = _db(tmp_path)
+    connect(db).close()
+    code = APPENDER.format(root=root, db=db)
+    procs = [subprocess.Popen([sys.executable, "-c", code, tag], cwd=tmp_path) for tag in ("A", "B", "C")]
+    assert [p.wait(timeout=120) for p in procs] == [0, 0, 0]
+    assert _count(db, "main") == 60
+    with closing(connect(db)) as conn:
+        positions = [p for (p,) in conn.execute("SELECT position FROM transactions WHERE portfolio = 'main'")]
+    assert sorted(positions) == list(range(60))
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import textwrap
+
+from conftest import make_history
+from core.price_store import PriceStore
+
+def test_put_get_roundtrip(tmp_path):
+    store = PriceStore(str(tmp_path / "prices.arrow"))
+    store.put("7203.T", make_history(), source="test", name="トヨタ")
+    df, meta = PriceStore(str(tmp_path / "prices.arrow")).get("7203.T")
+    assert df["Close"].tolist() == make_history()["Close"].tolist()
+    assert meta["source"] == "test" and meta["name"] == "トヨタ"
+
+def test_batch_writes_once_and_delete(tmp_path):
+    store = PriceStore(str(tmp_path / "prices.arrow"))
+    with store.batch():
+        for t in ("A", "B", "C"):
+            store.put(t, make_history(), source="test")
+        assert not (tmp_path / "prices.arrow").exists()
+    assert store.delete(["B"]) == ["B"]
+    assert sorted(PriceStore(str(tmp_path / "prices.arrow")).meta()) == ["A", "C"]
+
+def test_lru_evicts_least_recently_read(tmp_path):
+    store = PriceStore(str(tmp_path / "prices.arrow"), max_entries=2)
+    store.put("A", make_history(), source="test")
+    store.put("B", make_history(), source="test")
+    store.get("A")
+    store.put("C", make_history(), source="test")
+    assert sorted(store.meta()) == ["A", "C"]
+    assert store.evictions == 1
+
+def test_fx_roundtrip(tmp_path):
+    from datetime import datetime, timezone
+    store = PriceStore(str(tmp_path / "prices.arrow"))
+    at = datetime(2026, 1, 5, 1, 2, 3, tzinfo=timezone.utc)
+    store.save_fx("USDJPY", 151.5, at)
+    assert store.load_fx("USDJPY") == (151.5, at)
+    assert store.clear_fx("USDJPY") and store.load_fx("USDJPY") == (None, None)
+
+WRITER = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, {root!r})
+    from tests.conftest import make_history
+    from core.price_store import PriceStore
+    store = PriceStore({path!r})
+    for i in range(25):
+        store.put(f"{{sys.argv[1]}}{{i}}", make_history(), source="test")
+""")
+
+def test_concurrent_writers_keep_all_entries(tmp_path):
+    """2プロセスが同時に書いても、どちらの更新も失われない (ファイルロック・一意な一時ファイル)"""
+    import os
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = str(tmp_path / "prices.arrow")
+    code = WRITER.format(root=root, path=path)
+    procs = [subprocess.Popen([sys.executable, "-c", code, tag]) for tag in ("A", "B")]
+    assert [p.wait(timeout=120) for p in procs] == [0, 0]
+    assert len(PriceStore(path).meta()) == 50
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
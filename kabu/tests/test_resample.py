@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from core.cache import merge_history
+from core.resample import clear_views, history_view, resample_history
+
+def _walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 + rng.normal(0, 1, n).cumsum(), index=pd.date_range("2020-01-01", periods=n, name="Date"))
+
+def test_resample_history():
+    s = _walk(30)   # 2020-01-01 (水) 〜 01-30
+    weekly = resample_history(s, "W")
+    assert weekly.index[0] == pd.Timestamp("2020-01-03") and weekly.iloc[0] == s.loc["2020-01-03"]
+    assert weekly.iloc[-1] == s.iloc[-1]
+    assert resample_history(s, "M").tolist() == [s.iloc[-1]]
+    assert resample_history(s, "D") is s
+
+def test_history_view_memoizes():
+    clear_views()
+    s = _walk(60)
+    view = history_view("X", s, "W")
+    assert history_view("X", s.copy(), "W") is view
+    # 追記されたら作り直す
+    longer = pd.concat([s, _walk(61).iloc[-1:]])
+    assert history_view("X", longer, "W") is not view
+    assert history_view("X", s, "D") is s
+
+def test_history_view_sees_revised_values():
+    # 途中の値だけが差し替わった履歴 (件数・先頭・末尾は同じ) でも古い週次を返さない
+    clear_views()
+    old = _walk(60).to_frame("Close")
+    view = history_view("X", old, "W")
+    revised = old.loc["2020-01-20":"2020-01-24"] + 5.0
+    merged = merge_history(old, pd.concat([revised, old.loc["2020-01-25":]]))
+    assert len(merged) == len(old) and merged.index[-1] == old.index[-1]
+    fresh = history_view("X", merged, "W")
+    assert fresh is not view
+    assert fresh.loc["2020-01-24", "Close"] == old.loc["2020-01-24", "Close"] + 5.0
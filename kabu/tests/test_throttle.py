@@ -0,0 +1,80 @@
+import pytest
+
+from core.throttle import CircuitBreaker, CircuitOpenError, HostGuard, TokenBucket, is_response_ok
+
+class Clock:
+    """テストから進める時計"""
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_burst_then_wait():
+    clock = Clock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # 使い切った後は予約した順に 1/rate 秒ずつ後ろに並ぶ
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+def test_token_bucket_refill_caps_at_capacity():
+    clock = Clock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock)
+    for _ in range(3): bucket.reserve()
+    clock.now += 1.0     # 2トークン補充
+    assert bucket.reserve() == 0.0 and bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 60.0    # 長く空いても capacity まで
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() > 0
+
+def test_breaker_open_half_open_closed():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=clock)
+    for _ in range(2): breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.is_open() and not breaker.allow()
+
+    clock.now += 9.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert not breaker.is_open()
+    # half_open は試行を1件だけ通す
+    assert breaker.allow() and breaker.state == "half_open"
+    assert breaker.is_open() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+
+def test_breaker_half_open_failure_reopens():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opened_at == clock.now
+    # 開き直した時刻から reset_timeout 待つ
+    clock.now += 5.0
+    assert not breaker.allow()
+    clock.now += 5.0
+    assert breaker.allow()
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=Clock())
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.failures == 2
+
+def test_host_guard():
+    guard = HostGuard("example.com")
+    guard.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0, clock=Clock())
+    guard.before_request()
+    guard.record(is_response_ok(503))
+    with pytest.raises(CircuitOpenError):
+        guard.before_request()
+    assert not is_response_ok(None) and not is_response_ok(429) and is_response_ok(404)
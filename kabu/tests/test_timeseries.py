@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_history
+from core.aggregate import aggregate_portfolio, build_price_table
+from core.timeseries import align_prices, portfolio_timeseries
+
+def _holdings(rows):
+    return pd.DataFrame(rows, columns=["ticker", "shares", "price", "date"])
+
+def test_align_prices_fills_gaps():
+    a = make_history(5, start="2024-01-01")                       # 1/1..1/5
+    b = make_history(5, start="2024-01-01", base=10.0).iloc[[1, 3]]  # 1/2, 1/4 だけ
+    dates, prices = align_prices({"A": a, "B": b}, ["A", "B", "MISSING"])
+    assert list(dates) == list(pd.date_range("2024-01-01", periods=5))
+    assert prices[:, 0].tolist() == [100.0, 101.0, 102.0, 103.0, 104.0]
+    assert np.isnan(prices[0, 1]) and prices[1:, 1].tolist() == [11.0, 11.0, 13.0, 13.0]
+    assert np.isnan(prices[:, 2]).all()
+    dates, prices = align_prices({"A": a}, ["A"], start=pd.Timestamp("2024-01-04"))
+    assert len(dates) == 2 and prices[:, 0].tolist() == [103.0, 104.0]
+    assert len(align_prices({}, ["A"])[0]) == 0
+
+def test_portfolio_timeseries():
+    histories = {
+        "7203.T": make_history(10, start="2024-01-01"),               # 100..109
+        "AAPL": make_history(10, start="2024-01-01", base=10.0),      # 10..19
+        "01314184": make_history(10, start="2024-01-01", base=10000.0),
+    }
+    holdings = _holdings([
+        ("7203.T", 10, 100.0, pd.Timestamp("2024-01-01").date()),
+        ("7203.T", 10, 105.0, pd.Timestamp("2024-01-06").date()),
+        ("AAPL", 2, 10.0, pd.Timestamp("2024-01-03").date()),
+        ("01314184", 20000, 10000.0, pd.Timestamp("2024-01-01").date()),
+    ])
+    ts = portfolio_timeseries(holdings, histories, usdjpy=150.0)
+    assert ts.index[0] == pd.Timestamp("2024-01-01") and len(ts) == 10
+    first, last = ts.iloc[0], ts.iloc[-1]
+    assert first["value"] == 10 * 100 + 20000 * 10000 / 10000 and first["pl"] == 0
+    # 最終日: 7203.T 20株 @109、AAPL 2株 @19 x 150、投信 2万口 @10009
+    assert last["value"] == pytest.approx(20 * 109 + 2 * 19 * 150 + 2 * 10009)
+    assert last["invested"] == pytest.approx(10 * 100 + 10 * 105 + 2 * 10 * 150 + 20000)
+    assert last["pl_pct"] == pytest.approx(last["pl"] / last["invested"] * 100)
+    # USD/JPY は日ごとの Series でも渡せる (無い日は前後の値)
+    fx = pd.Series([100.0, 200.0], index=pd.to_datetime(["2024-01-05", "2024-01-08"]))
+    ts = portfolio_timeseries(holdings.iloc[[2]], histories, usdjpy=fx)
+    assert ts["value"].tolist()[:6] == [2 * 12 * 100, 2 * 13 * 100, 2 * 14 * 100, 2 * 15 * 100, 2 * 16 * 100, 2 * 17 * 200]
+
+def test_portfolio_timeseries_before_history():
+    # 履歴が購入日まで遡れない期間は取得単価で評価する
+    holdings = _holdings([("7203.T", 10, 90.0, pd.Timestamp("2023-12-30").date())])
+    ts = portfolio_timeseries(holdings, {"7203.T": make_history(3, start="2024-01-01")})
+    assert ts["value"].tolist() == [1000.0, 1010.0, 1020.0]
+    assert portfolio_timeseries(holdings.iloc[:0], {}).empty
+
+def test_purchase_after_history_ends_counts_on_last_day():
+    histories = {"7203.T": make_history(5, start="2024-01-01"), "AAPL": make_history(5, start="2024-01-01", base=10.0)}
+    holdings = _holdings([
+        ("7203.T", 10, 100.0, pd.Timestamp("2024-01-02").date()),
+        ("7203.T", 5, 104.0, pd.Timestamp("2024-01-09").date()),   # 履歴の最終日 (1/5) より後
+        ("AAPL", 3, 14.0, pd.Timestamp("2024-01-10").date()),
+    ])
+    ts = portfolio_timeseries(holdings, histories, usdjpy=150.0)
+    agg = aggregate_portfolio(holdings, build_price_table(histories), 150.0)
+    assert ts.index[-1] == pd.Timestamp("2024-01-05")
+    assert ts["value"].iloc[-1] == pytest.approx(agg["val_jpy"].sum())
+    assert ts["invested"].iloc[-1] == pytest.approx(agg["inv_jpy"].sum())
+    assert ts["invested"].iloc[-2] == 1000.0
+    # 全て最終日より後の購入でも最終日の1行は出る
+    ts = portfolio_timeseries(holdings.iloc[[1]], histories)
+    assert list(ts.index) == [pd.Timestamp("2024-01-05")] and ts["invested"].tolist() == [520.0]
@@ -5,15 +5,13 @@ import pandas as pd
 import warnings
 warnings.filterwarnings("ignore")
 
-# Mock streamlit to avoid import errors or warnings if possible, but importing stock_app imports streamlit
-# We can just ignore the warnings.
-
+# core は Streamlit に依存しないので、ダッシュボードを起動せずに import できる
 try:
-    from stock_app import scrape_japan_fund_history_params
+    from core import scrape_japan_fund_history_params
 except ImportError:
     # If run from different dir, adjust path
-    sys.path.append(os.getcwd())
-    from stock_app import scrape_japan_fund_history_params
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from core import scrape_japan_fund_history_params
 
 print(">>> Verifying Fix for AJ311217")
 df = scrape_japan_fund_history_params("AJ311217", None)
@@ -1,5 +1,5 @@
 import pandas as pd
-from stock_app import scrape_japan_fund_history_params
+from core import scrape_japan_fund_history_params
 
 code = "AJ312217" # Smart-i Gold Fund
 print(f"Verifying data fetch for {code}...")